@@ -0,0 +1,109 @@
+# admission.py — จำกัดจำนวน generation ที่ทำพร้อมกัน (ทั้ง process และต่อ session) ก่อนเริ่มสตรีม
+import asyncio
+import math
+import time
+
+
+class AdmissionRejected(Exception):
+    """รับ request เพิ่มไม่ได้ตอนนี้ — retry_after คือจำนวนวินาทีที่ควรรอก่อนลองใหม่"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"{reason}: retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """สิทธิ์ของ request หนึ่ง — release() เรียกซ้ำได้ (จาก finally ของ stream และตอน generator ถูกทิ้ง)"""
+
+    def __init__(self, controller: "AdmissionController", session_id: str, slot: bool):
+        self._controller = controller
+        self.session_id = session_id
+        self.slot = slot
+        self.started = time.monotonic()
+        self.released = False
+
+    async def acquire_slot(self) -> None:
+        """ขอ slot ของ generation ภายหลัง (request ที่ตอนแรกจะอ่านงานของคนอื่นแต่ต้องทำเอง)
+
+        เข้าคิวแบบเดียวกับ admit() — คิวเต็มหรือรอเกิน queue_timeout → AdmissionRejected (ticket ยังถือ session อยู่ ต้อง release เอง)
+        """
+        if not self.slot and not self.released:
+            await self._controller._acquire_slot()
+            self.slot = True
+            self.started = time.monotonic()
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """global: ไม่เกิน max_concurrent generation — ที่เกินรอคิวได้ไม่เกิน queue_timeout วินาที / max_queue request
+    ต่อ session: ไม่เกิน max_per_session request พร้อมกัน (เกินแล้วปฏิเสธทันที ไม่เข้าคิว)
+
+    Retry-After ประมาณจากเวลาที่ generation ใช้โดยเฉลี่ย (EWMA)
+    """
+
+    def __init__(self, max_concurrent: int, max_per_session: int, queue_timeout: float, max_queue: int):
+        self.max_concurrent = max_concurrent
+        self.max_per_session = max_per_session
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._sessions: dict[str, int] = {}
+        self._avg_hold = 1.0
+        self.active = 0
+        self.queued = 0
+        self.stats = {"admitted": 0, "rejected_session": 0, "rejected_busy": 0}
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_hold))
+
+    async def admit(self, session_id: str, slot: bool = True) -> Ticket:
+        """slot=False: ไม่ใช้ slot ของ generation (เช่น อ่าน stream ที่คนอื่นกำลังสร้าง) แต่ยังนับต่อ session"""
+        if self._sessions.get(session_id, 0) >= self.max_per_session:
+            self.stats["rejected_session"] += 1
+            raise AdmissionRejected("session_busy", self.retry_after())
+        if slot:
+            # จอง session ไว้ระหว่างรอคิว กันไม่ให้ session เดียวกันเข้าคิวซ้อน
+            self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+            try:
+                await self._acquire_slot()
+            finally:
+                self._leave_session(session_id)
+        self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+        self.active += 1
+        self.stats["admitted"] += 1
+        return Ticket(self, session_id, slot)
+
+    async def _acquire_slot(self) -> None:
+        if not self._slots.locked():
+            await self._slots.acquire()  # ว่างอยู่ → ได้ทันที
+            return
+        if self.queued >= self.max_queue:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionRejected("server_busy", self.retry_after())
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected_busy"] += 1
+            raise AdmissionRejected("server_busy", self.retry_after()) from None
+        finally:
+            self.queued -= 1
+
+    def _leave_session(self, session_id: str) -> None:
+        left = self._sessions.get(session_id, 0) - 1
+        if left > 0:
+            self._sessions[session_id] = left
+        else:
+            self._sessions.pop(session_id, None)
+
+    def _release(self, ticket: Ticket) -> None:
+        self.active -= 1
+        self._leave_session(ticket.session_id)
+        if ticket.slot:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * (time.monotonic() - ticket.started)
+            self._slots.release()
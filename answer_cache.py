@@ -0,0 +1,115 @@
+# answer_cache.py — cache คำตอบของคำถามที่ฝ่ายขายถามซ้ำ ๆ
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+_PUNCT = re.compile(r"[\s\?\!？！\.,;:\"'“”]+")
+_POLITE_TAIL = re.compile(r"(ครับ|ค่ะ|คะ|นะ|จ้า|จ้ะ)+$")
+
+
+def normalize_question(q: str) -> str:
+    """ทำให้คำถามที่ต่างกันแค่ตัวพิมพ์/ช่องว่าง/เครื่องหมาย/คำลงท้าย กลายเป็น key เดียวกัน"""
+    q = unicodedata.normalize("NFKC", q).lower()
+    q = _PUNCT.sub(" ", q).strip()
+    q = _POLITE_TAIL.sub("", q).strip()
+    return q
+
+
+class AnswerCache:
+    """cache คำตอบแบบ exact (ข้อความ normalize แล้ว) และ semantic (cosine similarity ≥ threshold)
+
+    - entry หมดอายุตาม ttl และถูกไล่ออกแบบ LRU เมื่อเกิน max_entries
+    - ผูกกับ version (hash ของ catalog + system prompt) — version เปลี่ยนเมื่อไร cache ถูกล้างทั้งหมด
+    """
+
+    def __init__(self, embeddings, max_entries: int = 1000, ttl: float = 3600.0, threshold: float = 0.95):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version: str | None = None
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._matrix: np.ndarray | None = None  # เวกเตอร์ของทุก entry เรียงตาม self._keys
+        self._keys: list[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _check_version(self, version: str) -> None:
+        if version != self.version:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._entries.clear()
+            self._matrix = None
+            self.version = version
+
+    def _expire(self, now: float) -> None:
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl]
+        for k in expired:
+            del self._entries[k]
+        if expired:
+            self._matrix = None
+
+    def _vector(self, text: str, vector: list[float] | None = None) -> np.ndarray:
+        v = np.asarray(self.embeddings.embed_query(text) if vector is None else vector, dtype=np.float32)
+        return v / (np.linalg.norm(v) or 1.0)
+
+    def contains(self, question: str, version: str) -> bool:
+        """มี entry ที่ตรงแบบ exact และยังไม่หมดอายุหรือไม่ (ไม่นับสถิติ) — ใช้ตัดสินก่อนว่าต้อง embed คำถามหรือเปล่า"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            return entry is not None and time.time() - entry["created"] <= self.ttl
+
+    def lookup(self, question: str, version: str, vector: list[float] | None = None) -> str | None:
+        """vector: embedding ของ question ที่มีอยู่แล้ว (ไม่ต้อง embed ซ้ำตอน semantic lookup)"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version(version)
+            self._expire(time.time())
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry["answer"]
+            if not self._entries:
+                self.stats["misses"] += 1
+                return None
+
+        # embed ข้อความเดิม (ไม่ใช่ key) เพื่อใช้ cache เดียวกับ build_context
+        vec = self._vector(question, vector)
+        with self._lock:
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k]["vector"] for k in self._keys]) if self._keys else None
+            if self._matrix is not None:
+                scores = self._matrix @ vec
+                best = int(np.argmax(scores))
+                best_key = self._keys[best]
+                if scores[best] >= self.threshold and best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+                    self.stats["semantic_hits"] += 1
+                    return self._entries[best_key]["answer"]
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, question: str, answer: str, version: str, vector: list[float] | None = None) -> None:
+        key = normalize_question(question)
+        vec = self._vector(question, vector)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = {"answer": answer, "vector": vec, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
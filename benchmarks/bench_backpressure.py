@@ -0,0 +1,176 @@
+"""ตรวจการยกเลิก generation เมื่อ client ปิดกลางทาง, admission control (429 + Retry-After) และ backpressure ของ client ที่อ่านช้า
+
+ไม่ต้องมี MongoDB / OpenAI — ใช้ StubChatModel, HashEmbeddings และ catalog จำลองในหน่วยความจำ (ดู patch_offline)
+จบด้วย exit code 1 ถ้ามีกรณีใดไม่ผ่าน
+
+    python -m benchmarks.bench_backpressure
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+
+import httpx
+from langchain.schema import HumanMessage
+
+from admission import AdmissionController
+from benchmarks.bench_chat_stream import patch_app, patch_offline, start_server
+from single_flight import Flight, SlowConsumer
+
+import main
+
+QUESTION = "ทีมขายไม่กล้าเสนอราคาลูกค้ารายใหญ่ ควรเรียนคอร์สไหน"
+
+
+def fresh_question() -> str:
+    # คำถามใหม่ทุกครั้ง เพื่อไม่ให้ติด answer cache / single flight ของกรณีก่อน
+    return f"{QUESTION} ({uuid.uuid4().hex[:8]})"
+
+
+async def read(client: httpx.AsyncClient, url: str, question: str, session_id: str | None = None,
+               close_after: int | None = None, delay: float = 0.0) -> tuple[int, str, dict]:
+    """คืน (status, body, headers) — close_after=n: ปิด connection หลังได้ n chunk"""
+    await asyncio.sleep(delay)
+    body = []
+    payload = {"session_id": session_id or f"bp-{uuid.uuid4()}", "question": question}
+    async with client.stream("POST", url, json=payload) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            return resp.status_code, resp.text, dict(resp.headers)
+        async for chunk in resp.aiter_text():
+            body.append(chunk)
+            if close_after is not None and len(body) >= close_after:
+                break
+    return 200, "".join(body), dict(resp.headers)
+
+
+async def wait_until(cond, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        await asyncio.sleep(0.05)
+    return cond()
+
+
+async def check_disconnect(client: httpx.AsyncClient, url: str) -> list[str]:
+    stub = main.chat_llm
+    total = len(stub._tokens())
+    cancelled, emitted = stub.cancelled, stub.emitted
+    await read(client, url, fresh_question(), close_after=1)
+    ok = await wait_until(lambda: stub.cancelled == cancelled + 1)
+    sent = stub.emitted - emitted
+    print(f"disconnect          upstream_cancelled={ok}  tokens_generated={sent}/{total}")
+    return [] if ok and sent < total else ["disconnect did not cancel the upstream generation"]
+
+
+async def check_shared_disconnect(client: httpx.AsyncClient, url: str) -> list[str]:
+    stub = main.chat_llm
+    failures = []
+    # leader ปิดหลัง chunk แรก แต่ follower ยังอ่านอยู่ → generation ต้องทำต่อจนจบ
+    q = fresh_question()
+    cancelled = stub.cancelled
+    (_, _, _), (status, body, _) = await asyncio.gather(
+        read(client, url, q, close_after=1), read(client, url, q, delay=0.05),
+    )
+    complete = status == 200 and body == stub.answer
+    print(f"leader disconnect   follower_complete={complete}  upstream_cancelled={stub.cancelled > cancelled}")
+    if not complete or stub.cancelled != cancelled:
+        failures.append("leader disconnect broke the follower's stream")
+
+    # ทุกคนปิด → ยกเลิก
+    q = fresh_question()
+    await asyncio.gather(read(client, url, q, close_after=1), read(client, url, q, close_after=1, delay=0.05))
+    ok = await wait_until(lambda: stub.cancelled == cancelled + 1)
+    print(f"all disconnect      upstream_cancelled={ok}")
+    if not ok:
+        failures.append("shared generation kept running after every reader left")
+    return failures
+
+
+async def check_admission(client: httpx.AsyncClient, url: str) -> list[str]:
+    failures = []
+    original = main.admission
+    main.admission = AdmissionController(2, 1, queue_timeout=0.2, max_queue=1)
+    try:
+        results = await asyncio.gather(*(read(client, url, fresh_question()) for _ in range(5)))
+        statuses = sorted(r[0] for r in results)
+        retry = [r[2].get("retry-after") for r in results if r[0] == 429]
+        print(f"global limit=2      statuses={statuses}  retry_after={retry}")
+        if statuses != [200, 200, 429, 429, 429] or not all(retry):
+            failures.append("global concurrency limit did not reject with 429 + Retry-After")
+
+        sid = f"bp-{uuid.uuid4()}"
+        results = await asyncio.gather(
+            read(client, url, fresh_question(), session_id=sid), read(client, url, fresh_question(), session_id=sid),
+        )
+        statuses = sorted(r[0] for r in results)
+        print(f"per-session limit=1 statuses={statuses}")
+        if statuses != [200, 429]:
+            failures.append("per-session limit did not reject the second concurrent request")
+        if main.admission.active or main.admission.queued:
+            failures.append(f"admission slots leaked: active={main.admission.active} queued={main.admission.queued}")
+    finally:
+        main.admission = original
+    return failures
+
+
+async def check_slow_reader(max_buffered: int, stall_timeout: float) -> list[str]:
+    """client ที่หยุดอ่าน: producer ต้องหยุดดึง token จาก LLM ที่ max_buffered แล้วเลิกทั้งงานเมื่อค้างเกิน stall_timeout"""
+    main.STREAM_MAX_BUFFERED_TOKENS, main.STREAM_STALL_TIMEOUT = max_buffered, stall_timeout
+    stub = main.chat_llm
+    cancelled = stub.cancelled
+    flight = Flight()
+    flight.attach()
+    flight.producer = asyncio.create_task(main.generate([HumanMessage(content=fresh_question())], flight))
+    reader = flight.subscribe()
+    await reader.__anext__()  # อ่าน token แรกแล้วหยุด
+    await asyncio.sleep(stall_timeout / 2)
+    buffered = len(flight.parts) - 1
+    await wait_until(lambda: flight.done, stall_timeout * 2)
+    try:
+        await reader.__anext__()
+        evicted = False
+    except SlowConsumer:
+        evicted = True
+    print(f"slow reader         buffered={buffered} (max {max_buffered})  evicted={evicted}  "
+          f"upstream_cancelled={stub.cancelled > cancelled}")
+    if buffered > max_buffered or not evicted or not isinstance(flight.error, SlowConsumer):
+        return ["slow reader was not bounded by the token buffer"]
+    return []
+
+
+async def run(url: str) -> list[str]:
+    failures = []
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=50)) as client:
+        failures += await check_disconnect(client, url)
+        failures += await check_shared_disconnect(client, url)
+        failures += await check_admission(client, url)
+    failures += await check_slow_reader(max_buffered=8, stall_timeout=0.5)
+    return failures
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--tokens-per-second", type=float, default=60.0)
+    ap.add_argument("--port", type=int, default=8767)
+    args = ap.parse_args()
+
+    patch_offline()
+    patch_app(args.first_token_latency, args.tokens_per_second)
+    server = start_server(args.port)
+    try:
+        failures = asyncio.run(run(f"http://127.0.0.1:{args.port}/chat-stream"))
+    finally:
+        server.should_exit = True
+    if failures:
+        for f in failures:
+            print(f"FAIL: {f}")
+        sys.exit(1)
+    print("OK: disconnects cancel upstream work, limits answer 429, slow readers are bounded")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,151 @@
+"""Catalog import: เวลาที่ใช้นำเข้า N คอร์ส, ช่วงที่ reader เห็น catalog ว่าง (ต้องเป็น 0), import ที่ล้มกลางทาง
+ต้องไม่แตะ catalog ที่ใช้งานอยู่ และจำนวน document ที่ index embed ใหม่
+
+ค่าเริ่มต้นรันบน mongomock (pip install mongomock) — --mongo-uri ใช้ MongoDB จริงแทน (database --db ถูกลบทิ้งเมื่อจบ)
+จบด้วย exit code 1 ถ้า reader เห็น catalog ว่างหรือไม่ครบระหว่าง import หรือ import ที่ล้มเปลี่ยนข้อมูลที่ใช้งานอยู่
+
+    python -m benchmarks.bench_catalog_import --courses 50000
+    python -m benchmarks.bench_catalog_import --mongo-uri mongodb://localhost:27017
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from pymongo.errors import AutoReconnect
+
+import seed
+from benchmarks.stubs import HashEmbeddings, synthetic_courses
+from catalog_import import META_COLLECTION, META_ID, CatalogImporter, CatalogImportError, records_version
+from course_index import CourseIndexManager
+
+
+class GapProbe(threading.Thread):
+    """อ่าน catalog วนไปเรื่อย ๆ ระหว่าง import — นับครั้งที่จำนวนคอร์สต่ำกว่าที่ควรเป็น"""
+
+    def __init__(self, collection, expected: int):
+        super().__init__(daemon=True)
+        self.collection = collection
+        self.expected = expected
+        self.reads = 0
+        self.gaps = 0
+        self.stop = threading.Event()
+
+    def run(self) -> None:
+        while not self.stop.is_set():
+            if self.collection.count_documents({}) < self.expected:
+                self.gaps += 1
+            self.reads += 1
+
+
+class FailingImporter(CatalogImporter):
+    """import ที่ connection หลุดหลังเขียน staging ของ courses ไปได้ครึ่งหนึ่ง"""
+
+    def _load(self, staging, records: list[dict]) -> None:
+        if staging.name.startswith(self.names["courses"]):
+            super()._load(staging, records[:len(records) // 2])
+            raise AutoReconnect("simulated connection loss while loading staging")
+        super()._load(staging, records)
+
+
+def changed_copy(courses: list[dict], every: int, note: str = "ปรับปรุง") -> list[dict]:
+    """แก้ price ทุก ๆ `every` คอร์ส — จำลอง import รอบถัดไปที่เปลี่ยนแค่บางส่วน"""
+    return [{**c, "price": f"{c.get('price', '')} ({note})"} if i % every == 0 else c for i, c in enumerate(courses)]
+
+
+def snapshot(db) -> tuple[str, dict | None]:
+    """hash ของ courses/facilitators ที่ใช้งานอยู่ + document ใน catalog_meta"""
+    live = [list(db[name].find({}).sort("_id", 1)) for name in ("courses", "facilitators")]
+    return records_version(*live), db[META_COLLECTION].find_one({"_id": META_ID})
+
+
+def check_failed_imports(db, courses: list[dict], batch_size: int) -> list[str]:
+    """import ที่ไม่ผ่านการตรวจ หรือล้มระหว่างเขียน staging ต้องไม่เปลี่ยน collection จริงและ catalog_meta"""
+    failures = []
+    before = snapshot(db)
+    bad = [dict(c) for c in courses]
+    bad[len(bad) // 2]["facilitators_ids"] = ["no-such-facilitator"]
+    broken = FailingImporter(db, batch_size=batch_size)
+    for label, attempt in (
+        ("invalid data", lambda: CatalogImporter(db, batch_size=batch_size).run(bad, seed.facilitators)),
+        ("connection loss", lambda: broken.run(changed_copy(courses, 7, "ล้ม"), seed.facilitators)),
+    ):
+        try:
+            attempt()
+            failures.append(f"{label}: import was expected to fail")
+            continue
+        except (CatalogImportError, AutoReconnect) as e:
+            error = type(e).__name__
+        unchanged = snapshot(db) == before
+        print(f"failed import      {label:16s} raised {error}  live catalog and catalog_meta unchanged={unchanged}")
+        if not unchanged:
+            failures.append(f"{label}: a failed import changed the live catalog or catalog_meta")
+    return failures
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--courses", type=int, default=50000)
+    ap.add_argument("--batch-size", type=int, default=1000)
+    ap.add_argument("--change-every", type=int, default=100, help="second import changes every Nth course")
+    ap.add_argument("--db", default="minddojo_bench_import")
+    ap.add_argument("--mongo-uri", help="use this MongoDB instead of mongomock")
+    args = ap.parse_args()
+
+    if args.mongo_uri:
+        client = MongoClient(args.mongo_uri)
+    else:
+        import mongomock
+
+        client = mongomock.MongoClient()
+    client.drop_database(args.db)
+    db = client[args.db]
+    courses = synthetic_courses(args.courses)
+    importer = CatalogImporter(db, batch_size=args.batch_size)
+    failures = []
+    try:
+        first = importer.run(courses, seed.facilitators)
+        print(f"initial import     courses={first['courses']}  {first['seconds']}s")
+
+        manager = CourseIndexManager(
+            db["courses"], HashEmbeddings(), os.path.join(tempfile.mkdtemp(), "minddojo_courses.index"),
+            facilitators_collection=db["facilitators"], meta_collection=db[META_COLLECTION],
+        )
+        manager.load_or_build()
+
+        failures += check_failed_imports(db, courses, args.batch_size)
+
+        probe = GapProbe(db["courses"], len(courses))
+        probe.start()
+        updated = changed_copy(courses, args.change_every)
+        second = importer.run(updated, seed.facilitators)
+        probe.stop.set()
+        probe.join()
+        print(f"re-import          courses={second['courses']}  {second['seconds']}s "
+              f"(staging load {second['load_s']}s)  reads during import={probe.reads}  empty/partial reads={probe.gaps}")
+        if probe.gaps:
+            failures.append(f"{probe.gaps} reads saw an incomplete catalog during import")
+
+        t0 = time.perf_counter()
+        stats = manager.refresh()
+        print(f"index refresh      {stats}  {time.perf_counter() - t0:.2f}s  "
+              f"(expected {len(range(0, len(courses), args.change_every))} updated)")
+        leftovers = [n for n in db.list_collection_names() if "_import_" in n]
+        if leftovers:
+            failures.append(f"staging collections left behind: {leftovers}")
+    finally:
+        client.drop_database(args.db)
+    if failures:
+        for f in failures:
+            print(f"FAIL: {f}")
+        sys.exit(1)
+    print("OK: catalog switched with no read gap and failed imports left it untouched")
+
+
+if __name__ == "__main__":
+    main_cli()
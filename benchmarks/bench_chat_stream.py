@@ -0,0 +1,139 @@
+"""Load benchmark ของ /chat-stream: วัด time-to-first-token (p50/p99) ที่หลายระดับ concurrency
+
+ต้องมี MongoDB บนเครื่อง (MONGO_URI) — ใช้ StubChatModel และ HashEmbeddings แทน OpenAI
+
+    python -m benchmarks.bench_chat_stream --sessions 1 50 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from bson import ObjectId
+
+import main
+import seed
+from course_index import IndexFileLock
+from benchmarks.stubs import HashEmbeddings, ListCollection, StubChatModel, synthetic_courses
+
+QUESTION = "หลักสูตร Design Thinking มีอะไรบ้าง?"
+
+
+def patch_app(first_token_latency: float, tokens_per_second: float) -> None:
+    """เปลี่ยน LLM และ embeddings ของ main ให้เป็น stub"""
+    stub = StubChatModel(first_token_latency=first_token_latency, tokens_per_second=tokens_per_second)
+    main.chat_llm = main.history_manager.llm = stub
+    emb = HashEmbeddings()
+    main.index_manager.embeddings = main.hybrid_retriever.embeddings = main.answer_cache.embeddings = emb
+    if main.index_manager.store is not None:  # ปกติ index ถูกโหลดตอน startup ของ server (lifespan)
+        main.index_manager.store.embedding_function = emb
+
+
+def patch_offline(courses: int = 200) -> None:
+    """ตัด MongoDB ออกจาก main สำหรับ check ที่ไม่ได้วัด Mongo: catalog/index มาจาก synthetic_courses ใน
+    หน่วยความจำ (index แยกไว้ใน temp dir) intent rule จากไฟล์ และทุก session ไม่มีประวัติ / ไม่บันทึกคำตอบ
+    """
+    collection = ListCollection(synthetic_courses(courses))
+    main.index_manager.collection = main.course_catalog.courses_collection = collection
+    main.course_catalog.facilitators_collection = ListCollection(seed.facilitators)
+    main.index_manager.facilitators_collection = main.index_manager.meta_collection = None
+    main.index_manager.index_path = os.path.join(tempfile.mkdtemp(), "index")
+    main.index_manager._file_lock = IndexFileLock(main.index_manager.index_path + ".lock")
+    main.intent_router.collection = None
+    main.INDEX_WATCH = False
+    main.history_store.ensure_indexes = lambda: None
+    main.history_manager.load = lambda session_id: {"summary": "", "summarized_until": None, "messages": []}
+
+    async def record_turn(session_id, user_text, ai_text, trace=None):
+        if trace is not None:
+            trace.finish()
+
+    main._record_turn = record_turn
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def seed_sessions(n: int, turns: int) -> list[str]:
+    """สร้าง session ที่มีประวัติอยู่แล้ว เพื่อให้การโหลด history มีต้นทุนจริง"""
+    ids = [f"bench-{uuid.uuid4()}" for _ in range(n)]
+    now = datetime.utcnow()
+    main.history_store.write_turns([
+        {"session_id": sid, "messages": [
+            {"_id": ObjectId(), "sender": "user", "text": f"คำถามที่ {t}", "timestamp": now},
+            {"_id": ObjectId(), "sender": "ai", "text": "คำตอบ " * 50, "timestamp": now},
+        ]}
+        for sid in ids for t in range(turns)
+    ])
+    return ids
+
+
+async def one_request(client: httpx.AsyncClient, url: str, session_id: str) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", url, json={"session_id": session_id, "question": QUESTION}) as resp:
+        resp.raise_for_status()
+        async for chunk in resp.aiter_bytes():
+            if ttft is None and chunk:
+                ttft = time.perf_counter() - t0
+    return ttft or 0.0, time.perf_counter() - t0
+
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run_level(url: str, session_ids: list[str]) -> None:
+    limits = httpx.Limits(max_connections=len(session_ids) + 10)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one_request(client, url, sid) for sid in session_ids))
+        wall = time.perf_counter() - t0
+    ttfts = [r[0] * 1000 for r in results]
+    totals = [r[1] * 1000 for r in results]
+    print(
+        f"sessions={len(session_ids):4d}  ttft p50={statistics.median(ttfts):8.1f}ms "
+        f"p99={pct(ttfts, 99):8.1f}ms  total p50={statistics.median(totals):8.1f}ms  wall={wall:6.2f}s"
+    )
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, nargs="+", default=[1, 50, 200])
+    ap.add_argument("--history-turns", type=int, default=20)
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--tokens-per-second", type=float, default=60.0)
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    patch_app(args.first_token_latency, args.tokens_per_second)
+    server = start_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/chat-stream"
+    try:
+        for n in args.sessions:
+            session_ids = seed_sessions(n, args.history_turns)
+            asyncio.run(run_level(url, session_ids))
+            main.history_store.delete(session_ids)
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main_cli()
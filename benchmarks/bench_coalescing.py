@@ -0,0 +1,83 @@
+"""Single-flight check: ยิงคำถามเดียวกันพร้อมกัน N request แล้วนับจำนวนครั้งที่เรียก LLM จริง
+
+ไม่ต้องมี MongoDB / OpenAI — ใช้ StubChatModel, HashEmbeddings และ catalog จำลองในหน่วยความจำ (ดู patch_offline)
+จบด้วย exit code 1 ถ้าเปิด single-flight แล้วยังเรียก LLM มากกว่า 1 ครั้ง หรือคำตอบของแต่ละ request ไม่ตรงกัน
+
+    python -m benchmarks.bench_coalescing                 # 50 request
+    python -m benchmarks.bench_coalescing --requests 200 --compare
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+from benchmarks.bench_chat_stream import patch_app, patch_offline, pct, start_server
+
+import main
+
+QUESTION = "ฝ่ายขายควรแนะนำหลักสูตรอะไรให้ทีมที่เพิ่งเปลี่ยนมาทำงานแบบ hybrid"
+
+
+async def fire(url: str, n: int, question: str) -> list[tuple[float, str]]:
+    async def one(client: httpx.AsyncClient) -> tuple[float, str]:
+        t0 = time.perf_counter()
+        ttft, body = None, []
+        async with client.stream("POST", url, json={"session_id": f"coalesce-{uuid.uuid4()}", "question": question}) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.aiter_text():
+                if ttft is None and chunk:
+                    ttft = time.perf_counter() - t0
+                body.append(chunk)
+        return (ttft or 0.0) * 1000, "".join(body)
+
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=n + 10)) as client:
+        return await asyncio.gather(*(one(client) for _ in range(n)))
+
+
+def run(url: str, n: int, single_flight: bool) -> tuple[int, bool]:
+    main.SINGLE_FLIGHT = single_flight
+    main.chat_llm.calls = 0
+    coalesced_before = main.single_flight.stats["coalesced"]
+    # คำถามใหม่ทุกรอบ เพื่อไม่ให้ติด answer cache ของรอบก่อน
+    results = asyncio.run(fire(url, n, f"{QUESTION} ({uuid.uuid4().hex[:8]})"))
+    ttfts = [r[0] for r in results]
+    identical = len({r[1] for r in results}) == 1
+    print(
+        f"single_flight={'on ' if single_flight else 'off'}  requests={n}  llm_calls={main.chat_llm.calls}  "
+        f"coalesced={main.single_flight.stats['coalesced'] - coalesced_before}  identical={identical}  "
+        f"ttft p50={statistics.median(ttfts):.1f}ms p99={pct(ttfts, 99):.1f}ms"
+    )
+    return main.chat_llm.calls, identical
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--compare", action="store_true", help="also run with single-flight disabled")
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--tokens-per-second", type=float, default=60.0)
+    ap.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    patch_offline()
+    patch_app(args.first_token_latency, args.tokens_per_second)
+    server = start_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/chat-stream"
+    try:
+        calls, identical = run(url, args.requests, single_flight=True)
+        if args.compare:
+            run(url, args.requests, single_flight=False)
+    finally:
+        server.should_exit = True
+    if calls != 1 or not identical:
+        print(f"FAIL: expected 1 LLM call and identical answers, got {calls} calls")
+        sys.exit(1)
+    print("OK: one upstream generation served every request")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,96 @@
+"""Filtered retrieval benchmark: pre-filter (IDSelector + BM25 allowed set) เทียบกับค้นทั้ง index แล้วกรองทีหลัง
+
+    python -m benchmarks.bench_filtered_retrieval                     # catalog 14 / 1,000 / 10,000 คอร์ส
+    python -m benchmarks.bench_filtered_retrieval --sizes 20000 -k 4
+
+fill@k = สัดส่วนช่องใน top-k ที่ได้ document ผ่าน filter (post-filter มักได้ไม่ครบ k)
+precision = สัดส่วนของผลค้นที่ผ่าน filter ก่อนตัดทิ้ง (pre-filter ต้องได้ 1.00)
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed
+from benchmarks.stubs import HashEmbeddings, ListCollection, synthetic_courses
+from course_index import CourseIndexManager
+from retrieval import FILTER_FIELDS, HybridRetriever, normalize
+
+WORKLOAD = [
+    ("อยากให้ทีมคิดนวัตกรรมใหม่ ๆ", {"family": ["Innovation & Design Thinking"]}),
+    ("คอร์สเรียนออนไลน์เรื่องการสื่อสาร", {"type": ["E-learning"]}),
+    ("อยากพัฒนาภาวะผู้นำ", {"duration": ["1 วัน"]}),
+    ("คอร์สที่ อ.ต้น สอน", {"facilitator": ["อ.ต้น"]}),
+    ("ทีมขายปิดการขายไม่ได้", {"family": ["Sale School"], "type": ["Workshop"]}),
+    ("การแก้ปัญหาและการตัดสินใจ", {"family": ["Personal Mastery", "Leadership"], "duration": ["2 วัน"]}),
+]
+
+
+def matches(doc, filters: dict, aliases: dict) -> bool:
+    meta = doc.metadata
+    for name, values in filters.items():
+        wanted = {aliases.get(normalize(v), normalize(v)) for v in values}
+        actual = meta.get(FILTER_FIELDS[name])
+        actual = {normalize(str(a)) for a in (actual if isinstance(actual, list) else [actual]) if a}
+        if not wanted & actual:
+            return False
+    return True
+
+
+def run(size: int, embeddings, k: int, repeat: int) -> None:
+    courses = synthetic_courses(size)
+    path = os.path.join(tempfile.mkdtemp(), "index")
+    manager = CourseIndexManager(ListCollection(courses), embeddings, path)
+    t0 = time.perf_counter()
+    manager.load_or_build()
+    build_s = time.perf_counter() - t0
+    hybrid = HybridRetriever(manager, embeddings)
+    # benchmark ไม่มี document วิทยากร จึงใส่ alias ชื่อเล่นให้ filter facilitator เอง
+    aliases = {normalize(f["nickname"]): normalize(f["_id"]) for f in seed.facilitators}
+    hybrid.snapshot = hybrid.snapshot._replace(facilitator_aliases=aliases)
+
+    results: dict[str, dict[str, list[float]]] = {m: {"lat": [], "fill": [], "precision": []} for m in ("post", "pre")}
+    for _ in range(repeat):
+        for question, filters in WORKLOAD:
+            t0 = time.perf_counter()
+            raw = hybrid.search(question, k)
+            docs = [d for d in raw if matches(d, filters, aliases)]
+            results["post"]["lat"].append((time.perf_counter() - t0) * 1000)
+            results["post"]["fill"].append(len(docs) / k)
+            results["post"]["precision"].append(len(docs) / len(raw) if raw else 1.0)
+
+            t0 = time.perf_counter()
+            docs = hybrid.search(question, k, filters=filters)
+            results["pre"]["lat"].append((time.perf_counter() - t0) * 1000)
+            results["pre"]["fill"].append(len(docs) / k)
+            results["pre"]["precision"].append(
+                sum(matches(d, filters, aliases) for d in docs) / len(docs) if docs else 1.0
+            )
+
+    print(f"catalog={size:>6} courses  index build={build_s:.2f}s")
+    for mode, label in (("post", "search+filter"), ("pre", "pre-filter")):
+        r = results[mode]
+        lat = sorted(r["lat"])
+        print(
+            f"  {label:14s} fill@{k}={statistics.mean(r['fill']):.2f}  precision={statistics.mean(r['precision']):.2f}"
+            f"  latency p50={statistics.median(lat):.2f}ms p99={lat[int(len(lat) * 0.99) - 1]:.2f}ms"
+        )
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[14, 1000, 10000])
+    ap.add_argument("-k", type=int, default=4)
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+    embeddings = HashEmbeddings()
+    for size in args.sizes:
+        run(size, embeddings, args.k, args.repeat)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,170 @@
+"""History store benchmark: 1 document ต่อ session ($push) เทียบกับ ChatStore (1 document ต่อข้อความ + batch write)
+
+ต้องมี MongoDB (MONGO_URI) — ใช้ database แยก (--db) และลบทิ้งเมื่อจบ (ยกเว้น --keep)
+
+    python -m benchmarks.bench_history                               # 100,000 session × 10 turn
+    python -m benchmarks.bench_history --sessions 10000 --turns 50
+
+วัด: เวลาเขียน turn ใหม่ภายใต้ concurrency, เวลาโหลดประวัติ (window ล่าสุด) และ /history หน้าแรก,
+plan ที่ Mongo เลือก (COLLSCAN / IXSCAN) และขนาด document ต่อ session
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson import ObjectId
+from pymongo import MongoClient
+
+from chat_store import BatchedChatWriter, ChatStore
+
+KEEP_MESSAGES = 12
+ANSWER = "คำตอบ " * 50
+
+
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def timed(fn, samples: list) -> list[float]:
+    out = []
+    for s in samples:
+        t0 = time.perf_counter()
+        fn(s)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def report(label: str, ms: list[float]) -> None:
+    print(f"  {label:34s} p50={statistics.median(ms):7.2f}ms  p99={pct(ms, 99):7.2f}ms")
+
+
+def legacy_save(collection, session_id: str, ts: datetime) -> None:
+    """รูปแบบเดิมของ _save_chat"""
+    collection.update_one(
+        {"session_id": session_id},
+        {"$push": {"messages": {"$each": [
+            {"sender": "user", "text": "คำถามใหม่", "timestamp": ts},
+            {"sender": "ai", "text": ANSWER, "timestamp": ts},
+        ]}}},
+        upsert=True,
+    )
+
+
+def seed(legacy, store: ChatStore, sessions: int, turns: int, chunk: int = 1000) -> None:
+    ts = datetime.utcnow()
+    for start in range(0, sessions, chunk):
+        ids = [f"s{i}" for i in range(start, min(sessions, start + chunk))]
+        legacy.insert_many([
+            {"session_id": sid, "messages": [
+                m for t in range(turns) for m in (
+                    {"sender": "user", "text": f"คำถามที่ {t}", "timestamp": ts},
+                    {"sender": "ai", "text": ANSWER, "timestamp": ts},
+                )
+            ]}
+            for sid in ids
+        ])
+        store.write_turns([
+            {"session_id": sid, "messages": [
+                {"_id": ObjectId(), "sender": "user", "text": f"คำถามที่ {t}", "timestamp": ts},
+                {"_id": ObjectId(), "sender": "ai", "text": ANSWER, "timestamp": ts},
+            ]}
+            for sid in ids for t in range(turns)
+        ])
+
+
+def winning_stage(explain: dict) -> str:
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " > ".join(stages) or "?"
+
+
+async def concurrent_writes(label: str, write, session_ids: list[str], concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(sid: str) -> None:
+        async with sem:
+            await write(sid)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(sid) for sid in session_ids))
+    wall = time.perf_counter() - t0
+    print(f"  {label:34s} {len(session_ids) / wall:8.0f} turns/s  ({wall:.2f}s for {len(session_ids)} turns)")
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=100000)
+    ap.add_argument("--turns", type=int, default=10)
+    ap.add_argument("--samples", type=int, default=1000)
+    ap.add_argument("--writes", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--db", default="minddojo_bench_history")
+    ap.add_argument("--keep", action="store_true", help="keep the benchmark database")
+    args = ap.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"), maxPoolSize=16)
+    client.drop_database(args.db)
+    db = client[args.db]
+    legacy = db["legacy_sessions"]
+    store = ChatStore(db["chat_sessions"], db["chat_messages"])
+    store.ensure_indexes()
+
+    t0 = time.perf_counter()
+    seed(legacy, store, args.sessions, args.turns)
+    print(f"seeded {args.sessions} sessions × {args.turns} turns in {time.perf_counter() - t0:.1f}s")
+
+    rng = random.Random(0)
+    samples = [f"s{rng.randrange(args.sessions)}" for _ in range(args.samples)]
+
+    print("plan for a single-session lookup:")
+    print(f"  legacy   {winning_stage(legacy.find({'session_id': samples[0]}).explain())}")
+    print(f"  messages {winning_stage(store.messages.find({'session_id': samples[0]}).sort('_id', -1).limit(KEEP_MESSAGES).explain())}")
+    sizes = [len(bson.encode(d)) for d in legacy.find({"session_id": {"$in": samples[:100]}})]
+    print(f"legacy document size: avg={statistics.mean(sizes) / 1024:.1f}KB (grows by ~{len(bson.encode({'m': [ANSWER]})) / 1024:.1f}KB per turn, 16MB cap)")
+
+    print("history load (last window):")
+    report("legacy find_one + $slice", timed(lambda sid: legacy.find_one(
+        {"session_id": sid}, {"_id": 0, "summary": 1, "messages": {"$slice": -KEEP_MESSAGES}}), samples))
+    report("ChatStore session + tail", timed(lambda sid: (store.session(sid), store.tail(sid, KEEP_MESSAGES)), samples))
+
+    print("/history first page (50):")
+    report("legacy whole document", timed(lambda sid: legacy.find_one({"session_id": sid}), samples))
+    report("ChatStore.page", timed(lambda sid: store.page(sid, 50), samples))
+
+    write_ids = [f"s{rng.randrange(args.sessions)}" for _ in range(args.writes)]
+    pool = ThreadPoolExecutor(max_workers=16)
+
+    async def run_blocking(fn, *a):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *a)
+
+    async def writes() -> None:
+        print(f"turn writes (concurrency={args.concurrency}):")
+        now = datetime.utcnow()
+        await concurrent_writes("legacy update_one $push", lambda sid: run_blocking(legacy_save, legacy, sid, now),
+                                write_ids, args.concurrency)
+        writer = BatchedChatWriter(store, run_blocking)
+        await concurrent_writes("BatchedChatWriter", lambda sid: writer.append(sid, "คำถามใหม่", ANSWER),
+                                write_ids, args.concurrency)
+        print(f"  batches={writer.stats['batches']} for {writer.stats['turns']} turns")
+
+    asyncio.run(writes())
+    pool.shutdown()
+    if not args.keep:
+        client.drop_database(args.db)
+
+
+if __name__ == "__main__":
+    main_cli()
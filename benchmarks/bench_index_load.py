@@ -0,0 +1,63 @@
+"""Cold-start benchmark: โหลด index bundle (mmap + JSON docstore) เทียบกับ FAISS.load_local (pickle)
+
+    python -m benchmarks.bench_index_load               # catalog 10,000 คอร์ส
+    python -m benchmarks.bench_index_load --size 50000
+"""
+import argparse
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.stubs import HashEmbeddings, ListCollection, synthetic_courses
+from course_index import CourseIndexManager
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--size", type=int, default=10000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    embeddings = HashEmbeddings()
+    collection = ListCollection(synthetic_courses(args.size))
+    bundle_path = os.path.join(tempfile.mkdtemp(), "index")
+    builder = CourseIndexManager(collection, embeddings, bundle_path)
+    builder.rebuild()
+    pickle_path = os.path.join(tempfile.mkdtemp(), "index")
+    builder.store.save_local(pickle_path)
+    print(f"catalog={args.size} courses  dim={builder.store.index.d}")
+
+    def load_bundle():
+        manager = CourseIndexManager(collection, embeddings, bundle_path)
+        manager.load_or_build()
+        return manager.store
+
+    def load_pickle():
+        return FAISS.load_local(pickle_path, embeddings, allow_dangerous_deserialization=True)
+
+    for label, fn in (("bundle (mmap)", load_bundle), ("pickle", load_pickle)):
+        times, growth = [], []
+        for _ in range(args.repeat):
+            before = rss_mb()
+            t0 = time.perf_counter()
+            store = fn()
+            times.append((time.perf_counter() - t0) * 1000)
+            growth.append(rss_mb() - before)
+            del store
+        print(f"  {label:14s} load p50={statistics.median(times):.1f}ms  rss growth p50={statistics.median(growth):.1f}MB")
+
+
+if __name__ == "__main__":
+    main_cli()
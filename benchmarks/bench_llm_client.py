@@ -0,0 +1,89 @@
+"""เทียบ time-to-first-token ระหว่างสร้าง ChatOpenAI ใหม่ทุก request กับใช้ client ที่แชร์ connection pool
+
+รัน OpenAI-compatible stub server บนเครื่อง แล้วยิง request ผ่าน langchain_openai จริง
+
+    python -m benchmarks.bench_llm_client --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from langchain.callbacks.streaming_aiter import AsyncIteratorCallbackHandler
+from langchain_openai import ChatOpenAI
+
+from benchmarks.stubs import openai_stub_app
+
+PROMPT = "หลักสูตร Design Thinking มีอะไรบ้าง?"
+
+
+def start_stub(port: int):
+    app = openai_stub_app()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, app
+
+
+async def ttft(make_llm) -> float:
+    handler = AsyncIteratorCallbackHandler()
+    t0 = time.perf_counter()
+    llm = make_llm()  # รวมเวลาสร้าง client ด้วย เหมือนที่ chat_stream เคยทำทุก request
+    task = asyncio.create_task(llm.ainvoke(PROMPT, config={"callbacks": [handler]}))
+    first = None
+    async for _ in handler.aiter():
+        if first is None:
+            first = time.perf_counter() - t0
+    await task
+    return first or 0.0
+
+
+async def run(mode: str, base_url: str, n: int, concurrency: int) -> list[float]:
+    shared = None
+    if mode == "pooled":
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+        shared = ChatOpenAI(model="gpt-4o-mini", streaming=True, base_url=base_url, api_key="sk-stub",
+                            http_async_client=client)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one() -> float:
+        async with sem:
+            if shared is not None:
+                return await ttft(lambda: shared)
+            return await ttft(lambda: ChatOpenAI(model="gpt-4o-mini", streaming=True, base_url=base_url,
+                                                 api_key="sk-stub"))
+
+    return await asyncio.gather(*(one() for _ in range(n)))
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    server, app = start_stub(args.port)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    try:
+        for mode in ("per-request", "pooled"):
+            app.state.connections.clear()
+            values = sorted(v * 1000 for v in asyncio.run(run(mode, base_url, args.requests, args.concurrency)))
+            print(
+                f"{mode:12s} ttft p50={statistics.median(values):7.1f}ms "
+                f"p99={values[int(0.99 * (len(values) - 1))]:7.1f}ms  tcp connections={len(app.state.connections)}"
+            )
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main_cli()
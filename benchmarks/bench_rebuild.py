@@ -0,0 +1,76 @@
+"""Index rebuild benchmark: StreamingIndexBuilder เทียบกับ FAISS.from_documents ทั้งก้อน — เวลาและ peak RSS
+
+    python -m benchmarks.bench_rebuild                          # 5,000 / 20,000 คอร์ส
+    python -m benchmarks.bench_rebuild --sizes 50000 --embed-latency 0.2
+
+แต่ละรอบรันใน process แยกเพื่อให้ peak RSS (ru_maxrss) ไม่ปนกัน; embed-latency จำลองเวลาต่อ request ของ API
+"""
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stubs import HashEmbeddings, ListCollection, synthetic_courses
+
+
+class SlowEmbeddings(HashEmbeddings):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        return super().embed_documents(texts)
+
+
+def _run(mode: str, size: int, latency: float, concurrency: int, queue) -> None:
+    from langchain_community.vectorstores import FAISS
+
+    from course_index import CourseIndexManager, course_to_document, document_key
+
+    collection = ListCollection(synthetic_courses(size))
+    embeddings = SlowEmbeddings(latency)
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if mode == "streaming":
+        manager = CourseIndexManager(collection, embeddings, os.path.join(tempfile.mkdtemp(), "index"))
+        manager.rebuild(concurrency=concurrency)
+    else:
+        documents = [course_to_document(c) for c in collection.find({})]
+        # from_documents ส่งทุกข้อความใน request เดียว — แบ่งเป็น 64 ต่อครั้งแบบเรียงลำดับเพื่อเทียบเวลา API ให้ยุติธรรม
+        vectors = [v for i in range(0, len(documents), 64)
+                   for v in embeddings.embed_documents([d.page_content for d in documents[i:i + 64]])]
+        FAISS.from_embeddings(
+            [(d.page_content, v) for d, v in zip(documents, vectors)], embeddings,
+            metadatas=[d.metadata for d in documents], ids=[document_key(d) for d in documents],
+        )
+    seconds = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((seconds, (peak - base_rss) / 1024))
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000])
+    ap.add_argument("--embed-latency", type=float, default=0.05)
+    ap.add_argument("--concurrency", type=int, default=4)
+    args = ap.parse_args()
+    for size in args.sizes:
+        for mode in ("in-memory", "streaming"):
+            queue = mp.Queue()
+            proc = mp.Process(target=_run, args=(mode, size, args.embed_latency, args.concurrency, queue))
+            proc.start()
+            seconds, peak_mb = queue.get()
+            proc.join()
+            index_mb = size * 1536 * 4 / 2**20
+            print(f"catalog={size:>6}  {mode:10s} {seconds:7.2f}s  {size / seconds:8.0f} docs/s  "
+                  f"peak RSS growth={peak_mb:7.1f}MB  (index vectors={index_mb:.0f}MB)")
+
+
+if __name__ == "__main__":
+    main_cli()
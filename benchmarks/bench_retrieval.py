@@ -0,0 +1,87 @@
+"""Retrieval benchmark บน catalog ของ seed.py: recall@k และ latency ของ dense / lexical / hybrid
+
+    python -m benchmarks.bench_retrieval            # HashEmbeddings (dense ไม่มีความหมายเชิง semantic)
+    python -m benchmarks.bench_retrieval --openai   # ใช้ OpenAIEmbeddings จริง (ผ่าน embedding cache)
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed
+from benchmarks.stubs import HashEmbeddings, ListCollection
+from course_index import CourseIndexManager
+from retrieval import HybridRetriever
+
+# คำถาม → course id ที่ควรอยู่ใน top-k
+WORKLOAD = [
+    ("Hackathon ราคาเท่าไหร่", {"c3"}),
+    ("Innovation Design Sprint (2 days) มีอะไรบ้าง", {"c2"}),
+    ("Innovation Design Sprint ใช้เวลากี่วัน", {"c2"}),
+    ("หลักสูตร Design Thinking มีอะไรบ้าง?", {"c1"}),
+    ("คอร์ส MBTI สำหรับสร้างทีม", {"c7"}),
+    ("อยากให้ทีมกล้าแสดงความคิดเห็น ไม่กลัวทำผิด", {"c6"}),
+    ("พนักงานขายไม่กล้าปิดการขาย", {"c14"}),
+    ("วางกลยุทธ์องค์กรให้ทุกหน่วยงานไปทางเดียวกัน", {"c5"}),
+    ("ทักษะการเจรจาต่อรอง", {"c9"}),
+    ("Growth Mindset in Practice", {"c10"}),
+    ("การแก้ปัญหาและการตัดสินใจ", {"c11"}),
+    ("บริหารโปรเจกต์แบบ Agile", {"c12"}),
+    ("พัฒนากรอบความคิดผู้นำ", {"c13"}),
+    ("การฟังและสื่อสารในทีม", {"c8"}),
+    ("อ.จี้ สอนคอร์สอะไรบ้าง", {"c1", "c2", "c3"}),
+]
+
+
+def build(embeddings):
+    path = os.path.join(tempfile.mkdtemp(), "index")
+    manager = CourseIndexManager(ListCollection(seed.courses), embeddings, path)
+    t0 = time.perf_counter()
+    manager.load_or_build()
+    build_s = time.perf_counter() - t0
+    return manager, HybridRetriever(manager, embeddings), build_s
+
+
+def run(mode: str, manager, hybrid, embeddings, k: int) -> tuple[float, float, int]:
+    recalls, latencies = [], []
+    calls_before = getattr(embeddings, "calls", getattr(embeddings, "misses", 0))
+    for question, expected in WORKLOAD:
+        t0 = time.perf_counter()
+        if mode == "dense":
+            keys = hybrid.dense_search(hybrid.snapshot, embeddings.embed_query(question), k)
+        elif mode == "lexical":
+            keys = [hybrid.snapshot.keys[i] for i, _ in hybrid.lexical.search(question, k)]
+        else:
+            keys = [d.metadata["id"] for d in hybrid.search(question, k)]
+        latencies.append((time.perf_counter() - t0) * 1000)
+        found = {manager.store.docstore._dict[key].metadata.get("id", key) for key in keys if key in manager.store.docstore._dict}
+        recalls.append(len(found & expected) / len(expected))
+    calls = getattr(embeddings, "calls", getattr(embeddings, "misses", 0)) - calls_before
+    return statistics.mean(recalls), statistics.median(latencies), calls
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-k", type=int, default=4)
+    ap.add_argument("--openai", action="store_true", help="ใช้ OpenAIEmbeddings จริงแทน HashEmbeddings")
+    args = ap.parse_args()
+
+    if args.openai:
+        from langchain_openai import OpenAIEmbeddings
+        from embedding_cache import CachedEmbeddings
+        embeddings = CachedEmbeddings(OpenAIEmbeddings(), "embedding_cache.sqlite3")
+    else:
+        embeddings = HashEmbeddings()
+    manager, hybrid, build_s = build(embeddings)
+    print(f"catalog={len(seed.courses)} courses  index build={build_s * 1000:.1f}ms")
+    for mode in ("dense", "lexical", "hybrid"):
+        recall, p50, calls = run(mode, manager, hybrid, embeddings, args.k)
+        print(f"{mode:8s} recall@{args.k}={recall:.2f}  latency p50={p50:.3f}ms  embedding calls={calls}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,64 @@
+"""เทียบเวลา stream ทั้งหมดและจำนวน chunk (= จำนวน write ลง socket) ระหว่าง
+การหน่วง 10ms ต่อ token แบบเดิม กับ coalescing stream writer
+
+    python -m benchmarks.bench_stream_writer
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from benchmarks.stubs import StubChatModel
+
+TOOL_ANSWER = ("จากประสบการณ์ของ MindDoJo แนะนำหลักสูตร: Psychological Safety in Action " * 10)[:600]
+
+
+async def llm_tokens(tokens_per_second: float):
+    stub = StubChatModel(first_token_latency=0, tokens_per_second=tokens_per_second)
+    for tok in stub._tokens():
+        yield tok
+        await asyncio.sleep(1 / tokens_per_second)
+
+
+async def legacy_tool():
+    for ch in TOOL_ANSWER:
+        yield ch
+        await asyncio.sleep(0.01)
+
+
+async def legacy_llm(tokens_per_second: float):
+    async for tok in llm_tokens(tokens_per_second):
+        yield tok
+        await asyncio.sleep(0.01)
+
+
+async def writer_tool():
+    yield TOOL_ANSWER
+
+
+async def measure(name: str, stream) -> None:
+    t0 = time.perf_counter()
+    chunks = 0
+    size = 0
+    async for chunk in stream:
+        chunks += 1
+        size += len(chunk.encode("utf-8"))
+    print(f"{name:28s} total={(time.perf_counter() - t0) * 1000:9.1f}ms  chunks={chunks:5d}  bytes={size}")
+
+
+async def run(tokens_per_second: float) -> None:
+    await measure("tool / legacy", legacy_tool())
+    await measure("tool / writer", writer_tool())
+    await measure("llm  / legacy", legacy_llm(tokens_per_second))
+    await measure("llm  / writer", main.coalesce_stream(llm_tokens(tokens_per_second)))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--tokens-per-second", type=float, default=200.0)
+    asyncio.run(run(ap.parse_args().tokens_per_second))
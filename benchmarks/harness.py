@@ -0,0 +1,332 @@
+"""Offline benchmark ของทั้ง service: seed catalog → build index → รัน worker จริง → ยิง workload ผ่าน /chat-stream
+
+ไม่เรียก OpenAI (HashEmbeddings + StubChatModel ผ่าน benchmarks.stub_app) แต่ต้องมี MongoDB (MONGO_URI)
+ใช้ database แยก (--db) และ work dir ชั่วคราว — ไม่แตะ index หรือข้อมูลจริง
+
+    python -m benchmarks.harness                                   # catalog 14 คอร์สของ seed.py, 1 worker
+    python -m benchmarks.harness --courses 5000 --workers 4 --concurrency 64
+    python -m benchmarks.harness --save-workload wl.jsonl          # เก็บ workload ไว้ replay
+    python -m benchmarks.harness --workload wl.jsonl --save report.json
+    python -m benchmarks.harness --workload wl.jsonl --baseline report.json   # exit 1 ถ้าแย่ลงเกิน --tolerance
+
+รายงาน: throughput, TTFT / latency (p50/p95/p99) แยกตามประเภทคำถาม, เวลา build index,
+เวลาเริ่ม worker จนพร้อม (readyz) และหน่วยความจำต่อ worker (RSS / peak RSS)
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+from pymongo import MongoClient
+
+import seed
+from benchmarks.stubs import HashEmbeddings, synthetic_courses
+from course_index import CourseIndexManager
+
+# ---------- workload ----------
+TOOL_QUESTIONS = [
+    "คนในทีมทะเลาะกันบ่อย ควรแก้อย่างไร",
+    "องค์กรมีความขัดแย้งระหว่างแผนก อยากได้คอร์ส",
+    "อยากพัฒนาภาวะผู้นำให้หัวหน้างานใหม่",
+    "ทีมคิดไอเดียใหม่ ๆ ไม่ออก",
+]
+SCENARIO_QUESTIONS = [
+    "พนักงานขายไม่กล้าปิดการขาย ควรเรียนคอร์สไหน",
+    "วางกลยุทธ์องค์กรให้ทุกหน่วยงานไปทางเดียวกัน",
+    "ทีมสื่อสารกันไม่เข้าใจ งานผิดพลาดบ่อย",
+    "อยากให้พนักงานกล้าแสดงความคิดเห็นในที่ประชุม",
+    "ต้องการบริหารโปรเจกต์ให้ยืดหยุ่นขึ้น",
+    "หัวหน้าตัดสินใจช้า แก้ปัญหาไม่เป็นระบบ",
+    "อ.จี้ สอนคอร์สอะไรบ้าง",
+    "มีคอร์สเจรจาต่อรองสำหรับทีมจัดซื้อไหม",
+]
+FOLLOW_UPS = ["ใช้เวลากี่วัน", "ราคาเท่าไหร่", "วิทยากรคือใคร", "เหมาะกับพนักงานระดับไหน"]
+MIX = {"tool": 0.2, "lookup": 0.3, "scenario": 0.5}
+
+
+def make_workload(sessions: int, courses: list[dict], seed_value: int = 0, max_turns: int = 3) -> list[dict]:
+    """workload แบบ deterministic: แต่ละ session ถาม 1..max_turns คำถาม (turn ถัดไปเป็นคำถามต่อเนื่องที่ใช้ประวัติ)"""
+    rng = random.Random(seed_value)
+    titles = [c["title"] for c in courses]
+    items = []
+    for s in range(sessions):
+        category = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+        if category == "tool":
+            question = rng.choice(TOOL_QUESTIONS)
+        elif category == "lookup":
+            question = f"หลักสูตร {rng.choice(titles)} มีอะไรบ้าง"
+        else:
+            question = rng.choice(SCENARIO_QUESTIONS)
+        items.append({"session": f"w{s}", "category": category, "question": question})
+        for _ in range(rng.randint(0, max_turns - 1)):
+            items.append({"session": f"w{s}", "category": "follow_up", "question": rng.choice(FOLLOW_UPS)})
+    return items
+
+
+def load_workload(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_workload(path: str, items: list[dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+# ---------- setup ----------
+def seed_catalog(db, n: int) -> list[dict]:
+    courses = synthetic_courses(max(n, len(seed.courses)))
+    for start in range(0, len(courses), 1000):
+        db["courses"].insert_many(courses[start:start + 1000])
+    db["facilitators"].insert_many([dict(f) for f in seed.facilitators])
+    return courses
+
+
+def build_index(db, work_dir: str) -> float:
+    manager = CourseIndexManager(db["courses"], HashEmbeddings(), os.path.join(work_dir, "minddojo_courses.index"),
+                                 facilitators_collection=db["facilitators"])
+    t0 = time.perf_counter()
+    manager.load_or_build()
+    return time.perf_counter() - t0
+
+
+def start_workers(args, work_dir: str) -> tuple[subprocess.Popen, float]:
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        "MONGO_DB": args.db,
+        "INTENT_RULES_PATH": os.path.join(ROOT, "intent_rules.json"),
+        "EMBED_CACHE_PATH": os.path.join(work_dir, "embedding_cache.sqlite3"),
+        "STUB_FIRST_TOKEN_LATENCY": str(args.first_token_latency),
+        "STUB_TOKENS_PER_SECOND": str(args.tokens_per_second),
+        "INDEX_WATCH": "0",
+    }
+    cmd = [sys.executable, "-m", "uvicorn", "benchmarks.stub_app:app", "--host", "127.0.0.1",
+           "--port", str(args.port), "--workers", str(args.workers), "--log-level", "warning"]
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=work_dir, env=env)
+    url = f"http://127.0.0.1:{args.port}/readyz"
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return proc, time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("server did not become ready in time")
+
+
+# ---------- memory ----------
+def _children(pid: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _status_kb(pid: int, field: str) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _cmdline(pid: int) -> bytes:
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def worker_memory(root_pid: int) -> list[dict]:
+    """RSS / peak RSS ของ process ที่รับ request (worker) — ถ้ารัน 1 worker คือ process หลักเอง"""
+    # uvicorn --workers N: process หลักเป็น supervisor, worker ถูก spawn ด้วย multiprocessing (ไม่นับ resource tracker)
+    workers = [p for p in _children(root_pid) if b"spawn_main" in _cmdline(p)] or [root_pid]
+    return [{"pid": p, "rss_mb": _status_kb(p, "VmRSS") / 1024, "peak_rss_mb": _status_kb(p, "VmHWM") / 1024}
+            for p in workers]
+
+
+# ---------- load ----------
+async def replay(url: str, items: list[dict], concurrency: int, run_id: str) -> tuple[list[dict], float]:
+    """แต่ละ session ถามทีละ turn ตามลำดับ; มีได้ concurrency session พร้อมกัน"""
+    sessions: dict[str, list[dict]] = {}
+    for item in items:
+        sessions.setdefault(item["session"], []).append(item)
+    sem = asyncio.Semaphore(concurrency)
+    results: list[dict] = []
+
+    async def one(client: httpx.AsyncClient, session_id: str, item: dict) -> None:
+        t0 = time.perf_counter()
+        ttft, size, error = None, 0, None
+        try:
+            async with client.stream("POST", url, json={"session_id": session_id, "question": item["question"]}) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.aiter_bytes():
+                    if ttft is None and chunk:
+                        ttft = time.perf_counter() - t0
+                    size += len(chunk)
+        except httpx.HTTPError as e:
+            error = repr(e)
+        results.append({"category": item["category"], "ttft": ttft, "total": time.perf_counter() - t0,
+                        "bytes": size, "error": error})
+
+    async def run_session(client: httpx.AsyncClient, name: str, turns: list[dict]) -> None:
+        async with sem:
+            for item in turns:
+                await one(client, f"{run_id}-{name}", item)
+
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(run_session(client, name, turns) for name, turns in sessions.items()))
+        wall = time.perf_counter() - t0
+    return results, wall
+
+
+# ---------- report ----------
+def pct(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def summarize(results: list[dict]) -> dict:
+    ok = [r for r in results if r["error"] is None]
+    ttft = [r["ttft"] * 1000 for r in ok if r["ttft"] is not None]
+    total = [r["total"] * 1000 for r in ok]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "ttft_ms": {"p50": pct(ttft, 50), "p95": pct(ttft, 95), "p99": pct(ttft, 99)},
+        "total_ms": {"p50": pct(total, 50), "p95": pct(total, 95), "p99": pct(total, 99)},
+    }
+
+
+def build_report(args, results: list[dict], wall: float, index_build_s: float, startup_s: float,
+                 memory: list[dict]) -> dict:
+    categories = sorted({r["category"] for r in results})
+    return {
+        "config": {"courses": args.courses, "workers": args.workers, "concurrency": args.concurrency,
+                   "first_token_latency": args.first_token_latency, "tokens_per_second": args.tokens_per_second},
+        "throughput_rps": len(results) / wall if wall else 0.0,
+        "wall_s": wall,
+        "index_build_s": index_build_s,
+        "startup_s": startup_s,
+        "overall": summarize(results),
+        "by_category": {c: summarize([r for r in results if r["category"] == c]) for c in categories},
+        "workers": memory,
+    }
+
+
+def print_report(report: dict) -> None:
+    cfg = report["config"]
+    print(f"\ncourses={cfg['courses']}  workers={cfg['workers']}  concurrency={cfg['concurrency']}  "
+          f"llm stub: first token {cfg['first_token_latency']}s, {cfg['tokens_per_second']:g} tok/s")
+    print(f"index build {report['index_build_s']:.2f}s   worker startup → ready {report['startup_s']:.2f}s")
+    print(f"throughput {report['throughput_rps']:.1f} req/s   ({report['overall']['requests']} requests in "
+          f"{report['wall_s']:.1f}s, {report['overall']['errors']} errors)")
+    print(f"  {'category':10s} {'n':>5s} {'ttft p50':>9s} {'p95':>8s} {'p99':>8s} {'total p50':>10s} {'p99':>8s}")
+    for name, s in [("overall", report["overall"]), *report["by_category"].items()]:
+        t, tot = s["ttft_ms"], s["total_ms"]
+        print(f"  {name:10s} {s['requests']:5d} {t['p50']:8.1f}ms {t['p95']:6.1f}ms {t['p99']:6.1f}ms "
+              f"{tot['p50']:8.1f}ms {tot['p99']:6.1f}ms")
+    for w in report["workers"]:
+        print(f"  worker pid={w['pid']}  rss={w['rss_mb']:.0f}MB  peak={w['peak_rss_mb']:.0f}MB")
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """ค่าที่แย่ลงเกิน tolerance (สัดส่วน) เทียบกับ baseline"""
+    checks = [
+        ("throughput_rps", report["throughput_rps"], baseline["throughput_rps"], False),
+        ("ttft p99", report["overall"]["ttft_ms"]["p99"], baseline["overall"]["ttft_ms"]["p99"], True),
+        ("total p99", report["overall"]["total_ms"]["p99"], baseline["overall"]["total_ms"]["p99"], True),
+        ("index_build_s", report["index_build_s"], baseline["index_build_s"], True),
+        ("worker peak rss", max(w["peak_rss_mb"] for w in report["workers"]),
+         max(w["peak_rss_mb"] for w in baseline["workers"]), True),
+    ]
+    failed = []
+    for name, now, before, higher_is_worse in checks:
+        if not before:
+            continue
+        change = (now - before) / before
+        if (change if higher_is_worse else -change) > tolerance:
+            failed.append(f"{name}: {before:.1f} → {now:.1f} ({change:+.0%})")
+    return failed
+
+
+def main_cli() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--courses", type=int, default=len(seed.courses), help="scale the seed.py catalog up to N courses")
+    ap.add_argument("--sessions", type=int, default=200, help="sessions in a generated workload")
+    ap.add_argument("--workload", help="replay questions from a JSON lines file")
+    ap.add_argument("--save-workload", help="write the generated workload and continue")
+    ap.add_argument("--workload-seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=32, help="sessions in flight")
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--tokens-per-second", type=float, default=60.0)
+    ap.add_argument("--port", type=int, default=8777)
+    ap.add_argument("--startup-timeout", type=float, default=300)
+    ap.add_argument("--db", default="minddojo_bench")
+    ap.add_argument("--save", help="write the report as JSON")
+    ap.add_argument("--baseline", help="compare with a saved report and exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    client.drop_database(args.db)
+    db = client[args.db]
+    courses = seed_catalog(db, args.courses)
+    items = load_workload(args.workload) if args.workload else make_workload(args.sessions, courses, args.workload_seed)
+    if args.save_workload:
+        save_workload(args.save_workload, items)
+
+    work_dir = tempfile.mkdtemp(prefix="minddojo-bench-")
+    proc = None
+    try:
+        index_build_s = build_index(db, work_dir)
+        proc, startup_s = start_workers(args, work_dir)
+        url = f"http://127.0.0.1:{args.port}/chat-stream"
+        results, wall = asyncio.run(replay(url, items, args.concurrency, uuid.uuid4().hex[:8]))
+        memory = worker_memory(proc.pid)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=60)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        client.drop_database(args.db)
+
+    report = build_report(args, results, wall, index_build_s, startup_s, memory)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failed = regressions(report, json.load(f), args.tolerance)
+        for line in failed:
+            print(f"REGRESSION {line}")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,29 @@
+"""main.app ที่ใช้ HashEmbeddings / StubChatModel แทน OpenAI — สำหรับรันด้วย uvicorn แบบหลาย worker
+
+    STUB_FIRST_TOKEN_LATENCY=0.3 STUB_TOKENS_PER_SECOND=60 \\
+        uvicorn benchmarks.stub_app:app --workers 4
+
+ทุก worker import module นี้เอง จึงต้องเปลี่ยน class ของ langchain_openai ก่อน import main
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-stub")
+
+import langchain_openai
+
+from benchmarks.stubs import HashEmbeddings, StubChatModel
+
+
+def _stub_chat_model(**kwargs) -> StubChatModel:
+    return StubChatModel(
+        first_token_latency=float(os.getenv("STUB_FIRST_TOKEN_LATENCY", "0.3")),
+        tokens_per_second=float(os.getenv("STUB_TOKENS_PER_SECOND", "60")),
+    )
+
+
+langchain_openai.OpenAIEmbeddings = HashEmbeddings
+langchain_openai.ChatOpenAI = _stub_chat_model
+
+import main  # noqa: E402
+
+app = main.app
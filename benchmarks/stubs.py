@@ -0,0 +1,182 @@
+"""Local stand-ins สำหรับ benchmark — ไม่เรียก OpenAI จริง"""
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Iterator
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StubChatModel(BaseChatModel):
+    """Chat model ปลอมที่สตรีม token ตามอัตราที่กำหนด"""
+
+    streaming: bool = True
+    answer: str = "หลักสูตร **Design Thinking** เหมาะกับทีมที่ต้องการสร้างนวัตกรรม " * 8
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 60.0
+    calls: int = 0
+    emitted: int = 0  # token ที่ส่งออกไปแล้ว (รวมทุก call)
+    cancelled: int = 0  # stream ที่ถูกปิดก่อนจบ
+    fail_after: int | None = None  # จำลอง provider error หลังส่ง token ไปแล้วกี่ตัว
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _should_stream(self, *, async_api: bool, run_manager=None, **kwargs: Any) -> bool:
+        return self.streaming
+
+    def _tokens(self) -> list[str]:
+        words = self.answer.split(" ")
+        return [w + " " for w in words[:-1]] + [words[-1]]
+
+    def _generate(self, messages: list[BaseMessage], stop=None,
+                  run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def _stream(self, messages: list[BaseMessage], stop=None,
+                run_manager: CallbackManagerForLLMRun | None = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        for tok in self._tokens():
+            if run_manager:
+                run_manager.on_llm_new_token(tok)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=tok))
+
+    async def _astream(self, messages: list[BaseMessage], stop=None,
+                       run_manager: AsyncCallbackManagerForLLMRun | None = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.first_token_latency)
+            delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0
+            for i, tok in enumerate(self._tokens()):
+                if self.fail_after is not None and i >= self.fail_after:
+                    raise RuntimeError("stub provider error")
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=tok))
+                if run_manager:
+                    await run_manager.on_llm_new_token(tok, chunk=chunk)
+                self.emitted += 1
+                yield chunk
+                if delay:
+                    await asyncio.sleep(delay)
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+
+
+class HashEmbeddings(Embeddings):
+    """Embedding แบบ deterministic จาก hash ของข้อความ (ไม่มีความหมายเชิง semantic)"""
+
+    def __init__(self, dim: int = 1536):
+        self.dim = dim
+        self.calls = 0
+
+    def _vec(self, text: str) -> list[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += len(texts)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return self._vec(text)
+
+
+def openai_stub_app(answer: str = "หลักสูตร Design Thinking เหมาะกับทีม " * 8,
+                    first_token_latency: float = 0.05, tokens_per_second: float = 200.0):
+    """FastAPI app ที่เลียนแบบ /v1/chat/completions แบบ stream ของ OpenAI (SSE)"""
+    import json
+    import time
+
+    from fastapi import FastAPI, Request
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    app.state.connections = set()
+
+    def frame(rid: str, model: str, delta: dict, finish: str | None = None) -> str:
+        body = {
+            "id": rid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+        return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+        app.state.connections.add((request.client.host, request.client.port))
+        model = payload.get("model", "stub")
+        rid = "chatcmpl-stub"
+
+        async def events():
+            await asyncio.sleep(first_token_latency)
+            yield frame(rid, model, {"role": "assistant", "content": ""})
+            for word in answer.split(" "):
+                yield frame(rid, model, {"content": word + " "})
+                await asyncio.sleep(1 / tokens_per_second)
+            yield frame(rid, model, {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class ListCursor:
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def sort(self, key: str, direction: int = 1) -> "ListCursor":
+        return ListCursor(sorted(self.docs, key=lambda d: d[key], reverse=direction < 0))
+
+    def batch_size(self, size: int) -> "ListCursor":
+        return self
+
+    def __iter__(self):
+        return iter(list(self.docs))
+
+
+class ListCollection:
+    """collection แบบ in-memory ที่รองรับแค่ find() (และ {"_id": {"$gt": ...}}) สำหรับ build index ใน benchmark โดยไม่ต้องมี Mongo"""
+
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def find(self, query: dict | None = None, projection: dict | None = None, **kwargs) -> ListCursor:
+        after = (query or {}).get("_id", {}).get("$gt")
+        return ListCursor([d for d in self.docs if after is None or d["_id"] > after])
+
+
+def synthetic_courses(n: int, seed: int = 0) -> list[dict]:
+    """ขยาย catalog ของ seed.py เป็น n คอร์ส — ข้อความมาจากคอร์สจริง ส่วน family/type/duration/วิทยากรสุ่มใหม่"""
+    import random
+
+    import seed as seed_data
+
+    rng = random.Random(seed)
+    base = seed_data.courses
+    families = sorted({c["family"] for c in base if c.get("family")})
+    types = sorted({c["type"] for c in base if c.get("type")})
+    durations = ["1 วัน", "2 วัน", "3 วัน", "6 ชั่วโมง"]
+    fac_ids = [f["_id"] for f in seed_data.facilitators]
+    courses = [dict(c) for c in base[:n]]
+    for i in range(len(courses), n):
+        src = base[i % len(base)]
+        courses.append({
+            **src,
+            "_id": f"s{i}",
+            "title": f"{src['title']} #{i}",
+            "family": rng.choice(families),
+            "type": rng.choice(types),
+            "duration": rng.choice(durations),
+            "facilitators_ids": rng.sample(fac_ids, rng.randint(1, 3)),
+        })
+    return courses
@@ -0,0 +1,104 @@
+# catalog.py — snapshot ของ courses/facilitators ในหน่วยความจำ สำหรับตอบคำถามที่ระบุชื่อคอร์สตรง ๆ
+import logging
+import re
+
+from retrieval import normalize
+
+logger = logging.getLogger("minddojo.catalog")
+
+NOT_FOUND = "ไม่พบข้อมูล กรุณาติดต่อฝ่ายพัฒนาเพิ่มเติม"
+_PARENS = re.compile(r"\s*\([^)]*\)")
+# ส่วนที่เหลือของคำถามหลังตัดชื่อคอร์สออกซึ่งถือว่า "ถามรายละเอียดของคอร์สนี้" — เหลืออย่างอื่นแปลว่าถามเรื่องอื่นที่แค่เอ่ยชื่อคอร์ส
+_DETAIL_WORDS = (
+    "มีอะไรบ้าง", "มีอะไร", "รายละเอียด", "ข้อมูล", "เกี่ยวกับ", "เนื้อหา", "วัตถุประสงค์", "สอนอะไร", "เรียนอะไร",
+    "ราคา", "ค่าใช้จ่าย", "เท่าไหร่", "เท่าไร", "กี่บาท", "กี่วัน", "กี่ชั่วโมง", "ใช้เวลา", "ระยะเวลา",
+    "ใครสอน", "สอนโดย", "วิทยากร", "ผู้สอน", "คืออะไร", "คือ", "อะไร", "หลักสูตร", "คอร์ส", "ของ", "ขอ", "บอก",
+    "หน่อย", "ครับ", "ค่ะ", "คะ", "จ้า", "นะ", "ไหม", "มั้ย", "price", "duration", "details", "detail", "info",
+)
+_DETAIL_ASK = re.compile("|".join(re.escape(w) for w in sorted(_DETAIL_WORDS, key=len, reverse=True)))
+_NOISE = re.compile(r"[\s\W_]+")
+
+
+def facilitator_display(fac: dict) -> str:
+    name, nickname = fac.get("name", ""), fac.get("nickname", "")
+    return f"{name} ({nickname})" if nickname else name
+
+
+class CourseCatalog:
+    """โหลด courses + facilitators ทั้งชุดจาก Mongo แล้วสร้าง index ชื่อคอร์ส/ชื่อเรียกอื่น → course
+
+    refresh() สร้าง snapshot ใหม่แล้วสลับทีเดียว (เรียกซ้ำได้ทุกครั้งที่ catalog เปลี่ยน)
+    """
+
+    def __init__(self, courses_collection, facilitators_collection):
+        self.courses_collection = courses_collection
+        self.facilitators_collection = facilitators_collection
+        self.courses: dict[str, dict] = {}
+        self.facilitators: dict[str, dict] = {}
+        self._aliases: list[tuple[str, str]] = []  # (alias, course_id) เรียงจากยาวไปสั้น
+        self._summaries: dict[tuple[str, str], str] = {}
+
+    def refresh(self) -> None:
+        courses = {str(c["_id"]): c for c in self.courses_collection.find({})}
+        facilitators = {str(f["_id"]): f for f in self.facilitators_collection.find({})}
+        aliases: dict[str, str] = {}
+        for cid, course in courses.items():
+            title = normalize(course.get("title", ""))
+            names = {title, _PARENS.sub("", title).strip()}
+            names.update(normalize(a) for a in course.get("aliases", []))
+            for alias in names:
+                if len(alias) >= 4:
+                    aliases.setdefault(alias, cid)
+        self.courses, self.facilitators = courses, facilitators
+        self._aliases = sorted(aliases.items(), key=lambda x: len(x[0]), reverse=True)
+        logger.info("catalog refreshed: %d courses, %d facilitators", len(courses), len(facilitators))
+
+    def match(self, question: str) -> list[dict]:
+        """คอร์สที่ชื่อ (หรือ alias) ปรากฏในคำถาม — ไม่นับชื่อที่เป็นส่วนหนึ่งของชื่อที่ยาวกว่าซึ่ง match ไปแล้ว"""
+        q = normalize(question)
+        matched: list[str] = []
+        ids: list[str] = []
+        for alias, cid in self._aliases:
+            if alias in q and not any(alias in longer for longer in matched):
+                matched.append(alias)
+                if cid not in ids:
+                    ids.append(cid)
+        return [self.courses[cid] for cid in ids]
+
+    def detail_match(self, question: str) -> dict | None:
+        """คอร์สเดียวที่คำถามถามรายละเอียดโดยตรง (เช่น "Design Thinking ราคาเท่าไหร่") — None ถ้าคำถามมีเรื่องอื่นด้วย"""
+        q = normalize(question)
+        matched = self.match(question)
+        if len(matched) != 1:
+            return None
+        cid = str(matched[0]["_id"])
+        for alias, alias_cid in self._aliases:
+            if alias_cid == cid:
+                q = q.replace(alias, " ")
+        return matched[0] if not _NOISE.sub("", _DETAIL_ASK.sub("", q)) else None
+
+    def facilitator_names(self, course: dict) -> list[str]:
+        return [
+            facilitator_display(self.facilitators[fid])
+            for fid in course.get("facilitators_ids", [])
+            if fid in self.facilitators
+        ]
+
+    def cached_summary(self, course: dict) -> str | None:
+        return self._summaries.get((str(course["_id"]), course.get("description", "")))
+
+    def remember_summary(self, course: dict, summary: str) -> None:
+        self._summaries[(str(course["_id"]), course.get("description", ""))] = summary
+
+    def render(self, course: dict, description: str | None = None) -> str:
+        """ตอบตามรูปแบบ "วิธีการตอบ #1" ใน SYSTEM_INSTRUCT จาก record โดยตรง"""
+        names = self.facilitator_names(course)
+        objectives = [o for o in course.get("objectives", []) if o]
+        return (
+            f"หลักสูตร **{course.get('title', '')}**\n"
+            f"- คำอธิบาย: {description or course.get('description') or NOT_FOUND}\n"
+            f"- วัตถุประสงค์: {', '.join(objectives) if objectives else NOT_FOUND}\n"
+            f"- ระยะเวลา: {course.get('duration') or NOT_FOUND}\n"
+            f"- ราคา: {course.get('price') or NOT_FOUND}\n"
+            f"- วิทยากร: {', '.join(names) if names else NOT_FOUND}"
+        )
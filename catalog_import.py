@@ -0,0 +1,203 @@
+# catalog_import.py — นำเข้า catalog ทั้งชุด (courses / facilitators) โดยไม่มีช่วงที่ service เห็น catalog ว่าง
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from bson import json_util
+from pymongo import InsertOne, ReplaceOne
+
+logger = logging.getLogger("minddojo.catalog_import")
+
+META_COLLECTION = "catalog_meta"
+META_ID = "catalog"
+# field ที่เป็น list — ใน CSV คั่นด้วย list_separator
+LIST_FIELDS = ("objectives", "facilitators_ids", "aliases", "expertise", "workshop", "training_style")
+MAX_REPORTED_ERRORS = 20
+
+
+class CatalogImportError(ValueError):
+    """ข้อมูลที่นำเข้าไม่ผ่านการตรวจ — errors คือรายการปัญหาทั้งหมดที่พบ"""
+
+    def __init__(self, errors: list[str]):
+        shown = "\n".join(f"  - {e}" for e in errors[:MAX_REPORTED_ERRORS])
+        more = f"\n  ... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+        super().__init__(f"{len(errors)} problem(s) in catalog import:\n{shown}{more}")
+        self.errors = errors
+
+
+def read_records(path: str, list_separator: str = ";") -> list[dict]:
+    """อ่าน .json (array), .jsonl หรือ .csv — JSON รองรับ extended JSON ของ Mongo เช่น {"$oid": ...}"""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            return [_csv_record(row, list_separator) for row in csv.DictReader(f)]
+        if ext in (".jsonl", ".ndjson"):
+            return [json_util.loads(line) for line in f if line.strip()]
+        data = json_util.loads(f.read())
+    if not isinstance(data, list):
+        raise CatalogImportError([f"{path}: expected a JSON array of records"])
+    return data
+
+
+def _csv_record(row: dict, list_separator: str) -> dict:
+    record = {}
+    for key, value in row.items():
+        if key is None:  # แถวที่มีคอลัมน์เกิน header
+            continue
+        key, value = key.strip(), (value or "").strip()
+        if key == "id" and "_id" not in row:
+            key = "_id"
+        if key in LIST_FIELDS:
+            record[key] = [v.strip() for v in value.split(list_separator) if v.strip()]
+        elif value:
+            record[key] = value
+    return record
+
+
+def validate(courses: list[dict] | None, facilitators: list[dict] | None,
+             live_courses=None, live_facilitators=None) -> list[str]:
+    """ตรวจ _id ซ้ำ/หาย, ชื่อคอร์ส, ชนิดของ field ที่เป็น list และ facilitators_ids ที่อ้างถึงวิทยากรที่ไม่มีอยู่
+
+    ไม่ได้นำเข้าฝั่งไหน ใช้ข้อมูลที่ใช้งานอยู่ (live_*) ของฝั่งนั้นตรวจการอ้างอิงแทน
+    """
+    errors: list[str] = []
+    for kind, records in (("course", courses), ("facilitator", facilitators)):
+        seen = set()
+        for i, record in enumerate(records or []):
+            rid = record.get("_id")
+            if rid in (None, ""):
+                errors.append(f"{kind} #{i + 1}: missing _id")
+                continue
+            if rid in seen:
+                errors.append(f"{kind} {rid!r}: duplicate _id")
+            seen.add(rid)
+            if kind == "course" and not record.get("title"):
+                errors.append(f"course {rid!r}: missing title")
+            for field in LIST_FIELDS:
+                if field in record and not isinstance(record[field], list):
+                    errors.append(f"{kind} {rid!r}: {field} must be a list")
+
+    if facilitators is not None:
+        known = {f.get("_id") for f in facilitators}
+    elif live_facilitators is not None:
+        known = {f["_id"] for f in live_facilitators.find({}, {"_id": 1})}
+    else:
+        known = set()
+    if courses is not None:
+        referencing = courses
+    elif live_courses is not None:
+        referencing = live_courses.find({"facilitators_ids.0": {"$exists": True}}, {"facilitators_ids": 1})
+    else:
+        referencing = []
+    for course in referencing:
+        fac_ids = course.get("facilitators_ids", [])
+        if not isinstance(fac_ids, list):
+            continue
+        missing = [fid for fid in fac_ids if fid not in known]
+        if missing:
+            errors.append(f"course {course.get('_id')!r}: unknown facilitators_ids {missing}")
+    return errors
+
+
+def records_version(courses: list[dict] | None, facilitators: list[dict] | None) -> str:
+    """hash ของข้อมูลที่นำเข้า — นำเข้าชุดเดิมซ้ำได้ staging ชื่อเดิม (ทำต่อจากที่ค้างได้)"""
+    payload = json.dumps([courses, facilitators], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CatalogImporter:
+    """เขียนข้อมูลลง staging collection ของ version นั้น แล้วสลับเข้า collection จริงด้วย renameCollection(dropTarget)
+
+    - reader เห็น collection ชุดเก่าหรือชุดใหม่ครบ ๆ เสมอ (rename เป็น atomic ต่อ collection)
+      facilitators ถูกสลับก่อน courses เพื่อให้คอร์สชุดใหม่อ้างถึงวิทยากรที่มีอยู่แล้วเสมอ
+    - เขียน catalog_meta หลังสลับเสร็จ — watcher ของทุก worker เห็นการเปลี่ยนนี้แล้ว sync index
+      (embed ใหม่เฉพาะ document ที่ hash เปลี่ยน) และโหลด catalog ใหม่
+    """
+
+    def __init__(self, db, courses: str = "courses", facilitators: str = "facilitators",
+                 meta: str = META_COLLECTION, batch_size: int = 1000):
+        self.db = db
+        self.names = {"courses": courses, "facilitators": facilitators}
+        self.meta = db[meta]
+        self.batch_size = batch_size
+
+    def run(self, courses: list[dict] | None = None, facilitators: list[dict] | None = None,
+            dry_run: bool = False) -> dict:
+        if courses is None and facilitators is None:
+            raise CatalogImportError(["nothing to import"])
+        t0 = time.perf_counter()
+        errors = validate(
+            courses, facilitators,
+            live_courses=self.db[self.names["courses"]], live_facilitators=self.db[self.names["facilitators"]],
+        )
+        if errors:
+            raise CatalogImportError(errors)
+        version = records_version(courses, facilitators)
+        stats = {
+            "version": version[:16],
+            "courses": None if courses is None else len(courses),
+            "facilitators": None if facilitators is None else len(facilitators),
+        }
+        if dry_run:
+            return stats
+
+        staged = []
+        # facilitators ก่อน courses (ทั้งตอนเขียน staging และตอนสลับ)
+        for kind, records in (("facilitators", facilitators), ("courses", courses)):
+            if records is None:
+                continue
+            staging = self.db[f"{self.names[kind]}_import_{version[:16]}"]
+            self._load(staging, records)
+            staged.append((kind, staging))
+        stats["load_s"] = round(time.perf_counter() - t0, 3)
+
+        previous = (self.meta.find_one({"_id": META_ID}) or {}).get("version")
+        for kind, staging in staged:
+            self._copy_indexes(self.db[self.names[kind]], staging)
+            staging.rename(self.names[kind], dropTarget=True)
+        self.meta.update_one(
+            {"_id": META_ID},
+            {"$set": {
+                "version": stats["version"],
+                "previous_version": previous,
+                "imported_at": datetime.now(timezone.utc),
+                "courses": self.db[self.names["courses"]].estimated_document_count(),
+                "facilitators": self.db[self.names["facilitators"]].estimated_document_count(),
+            }},
+            upsert=True,
+        )
+        self._drop_stale_staging()
+        stats["seconds"] = round(time.perf_counter() - t0, 3)
+        logger.info("catalog imported: %s", stats)
+        return stats
+
+    def _load(self, staging, records: list[dict]) -> None:
+        """bulk_write ทีละ batch — staging ว่างใช้ insert ล้วน (เร็วสุด); staging ที่ค้างจาก import ครั้งก่อนใช้ upsert ทับ"""
+        resume = staging.estimated_document_count() > 0
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            ops = [ReplaceOne({"_id": r["_id"]}, r, upsert=True) if resume else InsertOne(r) for r in batch]
+            staging.bulk_write(ops, ordered=False)
+        # staging ของ version นี้ที่เหลือจากครั้งก่อนอาจมี document ที่ไม่อยู่ในชุดนี้แล้ว
+        if staging.estimated_document_count() != len(records):
+            staging.delete_many({"_id": {"$nin": [r["_id"] for r in records]}})
+
+    @staticmethod
+    def _copy_indexes(live, staging) -> None:
+        """index ที่ collection จริงมี (นอกจาก _id) ต้องมีใน staging ก่อนสลับ"""
+        for name, info in live.index_information().items():
+            if name == "_id_":
+                continue
+            options = {k: v for k, v in info.items() if k in ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")}
+            staging.create_index(info["key"], name=name, **options)
+
+    def _drop_stale_staging(self) -> None:
+        """staging ที่ค้างจาก import ที่ไม่สำเร็จ"""
+        prefixes = tuple(f"{name}_import_" for name in self.names.values())
+        for name in self.db.list_collection_names():
+            if name.startswith(prefixes):
+                self.db.drop_collection(name)
@@ -0,0 +1,354 @@
+# chat_store.py — ประวัติแชทแบบ 1 document ต่อข้อความ (ไม่มี document ไหนโตไม่จำกัดตามความยาวของ session)
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+
+logger = logging.getLogger("minddojo.chat_store")
+
+DUPLICATE_KEY = 11000
+MESSAGE_FIELDS = {"_id": 1, "sender": 1, "text": 1, "timestamp": 1}
+
+
+def parse_cursor(cursor: str | None) -> ObjectId | None:
+    """cursor ของการแบ่งหน้า = id ของข้อความ — ValueError ถ้ารูปแบบไม่ถูก"""
+    if not cursor:
+        return None
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise ValueError(f"invalid cursor: {cursor!r}") from None
+
+
+def _legacy_id(ts: datetime, seed: bytes, index: int) -> ObjectId:
+    """ObjectId ที่คำนวณซ้ำได้ของข้อความจาก session รุ่นเก่า: เวลา + hash ของ document เดิม + ลำดับใน array
+
+    ย้ายข้อมูลซ้ำ (เช่นถูกขัดจังหวะกลางทาง) จะได้ id เดิม → insert ซ้ำถูกข้ามด้วย duplicate key
+    """
+    seconds = int(ts.timestamp()) if ts.tzinfo else int((ts - datetime(1970, 1, 1)).total_seconds())
+    return ObjectId(seconds.to_bytes(4, "big") + seed[:5] + (index & 0xFFFFFF).to_bytes(3, "big"))
+
+
+class ChatStore:
+    """session อยู่ใน collection sessions (unique index บน session_id) และข้อความอยู่ใน messages
+
+    sessions: {session_id, created_at, updated_at, last_message_id, summary, summarized_until}
+    messages: {_id, session_id, sender, text, timestamp} — index (session_id, _id)
+
+    _id ของข้อความเป็น ObjectId ที่สร้างตอนรับ turn จึงเรียงตามเวลา ใช้เป็นทั้งลำดับและ cursor ของ /history
+    การเขียนใช้ $max / $setOnInsert และ insert ที่ข้าม duplicate key → เขียนซ้ำ (retry) ได้โดยไม่เพี้ยน
+    ttl_seconds > 0: TTL index ให้ Mongo ลบ session ที่เงียบเกินกำหนด และข้อความที่เก่ากว่านั้นเอง
+    """
+
+    def __init__(self, sessions, messages, ttl_seconds: float = 0):
+        self.sessions = sessions
+        self.messages = messages
+        self.ttl_seconds = int(ttl_seconds)
+
+    # ---------- indexes ----------
+    def ensure_indexes(self) -> None:
+        try:
+            self.sessions.create_index("session_id", unique=True, name="session_id_unique")
+        except OperationFailure as e:
+            # collection รุ่นเก่า (upsert โดยไม่มี unique index) อาจมี session ซ้ำ → ให้ history_admin.py migrate รวมก่อน
+            logger.error("cannot create unique session_id index (%s); run `python history_admin.py migrate`", e)
+        self.messages.create_index([("session_id", ASCENDING), ("_id", ASCENDING)], name="session_messages")
+        self._ensure_ttl(self.sessions, "updated_at")
+        self._ensure_ttl(self.messages, "timestamp")
+
+    def _ensure_ttl(self, collection, field: str) -> None:
+        name = f"{field}_ttl"
+        current = collection.index_information().get(name)
+        if self.ttl_seconds <= 0:
+            if current:
+                collection.drop_index(name)
+            return
+        if current is None:
+            collection.create_index(field, expireAfterSeconds=self.ttl_seconds, name=name)
+        elif current.get("expireAfterSeconds") != self.ttl_seconds:
+            collection.database.command(
+                "collMod", collection.name, index={"name": name, "expireAfterSeconds": self.ttl_seconds}
+            )
+
+    # ---------- reads ----------
+    def session(self, session_id: str) -> dict | None:
+        return self.sessions.find_one({"session_id": session_id}, {"_id": 0})
+
+    def tail(self, session_id: str, n: int) -> list[dict]:
+        """n ข้อความล่าสุด เรียงจากเก่าไปใหม่"""
+        if n <= 0:
+            return []
+        docs = list(self.messages.find({"session_id": session_id}, MESSAGE_FIELDS).sort("_id", DESCENDING).limit(n))
+        docs.reverse()
+        return docs
+
+    def after(self, session_id: str, after: ObjectId | None, limit: int = 0) -> list[dict]:
+        """ข้อความหลัง id ที่ระบุ (None = ตั้งแต่ต้น) เรียงจากเก่าไปใหม่"""
+        query = {"session_id": session_id}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        cursor = self.messages.find(query, MESSAGE_FIELDS).sort("_id", ASCENDING)
+        return list(cursor.limit(limit) if limit else cursor)
+
+    def count_after(self, session_id: str, after: ObjectId | None) -> int:
+        query = {"session_id": session_id}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        return self.messages.count_documents(query)
+
+    def page(self, session_id: str, limit: int, before: ObjectId | None = None,
+             after: ObjectId | None = None) -> tuple[list[dict], str | None]:
+        """หน้าของประวัติ (เรียงจากเก่าไปใหม่) + cursor ของหน้าถัดไป
+
+        ไม่ระบุ cursor = ข้อความล่าสุด, before = ย้อนไปหน้าที่เก่ากว่า, after = ข้อความที่ใหม่กว่า
+        ดึงเกิน 1 ข้อความเพื่อรู้ว่ามีหน้าถัดไปหรือไม่ (ไม่ต้อง count)
+        """
+        query: dict = {"session_id": session_id}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+            docs = list(self.messages.find(query, MESSAGE_FIELDS).sort("_id", ASCENDING).limit(limit + 1))
+            more = len(docs) > limit
+            docs = docs[:limit]
+            return docs, (str(docs[-1]["_id"]) if more else None)
+        if before is not None:
+            query["_id"] = {"$lt": before}
+        docs = list(self.messages.find(query, MESSAGE_FIELDS).sort("_id", DESCENDING).limit(limit + 1))
+        more = len(docs) > limit
+        docs = docs[:limit]
+        docs.reverse()
+        return docs, (str(docs[0]["_id"]) if more else None)
+
+    # ---------- writes ----------
+    def write_turns(self, turns: list[dict]) -> None:
+        """เขียนหลาย turn (จากหลาย session) ด้วย bulk write ชุดละ 2 คำสั่ง
+
+        turn = {"session_id", "messages": [{"_id", "sender", "text", "timestamp"}, ...]}
+        """
+        if not turns:
+            return
+        inserts = []
+        sessions: dict[str, dict] = {}
+        for t in turns:
+            for m in t["messages"]:
+                inserts.append(InsertOne({**m, "session_id": t["session_id"]}))
+                s = sessions.setdefault(t["session_id"], {"created_at": m["timestamp"], "updated_at": m["timestamp"],
+                                                          "last_message_id": m["_id"]})
+                s["created_at"] = min(s["created_at"], m["timestamp"])
+                s["updated_at"] = max(s["updated_at"], m["timestamp"])
+                s["last_message_id"] = max(s["last_message_id"], m["_id"])
+        try:
+            self.messages.bulk_write(inserts, ordered=False)
+        except BulkWriteError as e:
+            # retry หลังเขียนไปแล้วบางส่วน → ข้อความที่มีอยู่แล้วชน _id เดิม ถือว่าสำเร็จ
+            if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+        self.sessions.bulk_write(
+            [
+                UpdateOne(
+                    {"session_id": sid},
+                    {
+                        "$setOnInsert": {"created_at": s["created_at"]},
+                        "$max": {"updated_at": s["updated_at"], "last_message_id": s["last_message_id"]},
+                    },
+                    upsert=True,
+                )
+                for sid, s in sessions.items()
+            ],
+            ordered=False,
+        )
+
+    def save_summary(self, session_id: str, summary: str, previous: ObjectId | None, until: ObjectId) -> bool:
+        """บันทึก summary เฉพาะเมื่อยังไม่มีงานอื่นสรุปไปก่อน (summarized_until ยังเป็นค่าเดิม)"""
+        result = self.sessions.update_one(
+            {"session_id": session_id, "summarized_until": previous},
+            {"$set": {"summary": summary, "summarized_until": until}},
+        )
+        return result.modified_count == 1
+
+    def delete(self, session_ids: list[str]) -> None:
+        self.messages.delete_many({"session_id": {"$in": session_ids}})
+        self.sessions.delete_many({"session_id": {"$in": session_ids}})
+
+    # ---------- maintenance ----------
+    def migrate_legacy(self, batch_size: int = 200) -> int:
+        """ย้าย session รุ่นเก่า (array messages ใน document เดียว) มาเป็น 1 document ต่อข้อความ
+
+        ทำซ้ำได้: id ของข้อความคำนวณจาก document เดิม และ array ถูกลบหลังข้อความถูกเขียนครบแล้วเท่านั้น
+        session ที่ซ้ำกัน (จาก upsert ที่ไม่มี unique index) ถูกรวมเป็น document เดียว — คืนจำนวน session ที่ย้าย
+        """
+        migrated = 0
+        for doc in self.sessions.find({"messages": {"$exists": True}}).batch_size(batch_size):
+            sid = doc.get("session_id")
+            seed = hashlib.sha1(str(doc["_id"]).encode("utf-8")).digest()
+            fallback_ts = doc["_id"].generation_time.replace(tzinfo=None) if isinstance(doc["_id"], ObjectId) else datetime.utcnow()
+            messages = []
+            for i, m in enumerate(doc.get("messages") or []):
+                ts = m.get("timestamp") or fallback_ts
+                messages.append({"_id": _legacy_id(ts, seed, i), "sender": m.get("sender"), "text": m.get("text", ""), "timestamp": ts})
+            if messages:
+                self.write_turns([{"session_id": sid, "messages": messages}])
+            summarized = min(doc.get("summarized_count") or 0, len(messages))
+            fields = {"summary": doc.get("summary", ""), "summarized_until": messages[summarized - 1]["_id"] if summarized else None}
+            update = {"$set": fields, "$unset": {"messages": "", "summarized_count": "", "message_count": ""}}
+            if messages:
+                update["$min"] = {"created_at": messages[0]["timestamp"]}
+                update["$max"] = {"updated_at": messages[-1]["timestamp"], "last_message_id": messages[-1]["_id"]}
+            self.sessions.update_one({"_id": doc["_id"]}, update)
+            migrated += 1
+        merged = self._merge_duplicate_sessions()
+        if migrated or merged:
+            logger.info("migrated %d legacy sessions (%d duplicates merged)", migrated, merged)
+        return migrated
+
+    def _merge_duplicate_sessions(self) -> int:
+        """เก็บ session document ที่ใหม่สุดไว้ตัวเดียวต่อ session_id (ข้อความอยู่ใน messages อยู่แล้ว, summary ใช้ชุดที่สรุปไปไกลสุด)"""
+        removed = 0
+        dupes = self.sessions.aggregate([
+            {"$group": {"_id": "$session_id", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}},
+        ], allowDiskUse=True)
+        for group in dupes:
+            docs = sorted(self.sessions.find({"_id": {"$in": group["ids"]}}),
+                          key=lambda d: d.get("updated_at") or datetime.min)
+            keep = docs[-1]
+            updates = {
+                "created_at": min((d["created_at"] for d in docs if d.get("created_at")), default=None),
+                "updated_at": max((d["updated_at"] for d in docs if d.get("updated_at")), default=None),
+                "last_message_id": max((d["last_message_id"] for d in docs if d.get("last_message_id")), default=None),
+            }
+            summarized = max((d for d in docs if d.get("summarized_until")), key=lambda d: d["summarized_until"], default=None)
+            if summarized is not None:
+                updates.update(summary=summarized.get("summary", ""), summarized_until=summarized["summarized_until"])
+            self.sessions.update_one({"_id": keep["_id"]}, {"$set": {k: v for k, v in updates.items() if v is not None}})
+            result = self.sessions.delete_many({"_id": {"$in": [d["_id"] for d in docs[:-1]]}})
+            removed += result.deleted_count
+        return removed
+
+    def archive_idle(self, idle_seconds: float, archive_sessions, archive_messages, batch_size: int = 100) -> int:
+        """ย้าย session ที่ไม่มีความเคลื่อนไหวเกิน idle_seconds ไปยัง collection archive แล้วลบจากชุดที่ใช้งาน
+
+        คัดลอกก่อนลบ และเขียนซ้ำได้ด้วย _id เดิม → ถูกขัดจังหวะกลางทางแล้วรันใหม่ได้ — คืนจำนวน session ที่ย้าย
+        session ที่กลับมาคุยต่อระหว่างย้าย (updated_at เปลี่ยน) จะไม่ถูกลบ
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=idle_seconds)
+        archived = 0
+        while True:
+            batch = list(self.sessions.find({"updated_at": {"$lt": cutoff}}).limit(batch_size))
+            if not batch:
+                return archived
+            for doc in batch:
+                sid = doc["session_id"]
+                chunk: list[dict] = []
+                for m in self.messages.find({"session_id": sid}).sort("_id", ASCENDING):
+                    chunk.append(m)
+                    if len(chunk) >= 1000:
+                        self._copy(archive_messages, chunk)
+                        chunk = []
+                self._copy(archive_messages, chunk)
+                archive_sessions.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+                result = self.sessions.delete_one({"_id": doc["_id"], "updated_at": doc["updated_at"]})
+                if result.deleted_count:
+                    self.messages.delete_many({"session_id": sid, "_id": {"$lte": doc.get("last_message_id") or ObjectId()}})
+                    archived += 1
+            if len(batch) < batch_size:
+                return archived
+
+    @staticmethod
+    def _copy(collection, docs: list[dict]) -> None:
+        if not docs:
+            return
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                raise
+
+
+class BatchedChatWriter:
+    """รวม turn จากหลาย request แล้วเขียนด้วย ChatStore.write_turns ครั้งเดียว
+
+    flush เมื่อครบ max_batch turn หรือเมื่อ turn แรกใน buffer รอครบ flush_ms
+    append() คืนหลังจาก turn ถูกเขียนแล้ว (True) หรือ retry ครบแล้วยังไม่สำเร็จ (False)
+    ระหว่างรอเขียน pending() ให้ HistoryManager เห็นข้อความที่ยังไม่ถึง Mongo ของ session เดียวกัน
+    """
+
+    def __init__(self, store: ChatStore, run_blocking, max_batch: int = 100, flush_ms: float = 50,
+                 retries: int = 3):
+        self.store = store
+        self.run_blocking = run_blocking
+        self.max_batch = max_batch
+        self.flush_ms = flush_ms
+        self.retries = retries
+        self._buffer: list[tuple[dict, asyncio.Future]] = []
+        self._inflight: list[dict] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task] = set()
+        self.stats = {"turns": 0, "batches": 0, "failed_turns": 0}
+
+    async def append(self, session_id: str, user_text: str, ai_text: str, timestamp: datetime | None = None) -> bool:
+        ts = timestamp or datetime.utcnow()
+        turn = {
+            "session_id": session_id,
+            "messages": [
+                {"_id": ObjectId(), "sender": "user", "text": user_text, "timestamp": ts},
+                {"_id": ObjectId(), "sender": "ai", "text": ai_text, "timestamp": ts},
+            ],
+        }
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self._buffer.append((turn, done))
+        if len(self._buffer) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_ms / 1000, self._start_flush)
+        return await asyncio.shield(done)
+
+    def pending(self, session_id: str) -> list[dict]:
+        """ข้อความของ session ที่รับแล้วแต่ยังเขียนไม่เสร็จ (เรียงตามลำดับที่รับ)"""
+        turns = self._inflight + [turn for turn, _ in self._buffer]
+        return [m for t in turns if t["session_id"] == session_id for m in t["messages"]]
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._buffer = self._buffer, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[dict, asyncio.Future]]) -> None:
+        turns = [turn for turn, _ in batch]
+        self._inflight.extend(turns)
+        ok = False
+        try:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    await self.run_blocking(self.store.write_turns, turns)
+                    ok = True
+                    break
+                except PyMongoError as e:
+                    if attempt == self.retries:
+                        logger.error("save chat failed: %d turns after %d attempts: %s", len(turns), attempt, e)
+                        break
+                    await asyncio.sleep(0.2 * 2 ** (attempt - 1))
+        finally:
+            inflight = {id(t) for t in turns}
+            self._inflight = [t for t in self._inflight if id(t) not in inflight]
+            self.stats["batches"] += 1
+            self.stats["turns" if ok else "failed_turns"] += len(turns)
+            for _, done in batch:
+                if not done.done():
+                    done.set_result(ok)
+
+    async def close(self) -> None:
+        """เขียนทุกอย่างที่ค้างอยู่ (เรียกตอน shutdown)"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
@@ -0,0 +1,703 @@
+# course_index.py — ดูแล FAISS index ของคอร์สแบบ incremental
+import contextlib
+import gc
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows ไม่มี flock — ถ้ารันหลาย process ต้อง build index ไว้ก่อน
+    fcntl = None
+
+import faiss
+import numpy as np
+import openai
+from bson import json_util
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain.schema import Document
+from pymongo.errors import OperationFailure, PyMongoError
+
+from catalog import facilitator_display
+from catalog_import import META_ID
+
+logger = logging.getLogger("minddojo.index")
+
+MANIFEST_FILE = "manifest.json"  # index รุ่นเก่า (FAISS.save_local + pickle)
+LEGACY_FILES = ("index.faiss", "index.pkl", MANIFEST_FILE)
+DOCSTORE_FILE = "docstore.json"
+# 2: page_content แยกไปอยู่ไฟล์ texts-<version>.txt (header เก็บ offset) — docstore.json เหลือแค่ metadata จึง parse เร็ว
+FORMAT_VERSION = 2
+# map เฉพาะ vector ของ IndexFlat จากไฟล์ตรง ๆ: โหลดเร็ว และหลาย worker ใช้ page cache ชุดเดียวกัน
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+# error ชั่วคราวจาก embedding API ที่ควร retry (429, timeout, 5xx)
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+def course_to_document(course: dict) -> Document:
+    """แปลง course document จาก MongoDB เป็น Document สำหรับ index
+
+    course["facilitators"] คือ record ของวิทยากรที่ resolve จาก facilitators_ids แล้ว (ดู load_courses)
+    """
+    fac_ids = [str(fid) for fid in course.get("facilitators_ids", [])]
+    fac_names = [facilitator_display(f) for f in course.get("facilitators", []) if isinstance(f, dict)]
+    text = (
+        f"[COURSE DATA]\n"
+        f"Course Title (EN): {course.get('title','')}\n"
+        f"Description (TH): {course.get('description','')}\n"
+        f"Objectives (TH): {'; '.join(course.get('objectives', []))}\n"
+        f"Duration: {course.get('duration','')}\n"
+        f"Price: {course.get('price','')}\n"
+        f"Facilitators: {', '.join(fac_names)}\n"
+    )
+    return Document(
+        page_content=text,
+        metadata={
+            "type": "course",
+            "id": str(course["_id"]),
+            "title": course.get("title", ""),
+            "family": course.get("family", ""),
+            "course_type": course.get("type", ""),
+            "duration": course.get("duration", ""),
+            "facilitator_ids": fac_ids,
+        },
+    )
+
+
+def facilitator_to_document(fac: dict) -> Document:
+    """แปลง facilitator document เป็น Document สำหรับ index (ความเชี่ยวชาญ, workshop, สไตล์การสอน)"""
+    text = (
+        f"[FACILITATOR DATA]\n"
+        f"Name: {fac.get('name','')}\n"
+        f"Nickname: {fac.get('nickname','')}\n"
+        f"Expertise: {', '.join(fac.get('expertise', []))}\n"
+        f"Workshop: {', '.join(fac.get('workshop', []))}\n"
+        f"Training Style: {', '.join(fac.get('training_style', []))}\n"
+    )
+    return Document(
+        page_content=text,
+        metadata={
+            "type": "facilitator",
+            "id": str(fac["_id"]),
+            "name": fac.get("name", ""),
+            "nickname": fac.get("nickname", ""),
+        },
+    )
+
+
+def document_key(doc: Document) -> str:
+    """id ใน docstore/manifest — คอร์สใช้ course id ตรง ๆ (เข้ากับ index เดิม) ชนิดอื่นมี prefix กันชนกัน"""
+    doc_type, doc_id = doc.metadata["type"], doc.metadata["id"]
+    return doc_id if doc_type == "course" else f"{doc_type}:{doc_id}"
+
+
+def _order_facilitators(course: dict, facilitators: dict) -> dict:
+    # $lookup/$in ไม่รับประกันลำดับ — เรียงตาม facilitators_ids และข้าม id ที่ไม่มีอยู่จริง
+    course["facilitators"] = [facilitators[fid] for fid in course.get("facilitators_ids", []) if fid in facilitators]
+    return course
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def document_hash(doc: Document) -> str:
+    """hash สำหรับตรวจการเปลี่ยนแปลง — รวม metadata ด้วย เพราะ facet ของ filter (family, course_type, ...) อยู่แค่ใน metadata"""
+    return content_hash(doc.page_content + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False))
+
+
+def write_bundle(index_path: str, index, keys: list[str], entries: dict[str, dict], documents) -> str:
+    """เขียน bundle ลง index_path แล้วคืน catalog version
+
+    documents เป็น iterable ของ (key, {"page_content", "metadata"}) — เขียนทีละตัวจึงไม่ต้องถือทั้ง catalog ไว้ในหน่วยความจำ
+    page_content ต่อกันลง texts-<version>.txt ส่วน docstore.json เก็บ metadata กับช่วง [start, end) ของข้อความ
+    """
+    os.makedirs(index_path, exist_ok=True)
+    version = catalog_version(entries)
+    index_file = f"index-{version[:16]}.faiss"
+    text_file = f"texts-{version[:16]}.txt"
+    tmp = os.path.join(index_path, index_file + ".tmp")
+    faiss.write_index(index, tmp)
+    os.replace(tmp, os.path.join(index_path, index_file))
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "catalog_version": version,
+        "index_file": index_file,
+        "text_file": text_file,
+        "dim": index.d,
+        "ntotal": index.ntotal,
+        "index_to_docstore_id": keys,
+        "entries": entries,
+    }
+    tmp, text_tmp = os.path.join(index_path, DOCSTORE_FILE + ".tmp"), os.path.join(index_path, text_file + ".tmp")
+    # newline="" ทั้งตอนเขียนและอ่าน — offset นับเป็นตัวอักษร ห้ามแปลง \r\n
+    with open(tmp, "w", encoding="utf-8") as f, open(text_tmp, "w", encoding="utf-8", newline="") as tf:
+        f.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "documents": {')
+        offset = 0
+        for i, (key, doc) in enumerate(documents):
+            text = doc["page_content"]
+            tf.write(text)
+            entry = {"metadata": doc["metadata"], "text": [offset, offset + len(text)]}
+            offset += len(text)
+            f.write(("," if i else "") + json.dumps(key, ensure_ascii=False) + ": " + json.dumps(entry, ensure_ascii=False))
+        f.write("}}")
+    os.replace(text_tmp, os.path.join(index_path, text_file))
+    os.replace(tmp, os.path.join(index_path, DOCSTORE_FILE))
+
+    # ลบไฟล์ index/ข้อความชุดก่อน ๆ (process ที่ยัง map อยู่อ่านต่อได้จนปิด) และไฟล์รูปแบบเก่า
+    for name in os.listdir(index_path):
+        stale = (name.startswith("index-") and name.endswith(".faiss")) or (name.startswith("texts-") and name.endswith(".txt"))
+        if name not in (index_file, text_file) and (name in LEGACY_FILES or stale):
+            try:
+                os.remove(os.path.join(index_path, name))
+            except OSError as e:
+                logger.warning("could not remove stale index file %s: %s", name, e)
+    return version
+
+
+def embed_with_backoff(embeddings, texts: list[str], retries: int = 6, base_delay: float = 1.0,
+                       max_delay: float = 60.0) -> list[list[float]]:
+    """embed_documents พร้อม retry แบบ exponential backoff + jitter เมื่อโดน rate limit (เคารพ Retry-After ถ้ามี)"""
+    for attempt in range(retries + 1):
+        try:
+            return embeddings.embed_documents(texts)
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            logger.warning("embedding batch failed (%s); retry %d in %.1fs", type(e).__name__, attempt + 1, delay)
+            time.sleep(delay)
+
+
+def _batched(cursor, size: int):
+    batch = []
+    for item in cursor:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class IndexFileLock:
+    """flock บนไฟล์ <index_path>.lock ให้ build/เขียน index ได้ทีละ process (reentrant ภายใน process)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """พัก cyclic GC ระหว่างสร้าง object จำนวนมากที่ไม่มี cycle (dict จาก JSON, Document) — ไม่งั้น GC สแกนซ้ำหลายสิบรอบ"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def catalog_version(entries: dict[str, dict]) -> str:
+    """hash ของเนื้อหาทั้ง catalog จาก content hash ของทุก document"""
+    return content_hash(json.dumps(sorted((key, e["hash"]) for key, e in entries.items())))
+
+
+class CourseIndexManager:
+    """เก็บ mapping document key → (docstore id, content hash) และอัปเดตเฉพาะ document ที่เปลี่ยน
+
+    index มีทั้งคอร์ส (พร้อมชื่อวิทยากรที่ resolve แล้ว) และวิทยากร ถ้าส่ง facilitators_collection มา
+
+    การแก้ index ทำบนสำเนา (copy-on-write) แล้วสลับ retriever ทีเดียว
+    request ที่กำลังค้นอยู่จึงเห็น index ชุดเก่าหรือชุดใหม่ครบ ๆ เสมอ
+
+    บนดิสก์เก็บเป็น bundle ที่ไม่ใช้ pickle: index-<version>.faiss (เปิดแบบ mmap) + texts-<version>.txt + docstore.json
+    (header: format_version, catalog_version, dim, ntotal) — docstore.json ถูกเขียนทับเป็นขั้นสุดท้าย
+    จึงเป็นจุด commit ของ bundle; ไฟล์ที่มี version ในชื่อไม่เคยถูกเขียนทับ worker ที่ map ไฟล์เก่าอยู่จึงไม่พัง
+    """
+
+    def __init__(self, courses_collection, embeddings, index_path: str, k: int = 4,
+                 poll_interval: float = 30.0, facilitators_collection=None, allow_pickle: bool = False,
+                 meta_collection=None):
+        self.collection = courses_collection
+        self.facilitators_collection = facilitators_collection
+        self.meta_collection = meta_collection  # catalog_meta — เปลี่ยนเมื่อ import catalog ทั้งชุด (ดู catalog_import.py)
+        self._meta_version = None
+        self.embeddings = embeddings
+        self.index_path = index_path
+        self.k = k
+        self.poll_interval = poll_interval
+        self.allow_pickle = allow_pickle  # ยอมโหลด index.pkl รุ่นเก่า (ไฟล์ที่เชื่อถือได้เท่านั้น) เพื่อย้ายเป็น bundle ใหม่
+        self.store: FAISS | None = None
+        self.retriever = None
+        self.version = ""  # hash ของเนื้อหาทั้ง catalog — เปลี่ยนทุกครั้งที่ index เปลี่ยน
+        self._entries: dict[str, dict] = {}  # document key -> {"doc_ids": [...], "hash": ...}
+        self._listeners = []
+        self._write_lock = threading.Lock()
+        # ลำดับการล็อกเป็น file lock → _write_lock เสมอ
+        self._file_lock = IndexFileLock(os.path.normpath(index_path) + ".lock")
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---------- load / build ----------
+    def load_or_build(self) -> None:
+        """โหลด bundle หรือ build ใหม่ — ถือ file lock ไว้ตลอด worker อื่นจึงรอแล้วโหลดผลของ process ที่ build"""
+        with self._file_lock:
+            self._load_or_build()
+
+    def _load_or_build(self) -> None:
+        self._meta_version = self._read_meta_version()
+        loaded = self._load_bundle()
+        if loaded is None and self.allow_pickle and os.path.exists(os.path.join(self.index_path, "index.pkl")):
+            store = FAISS.load_local(self.index_path, self.embeddings, allow_dangerous_deserialization=True)
+            self._entries = self._read_manifest(store)
+            loaded = store, self._entries, self._persist(store)
+        if loaded is None:
+            self.rebuild()
+            return
+        store, self._entries, version = loaded
+        self._swap(store, version)
+
+    @_gc_paused()
+    def _load_bundle(self) -> tuple[FAISS, dict[str, dict], str] | None:
+        """โหลด bundle (ไม่มี pickle) — ไฟล์ที่ไม่ครบ/ไม่ตรงกันคืน None เพื่อให้ build ใหม่
+
+        ใช้ catalog_version จาก header ตรง ๆ (ไม่ hash entries ใหม่ตอนโหลด) — docstore.json ถูกแทนที่ทั้งไฟล์ด้วย os.replace
+        header กับ entries จึงมาจากการเขียนครั้งเดียวกันเสมอ และชื่อไฟล์ .faiss ผูกกับ version นั้น
+        """
+        path = os.path.join(self.index_path, DOCSTORE_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                bundle = json.loads(f.read())
+            if bundle.get("format_version") != FORMAT_VERSION:
+                raise ValueError(f"unsupported format_version {bundle.get('format_version')}")
+            entries, version = bundle["entries"], bundle["catalog_version"]
+            index_file = os.path.basename(bundle["index_file"])
+            if index_file != f"index-{version[:16]}.faiss":
+                raise ValueError("index file does not match catalog_version")
+            index = faiss.read_index(os.path.join(self.index_path, index_file), MMAP_FLAGS)
+            ids = bundle["index_to_docstore_id"]
+            if index.ntotal != len(ids) or index.ntotal != bundle["ntotal"] or index.d != bundle["dim"]:
+                raise ValueError("index and docstore do not match")
+            text_file = os.path.basename(bundle["text_file"])
+            with open(os.path.join(self.index_path, text_file), encoding="utf-8", newline="") as f:
+                text = f.read()
+            documents = {}
+            for key, d in bundle["documents"].items():
+                start, end = d["text"]
+                if not isinstance(d["metadata"], dict) or not 0 <= start <= end <= len(text):
+                    raise ValueError(f"malformed document {key!r}")
+                documents[key] = Document(page_content=text[start:end], metadata=d["metadata"])
+        except (OSError, RuntimeError, ValueError, KeyError, TypeError) as e:
+            logger.warning("index bundle at %s unusable (%s); rebuilding", self.index_path, e)
+            return None
+        store = FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=InMemoryDocstore(documents),
+            index_to_docstore_id=dict(enumerate(ids)),
+        )
+        return store, entries, version
+
+    def load_courses(self, query: dict | None = None) -> list[dict]:
+        """อ่านคอร์สพร้อม resolve facilitators_ids → record วิทยากร ด้วย $lookup ใน query เดียว"""
+        if self.facilitators_collection is None:
+            return list(self.collection.find(query or {}))
+        pipeline = [{"$match": query}] if query else []
+        pipeline.append({"$lookup": {
+            "from": self.facilitators_collection.name,
+            "localField": "facilitators_ids",
+            "foreignField": "_id",
+            "as": "facilitators",
+        }})
+        courses = []
+        for course in self.collection.aggregate(pipeline):
+            courses.append(_order_facilitators(course, {f["_id"]: f for f in course["facilitators"]}))
+        return courses
+
+    def resolve_facilitators(self, courses: list[dict]) -> list[dict]:
+        """resolve วิทยากรของคอร์สชุดหนึ่ง (เช่น จาก change stream) ด้วย $in query เดียว"""
+        if self.facilitators_collection is None:
+            return courses
+        ids = list({fid for c in courses for fid in c.get("facilitators_ids", [])})
+        facilitators = {f["_id"]: f for f in self.facilitators_collection.find({"_id": {"$in": ids}})} if ids else {}
+        return [_order_facilitators(c, facilitators) for c in courses]
+
+    def load_documents(self) -> list[Document]:
+        documents = [course_to_document(c) for c in self.load_courses()]
+        if self.facilitators_collection is not None:
+            documents.extend(facilitator_to_document(f) for f in self.facilitators_collection.find({}))
+        return documents
+
+    def rebuild(self, **builder_options) -> dict:
+        """embed ทุก document ใหม่หมดแบบ stream (ดู StreamingIndexBuilder) แล้วโหลด bundle ที่ได้"""
+        with self._file_lock, self._write_lock:
+            stats = StreamingIndexBuilder(self, **builder_options).run()
+            loaded = self._load_bundle()
+            if loaded is None:
+                raise RuntimeError(f"rebuilt index at {self.index_path} could not be loaded")
+            store, self._entries, version = loaded
+            self._swap(store, version)
+        return stats
+
+    def _read_manifest(self, store: FAISS) -> dict[str, dict]:
+        path = os.path.join(self.index_path, MANIFEST_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            return manifest.get("documents", manifest.get("courses", {}))
+        # index รุ่นเก่าไม่มี manifest → สร้างจาก docstore ที่โหลดมา
+        # คอร์สที่ถูกแบ่งเป็นหลาย chunk จะได้ hash ว่าง เพื่อให้ sync ครั้งแรก embed ใหม่เป็นก้อนเดียว
+        # document ชนิดอื่นของรุ่นเก่า (เช่นวิทยากรที่ไม่มี id) ถูกผูกกับ key ชั่วคราว ให้ sync ลบทิ้ง
+        entries: dict[str, dict] = {}
+        for doc_id in store.index_to_docstore_id.values():
+            doc = store.docstore.search(doc_id)
+            if not isinstance(doc, Document):
+                continue
+            if doc.metadata.get("type") == "course" and doc.metadata.get("id"):
+                entry = entries.setdefault(doc.metadata["id"], {"doc_ids": [], "hash": document_hash(doc)})
+                entry["doc_ids"].append(doc_id)
+                if len(entry["doc_ids"]) > 1:
+                    entry["hash"] = ""
+            else:
+                entries[f"legacy:{doc_id}"] = {"doc_ids": [doc_id], "hash": ""}
+        return entries
+
+    def _persist(self, store: FAISS) -> str:
+        return write_bundle(
+            self.index_path,
+            store.index,
+            [store.index_to_docstore_id[i] for i in range(store.index.ntotal)],
+            self._entries,
+            (
+                (key, {"page_content": doc.page_content, "metadata": doc.metadata})
+                for key, doc in store.docstore._dict.items()
+            ),
+        )
+
+    def _swap(self, store: FAISS, version: str) -> None:
+        # สลับ store ก่อนแจ้ง listener — index เสริมที่สร้างจาก store ใหม่จะไม่ถูกใช้คู่กับ store เก่า
+        self.version = version
+        self.store = store
+        self.retriever = store.as_retriever(search_type="similarity", search_kwargs={"k": self.k})
+        for listener in self._listeners:
+            listener(store)
+
+    def add_listener(self, fn) -> None:
+        """fn(store) ถูกเรียกทุกครั้งหลังสลับ store ใหม่ (ใช้สร้าง index เสริม เช่น BM25)"""
+        self._listeners.append(fn)
+
+    # ---------- incremental update ----------
+    def sync(self) -> dict:
+        """เทียบ hash ของทุก document (คอร์ส + วิทยากร) ใน Mongo กับ index แล้วแก้เฉพาะส่วนที่ต่าง"""
+        docs = {document_key(doc): doc for doc in self.load_documents()}
+        removed = [key for key in self._entries if key not in docs]
+        return self.apply(list(docs.values()), removed)
+
+    def apply(self, upserts: list[Document], deleted_ids: list[str]) -> dict:
+        """เพิ่ม/แก้/ลบ document ตาม document key — document ที่ hash เท่าเดิมจะไม่ถูก embed ใหม่"""
+        with self._file_lock, self._write_lock:
+            changed = [
+                d for d in upserts
+                if self._entries.get(document_key(d), {}).get("hash") != document_hash(d)
+            ]
+            deleted = [key for key in deleted_ids if key in self._entries]
+            updated = [document_key(d) for d in changed if document_key(d) in self._entries]
+            stats = {"added": len(changed) - len(updated), "updated": len(updated), "deleted": len(deleted)}
+            if not changed and not deleted:
+                return stats
+
+            old = self.store
+            store = FAISS(
+                embedding_function=self.embeddings,
+                # สำเนาผ่าน serialize เพื่อให้ได้ storage ของตัวเอง (index ที่โหลดแบบ mmap แก้ไขไม่ได้)
+                index=faiss.deserialize_index(faiss.serialize_index(old.index)),
+                docstore=InMemoryDocstore(dict(old.docstore._dict)),
+                index_to_docstore_id=dict(old.index_to_docstore_id),
+            )
+            stale = updated + deleted
+            if stale:
+                store.delete([doc_id for cid in stale for doc_id in self._entries[cid]["doc_ids"]])
+            if changed:
+                store.add_documents(changed, ids=[document_key(d) for d in changed])
+
+            entries = {cid: e for cid, e in self._entries.items() if cid not in deleted}
+            for d in changed:
+                entries[document_key(d)] = {"doc_ids": [document_key(d)], "hash": document_hash(d)}
+            self._entries = entries
+            self._swap(store, self._persist(store))
+
+        logger.info("course index updated: %s", stats)
+        return stats
+
+    def refresh(self) -> dict:
+        """หลัง import catalog ทั้งชุด: sync index แล้วให้ listener (catalog, BM25) อ่านข้อมูลใหม่แม้ index ไม่เปลี่ยน"""
+        stats = self.sync()
+        if not any(stats.values()):
+            with self._write_lock:
+                self._swap(self.store, self.version)
+        return stats
+
+    def _read_meta_version(self) -> str | None:
+        if self.meta_collection is None:
+            return None
+        return (self.meta_collection.find_one({"_id": META_ID}, {"version": 1}) or {}).get("version")
+
+    # ---------- watcher ----------
+    def start_watcher(self) -> None:
+        """sync ครั้งแรก แล้วติดตามการเปลี่ยนแปลงผ่าน change stream (หรือ polling ถ้าเป็น standalone mongod)"""
+        self._thread = threading.Thread(target=self._watch_loop, name="course-index-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch_loop(self) -> None:
+        use_change_stream = True
+        while not self._stop.is_set():
+            if use_change_stream:
+                try:
+                    self._watch_change_stream()
+                    continue
+                except OperationFailure as e:
+                    # standalone mongod ไม่รองรับ change stream
+                    logger.info("change streams unavailable (%s); polling every %ss", e, self.poll_interval)
+                    use_change_stream = False
+                except PyMongoError as e:
+                    logger.warning("change stream error: %s", e)
+            try:
+                version = self._read_meta_version()
+                if version != self._meta_version:
+                    self._meta_version = version
+                    self.refresh()
+                else:
+                    self.sync()
+            except PyMongoError as e:
+                logger.warning("index sync failed: %s", e)
+            if self._stop.wait(self.poll_interval):
+                break
+
+    def _watch_change_stream(self) -> None:
+        if self.facilitators_collection is None:
+            stream = self.collection.watch(full_document="updateLookup", max_await_time_ms=1000)
+        else:
+            # ติดตามทั้งสอง collection ใน stream เดียว
+            names = [self.collection.name, self.facilitators_collection.name]
+            if self.meta_collection is not None:
+                names.append(self.meta_collection.name)
+            stream = self.collection.database.watch(
+                [{"$match": {"ns.coll": {"$in": names}}}], full_document="updateLookup", max_await_time_ms=1000
+            )
+        with stream:
+            # เปิด stream ก่อนแล้วค่อย sync เพื่อไม่ให้พลาดการแก้ไขระหว่างสองขั้นตอนนี้
+            self.sync()
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    continue
+                # รวม event ที่มาติด ๆ กันเป็น batch เดียว
+                batch = [change]
+                while (nxt := stream.try_next()) is not None:
+                    batch.append(nxt)
+                self._apply_changes(batch)
+
+    def _apply_changes(self, changes: list[dict]) -> None:
+        upserts: dict[str, dict] = {}
+        deleted: list[str] = []
+        for change in changes:
+            op = change["operationType"]
+            if op in ("drop", "rename", "dropDatabase", "invalidate"):
+                self.sync()
+                return
+            if self.meta_collection is not None and change.get("ns", {}).get("coll") == self.meta_collection.name:
+                # import catalog ทั้งชุดเสร็จ (collection ถูกสลับด้วย rename)
+                self._meta_version = self._read_meta_version()
+                self.refresh()
+                return
+            if change.get("ns", {}).get("coll", self.collection.name) != self.collection.name:
+                # วิทยากรเปลี่ยน → กระทบทุกคอร์สที่สอน จึง sync ทั้งหมด (embed ใหม่เฉพาะที่ hash เปลี่ยน)
+                self.sync()
+                return
+            if op in ("insert", "update", "replace") and change.get("fullDocument"):
+                cid = str(change["fullDocument"]["_id"])
+                upserts[cid] = change["fullDocument"]
+                if cid in deleted:
+                    deleted.remove(cid)
+            elif op == "delete":
+                cid = str(change["documentKey"]["_id"])
+                upserts.pop(cid, None)
+                deleted.append(cid)
+        documents = [course_to_document(c) for c in self.resolve_facilitators(list(upserts.values()))]
+        self.apply(documents, deleted)
+
+
+class StreamingIndexBuilder:
+    """build index ใหม่ทั้งชุดโดยไม่ถือทั้ง catalog ไว้ในหน่วยความจำ
+
+    - อ่าน Mongo ด้วย cursor ทีละ batch_size (เรียงตาม _id) และ resolve วิทยากรด้วย $in ต่อ batch
+    - embed ทีละ embed_batch_size ข้อความ ขนานกันไม่เกิน concurrency request พร้อม backoff เมื่อโดน rate limit
+    - ต่อ vector (float32) และ document (JSON lines) ท้ายไฟล์ใน work_dir แล้ว checkpoint (_id ล่าสุด + ขนาดไฟล์)
+      หลังทุก batch — รันใหม่หลังถูกขัดจังหวะจะตัดส่วนที่เขียนไม่ครบทิ้งแล้วทำต่อจาก _id ถัดไป
+    - จบแล้วประกอบ bundle (ใช้ file lock ของ manager) และลบ work_dir
+    """
+
+    VECTORS_FILE = "vectors.f32"
+    DOCUMENTS_FILE = "documents.jsonl"
+    PROGRESS_FILE = "progress.json"
+
+    def __init__(self, manager: "CourseIndexManager", batch_size: int = 256, embed_batch_size: int = 64,
+                 concurrency: int = 4, work_dir: str | None = None):
+        self.manager = manager
+        self.batch_size = batch_size
+        self.embed_batch_size = embed_batch_size
+        self.concurrency = concurrency
+        self.work_dir = work_dir or os.path.normpath(manager.index_path) + ".rebuild"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.work_dir, name)
+
+    def reset(self) -> None:
+        """ทิ้ง checkpoint ที่ค้างอยู่ (เริ่มใหม่ทั้งหมดในการรันครั้งถัดไป)"""
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _load_progress(self) -> dict:
+        try:
+            with open(self._path(self.PROGRESS_FILE), encoding="utf-8") as f:
+                progress = json_util.loads(f.read())
+        except FileNotFoundError:
+            return {"phase": 0, "last_id": None, "count": 0, "dim": 0, "vectors_bytes": 0, "documents_bytes": 0}
+        logger.info("resuming index rebuild: %d documents done, phase %d", progress["count"], progress["phase"])
+        return progress
+
+    def _save_progress(self, progress: dict) -> None:
+        tmp = self._path(self.PROGRESS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json_util.dumps(progress))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(self.PROGRESS_FILE))
+
+    def _sources(self) -> list[tuple]:
+        manager = self.manager
+        sources = [(manager.collection, lambda batch: [course_to_document(c) for c in manager.resolve_facilitators(batch)])]
+        if manager.facilitators_collection is not None:
+            sources.append((manager.facilitators_collection, lambda batch: [facilitator_to_document(f) for f in batch]))
+        return sources
+
+    def _embed(self, pool: ThreadPoolExecutor, texts: list[str]) -> np.ndarray:
+        chunks = [texts[i:i + self.embed_batch_size] for i in range(0, len(texts), self.embed_batch_size)]
+        vectors = [v for chunk in pool.map(lambda c: embed_with_backoff(self.manager.embeddings, c), chunks) for v in chunk]
+        return np.asarray(vectors, dtype=np.float32)
+
+    def run(self) -> dict:
+        os.makedirs(self.work_dir, exist_ok=True)
+        progress = self._load_progress()
+        started = time.perf_counter()
+        vectors_path, documents_path = self._path(self.VECTORS_FILE), self._path(self.DOCUMENTS_FILE)
+        # ตัดข้อมูลที่เขียนหลัง checkpoint ล่าสุด (กรณีถูก kill ระหว่าง batch)
+        for path, size in ((vectors_path, progress["vectors_bytes"]), (documents_path, progress["documents_bytes"])):
+            with open(path, "ab") as f:
+                f.truncate(size)
+
+        with open(vectors_path, "ab") as vf, open(documents_path, "ab") as df, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="index-embed") as pool:
+            for phase, (collection, to_documents) in enumerate(self._sources()):
+                if phase < progress["phase"]:
+                    continue
+                query = {"_id": {"$gt": progress["last_id"]}} if progress["last_id"] is not None else {}
+                cursor = collection.find(query).sort("_id", 1).batch_size(self.batch_size)
+                for batch in _batched(cursor, self.batch_size):
+                    documents = to_documents(batch)
+                    vectors = self._embed(pool, [d.page_content for d in documents])
+                    vf.write(vectors.tobytes())
+                    for d in documents:
+                        line = {
+                            "key": document_key(d),
+                            "hash": document_hash(d),
+                            "page_content": d.page_content,
+                            "metadata": d.metadata,
+                        }
+                        df.write((json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8"))
+                    for f in (vf, df):
+                        f.flush()
+                        os.fsync(f.fileno())
+                    progress.update(
+                        last_id=batch[-1]["_id"],
+                        count=progress["count"] + len(documents),
+                        dim=progress["dim"] or vectors.shape[1],
+                        vectors_bytes=vf.tell(),
+                        documents_bytes=df.tell(),
+                    )
+                    self._save_progress(progress)
+                    logger.info("index rebuild: %d documents embedded", progress["count"])
+                progress.update(phase=phase + 1, last_id=None)
+                self._save_progress(progress)
+
+        self._finalize(progress)
+        stats = {"documents": progress["count"], "seconds": round(time.perf_counter() - started, 2)}
+        logger.info("index rebuild finished: %s", stats)
+        return stats
+
+    def _read_documents(self):
+        with open(self._path(self.DOCUMENTS_FILE), encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _finalize(self, progress: dict) -> None:
+        count = progress["count"]
+        # catalog ว่าง (เช่นยังไม่ได้ seed) — สร้าง index เปล่าไว้ให้ sync เติมทีหลัง
+        dim = progress["dim"] or len(self.manager.embeddings.embed_query("dimension probe"))
+        index = faiss.IndexFlatL2(dim)
+        with open(self._path(self.VECTORS_FILE), "rb") as f:
+            for i in range(0, count, 4096):
+                rows = min(4096, count - i)
+                index.add(np.fromfile(f, dtype=np.float32, count=rows * dim).reshape(rows, dim))
+        keys: list[str] = []
+        entries: dict[str, dict] = {}
+        for doc in self._read_documents():
+            keys.append(doc["key"])
+            entries[doc["key"]] = {"doc_ids": [doc["key"]], "hash": doc["hash"]}
+        documents = (
+            (doc["key"], {"page_content": doc["page_content"], "metadata": doc["metadata"]})
+            for doc in self._read_documents()
+        )
+        with self.manager._file_lock:
+            write_bundle(self.manager.index_path, index, keys, entries, documents)
+        self.reset()
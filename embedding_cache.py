@@ -0,0 +1,119 @@
+# embedding_cache.py — cache embedding บนดิสก์ (SQLite) คีย์ด้วย (model, sha256 ของข้อความ)
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """ห่อ Embeddings ตัวจริง แล้วเก็บเวกเตอร์ที่เคย embed ไว้ใน SQLite
+
+    ใช้ได้ทั้ง embed_documents (ตอน build index) และ embed_query (ตอนค้น)
+    จำกัดจำนวนแถวด้วย LRU ตาม last_used และนับ hit/miss ไว้ดูใน metrics
+
+    hit ไม่เขียนลง SQLite ทันที: last_used ถูกสะสมไว้ในหน่วยความจำแล้วเขียนทีเดียวทุก touch_interval วินาที
+    (หรือก่อนไล่ entry ออก) และนับจำนวนแถวไว้เอง ไม่ต้อง COUNT(*) ทุกครั้งที่ store
+    """
+
+    def __init__(self, underlying: Embeddings, path: str, max_entries: int = 100_000,
+                 model_name: str | None = None, touch_interval: float = 60.0):
+        self.underlying = underlying
+        self.model_name = model_name or getattr(underlying, "model", None) or type(underlying).__name__
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._touched: dict[str, float] = {}  # text_hash → last_used ที่ยังไม่ได้เขียนลง SQLite
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _lookup(self, hashes: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    [self.model_name, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                self._touched.update(dict.fromkeys(found, time.time()))
+                if time.monotonic() - self._flushed_at >= self.touch_interval:
+                    self._conn.execute("BEGIN")
+                    self._flush_touched()
+                    self._conn.execute("COMMIT")
+        return found
+
+    def _flush_touched(self) -> None:
+        """เขียน last_used ที่สะสมไว้ลง SQLite ในคำสั่งเดียว (caller ถือ _lock และเปิด transaction ไว้แล้ว)"""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(t, self.model_name, h) for h, t in self._touched.items()],
+            )
+            self._touched.clear()
+        self._flushed_at = time.monotonic()
+
+    def _store(self, items: dict[str, list[float]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            # แถวที่มีอยู่แล้ว (อีก thread embed ข้อความเดียวกันไปก่อน) เป็นเวกเตอร์เดียวกัน — ข้ามได้
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in items.items()],
+            )
+            self._count += inserted.rowcount
+            if self._count > self.max_entries:
+                self._flush_touched()  # ไล่ออกตาม last_used ล่าสุดของ hit ที่ยังค้างในหน่วยความจำด้วย
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (self._count - self.max_entries,),
+                )
+                self._count -= evicted.rowcount
+            self._conn.execute("COMMIT")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        hashes = [self._hash(t) for t in texts]
+        cached = self._lookup(hashes)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in cached}
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[h] for h in hashes]
+
+    def embed_query(self, text: str) -> list[float]:
+        h = self._hash(text)
+        cached = self._lookup([h])
+        if h in cached:
+            self.hits += 1
+            return cached[h]
+        self.misses += 1
+        vector = self.underlying.embed_query(text)
+        self._store({h: vector})
+        return vector
@@ -0,0 +1,96 @@
+# history.py — ประวัติแชทแบบจำกัดขนาด: N turn ล่าสุด + สรุปสะสมของ turn ที่เก่ากว่า
+import logging
+
+from langchain.schema import HumanMessage, SystemMessage
+from pymongo.errors import PyMongoError
+
+from tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger("minddojo.history")
+
+SUMMARY_INSTRUCT = (
+    "สรุปบทสนทนาระหว่างฝ่ายขายกับ AI ผู้ช่วยของ MindDoJo ให้สั้นและกระชับเป็นภาษาไทย "
+    "เก็บชื่อคอร์ส ชื่อวิทยากร ความต้องการของลูกค้า และข้อสรุปที่ตกลงกันไว้ตามต้นฉบับ ห้ามเพิ่มข้อมูลใหม่"
+)
+
+
+def format_turns(messages: list[dict]) -> list[str]:
+    return [f"ผู้ใช้: {m['text']}" if m["sender"] == "user" else f"AI: {m['text']}" for m in messages]
+
+
+class HistoryManager:
+    """อ่านประวัติแค่ keep_turns ล่าสุดจาก ChatStore แล้วจัดให้อยู่ใน token_budget
+
+    ข้อความที่เก่ากว่า window ถูกย่อรวมเข้า summary ที่เก็บไว้ใน session document
+    (summarized_until = id ของข้อความสุดท้ายที่ถูกสรุปแล้ว) ทีละช่วงโดยไม่ต้องอ่านทั้ง session
+    ถ้ามี writer ข้อความที่ยังรอ batch write อยู่จะถูกรวมเข้ามาด้วย
+    """
+
+    def __init__(self, store, llm, token_budget: int = 1500, keep_turns: int = 6,
+                 summary_batch: int = 4, summary_max_tokens: int = 400, writer=None):
+        self.store = store
+        self.llm = llm
+        self.token_budget = token_budget
+        self.keep_messages = keep_turns * 2  # 1 turn = user + ai
+        self.summary_batch = summary_batch
+        self.summary_max_tokens = summary_max_tokens
+        self.writer = writer
+
+    def load(self, session_id: str) -> dict:
+        """คืน {"summary", "summarized_until", "messages"} โดยดึงแค่ข้อความท้าย ๆ"""
+        session = self.store.session(session_id) or {}
+        messages = self.store.tail(session_id, self.keep_messages)
+        if self.writer is not None:
+            seen = {m["_id"] for m in messages}
+            messages += [m for m in self.writer.pending(session_id) if m["_id"] not in seen]
+            messages = messages[-self.keep_messages:]
+        return {
+            "summary": session.get("summary", ""),
+            "summarized_until": session.get("summarized_until"),
+            "messages": messages,
+        }
+
+    def render(self, history: dict) -> str:
+        """ประกอบ summary + turn ล่าสุดให้ไม่เกิน token_budget (ตัด turn เก่าสุดทิ้งก่อน)"""
+        summary = history.get("summary", "")
+        if summary:
+            summary = truncate_tokens(summary, min(self.summary_max_tokens, self.token_budget))
+        budget = self.token_budget - (count_tokens(summary) if summary else 0)
+        lines: list[str] = []
+        for line in reversed(format_turns(history.get("messages", []))):
+            cost = count_tokens(line) + 1
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        lines.reverse()
+        if summary:
+            lines.insert(0, f"(สรุปบทสนทนาก่อนหน้า) {summary}")
+        return "\n".join(lines)
+
+    async def maybe_summarize(self, session_id: str, run_blocking) -> None:
+        """ย่อข้อความที่หลุด window ไปรวมกับ summary เดิม เมื่อสะสมครบ summary_batch ข้อความ"""
+        session = await run_blocking(self.store.session, session_id) or {}
+        until = session.get("summarized_until")
+        aged_count = await run_blocking(self.store.count_after, session_id, until) - self.keep_messages
+        if aged_count < self.summary_batch:
+            return
+        aged = await run_blocking(self.store.after, session_id, until, aged_count)
+        if not aged:
+            return
+        transcript = "\n".join(format_turns(aged))
+        prompt = [
+            SystemMessage(content=SUMMARY_INSTRUCT),
+            HumanMessage(content=f"สรุปเดิม:\n{session.get('summary') or '-'}\n\nบทสนทนาเพิ่มเติม:\n{transcript}\n\nสรุปใหม่:"),
+        ]
+        try:
+            result = await self.llm.ainvoke(prompt)
+        except Exception as e:
+            logger.warning("history summary failed session=%s: %s", session_id, e)
+            return
+        summary = truncate_tokens(result.content.strip(), self.summary_max_tokens)
+        # เงื่อนไข summarized_until กันไม่ให้สองงานที่รันพร้อมกันเขียนทับกัน
+        try:
+            await run_blocking(self.store.save_summary, session_id, summary, until, aged[-1]["_id"])
+        except PyMongoError as e:
+            logger.warning("history summary save failed session=%s: %s", session_id, e)
@@ -0,0 +1,43 @@
+# history_admin.py — งานดูแลประวัติแชท
+#
+#   python history_admin.py migrate                   # ย้าย session รุ่นเก่า (array messages) เป็น 1 document ต่อข้อความ
+#   python history_admin.py archive --idle-days 90    # ย้าย session ที่เงียบเกิน 90 วันไป chat_*_archive
+#
+# ทั้งสองคำสั่งทำซ้ำได้ — ถูกขัดจังหวะกลางทางให้รันคำสั่งเดิมอีกครั้ง
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from chat_store import ChatStore
+
+
+def main() -> None:
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Chat history maintenance")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="convert legacy per-session message arrays and create indexes")
+    archive = sub.add_parser("archive", help="move idle sessions to the archive collections")
+    archive.add_argument("--idle-days", type=float, required=True)
+    archive.add_argument("--batch-size", type=int, default=100)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    db = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))[os.getenv("MONGO_DB", "minddojo")]
+    store = ChatStore(db["chat_sessions"], db["chat_messages"],
+                      ttl_seconds=float(os.getenv("HISTORY_TTL_DAYS", "0")) * 86400)
+    if args.command == "migrate":
+        migrated = store.migrate_legacy()
+        store.ensure_indexes()
+        print(f"✅ Migrated {migrated} legacy sessions")
+    else:
+        archived = store.archive_idle(
+            args.idle_days * 86400, db["chat_sessions_archive"], db["chat_messages_archive"], batch_size=args.batch_size
+        )
+        print(f"✅ Archived {archived} sessions idle for more than {args.idle_days:g} days")
+
+
+if __name__ == "__main__":
+    main()
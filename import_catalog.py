@@ -0,0 +1,49 @@
+# import_catalog.py — นำเข้า catalog จากไฟล์ JSON / JSONL / CSV โดย service ที่รันอยู่ไม่เห็น catalog ว่างระหว่างนำเข้า
+#
+#   python import_catalog.py --courses courses.json --facilitators facilitators.json
+#   python import_catalog.py --courses courses.csv                 # แทนที่เฉพาะ courses (ตรวจ facilitators_ids กับวิทยากรที่มีอยู่)
+#   python import_catalog.py --courses courses.csv --dry-run       # ตรวจข้อมูลอย่างเดียว
+#
+# CSV: แถวแรกเป็นชื่อ field (_id หรือ id, title, ...) — field ที่เป็น list (objectives, facilitators_ids, ...) คั่นด้วย ";"
+# ถูกขัดจังหวะ → รันคำสั่งเดิมซ้ำ; server ที่รันอยู่ sync index/catalog เองเมื่อ import สำเร็จ
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from catalog_import import CatalogImporter, CatalogImportError, read_records
+
+
+def main() -> None:
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Replace the course catalog from JSON/CSV files without a read gap")
+    ap.add_argument("--courses", help="courses file (.json, .jsonl or .csv)")
+    ap.add_argument("--facilitators", help="facilitators file (.json, .jsonl or .csv)")
+    ap.add_argument("--batch-size", type=int, default=1000, help="documents per bulk_write")
+    ap.add_argument("--list-separator", default=";", help="separator of list fields in CSV files")
+    ap.add_argument("--dry-run", action="store_true", help="validate only, do not write")
+    args = ap.parse_args()
+    if not args.courses and not args.facilitators:
+        ap.error("give --courses and/or --facilitators")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    db = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))[os.getenv("MONGO_DB", "minddojo")]
+    try:
+        courses = read_records(args.courses, args.list_separator) if args.courses else None
+        facilitators = read_records(args.facilitators, args.list_separator) if args.facilitators else None
+        stats = CatalogImporter(db, batch_size=args.batch_size).run(courses, facilitators, dry_run=args.dry_run)
+    except CatalogImportError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.dry_run:
+        print(f"✅ Valid: courses={stats['courses']} facilitators={stats['facilitators']} (version {stats['version']})")
+    else:
+        print(f"✅ Imported catalog version {stats['version']}: courses={stats['courses']} "
+              f"facilitators={stats['facilitators']} in {stats['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
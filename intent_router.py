@@ -0,0 +1,155 @@
+# intent_router.py — จับ intent จาก keyword ด้วย automaton ตัวเดียว (Aho-Corasick) แล้วตอบจาก record จริงใน catalog
+import hashlib
+import json
+import logging
+import threading
+from collections import deque
+
+from pymongo.errors import PyMongoError
+
+from retrieval import normalize
+
+logger = logging.getLogger("minddojo.intent")
+
+
+class KeywordAutomaton:
+    """Aho-Corasick: หา keyword ทุกตัวในข้อความด้วยการเดินผ่านข้อความรอบเดียว
+
+    เวลาที่ใช้ขึ้นกับความยาวคำถาม ไม่ขึ้นกับจำนวน rule/keyword
+    """
+
+    def __init__(self, patterns: dict[str, set[int]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[set[int]] = [set()]
+        for pattern, payload in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(set())
+                state = nxt
+            self._out[state] |= payload
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> set[int]:
+        found: set[int] = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            found |= self._out[state]
+        return found
+
+
+class IntentRouter:
+    """โหลด rule จาก collection intent_rules (ถ้ามี) หรือไฟล์ JSON แล้ว compile เป็น automaton ครั้งเดียว
+
+    rule = {"name", "keywords", "mode": "recommend" | "course_detail", "courses": [{"course_id", "title", "reason"}]}
+    ถ้าหลาย rule match พร้อมกัน ใช้ rule ที่มาก่อน (priority น้อยกว่า / ลำดับในไฟล์)
+    watcher จะ reload เมื่อ rule เปลี่ยน โดยไม่ต้อง restart
+    """
+
+    def __init__(self, catalog, rules_path: str, collection=None, poll_interval: float = 30):
+        self.catalog = catalog
+        self.rules_path = rules_path
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.rules: list[dict] = []
+        self.version = ""
+        self._automaton = KeywordAutomaton({})
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ---------- rules ----------
+    def _read_rules(self) -> list[dict]:
+        if self.collection is not None:
+            try:
+                rules = list(self.collection.find({}, {"_id": 0}).sort("priority", 1))
+            except PyMongoError as e:
+                logger.warning("intent rules unavailable from mongo (%s); using %s", e, self.rules_path)
+                rules = []
+            if rules:
+                return rules
+        with open(self.rules_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def reload(self) -> bool:
+        """อ่าน rule ใหม่ และ compile ใหม่เฉพาะเมื่อเนื้อหาเปลี่ยน — คืน True ถ้ามีการเปลี่ยน"""
+        rules = self._read_rules()
+        version = hashlib.sha256(json.dumps(rules, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+        if version == self.version:
+            return False
+        patterns: dict[str, set[int]] = {}
+        for i, rule in enumerate(rules):
+            for keyword in rule.get("keywords", []):
+                keyword = normalize(keyword)
+                if keyword:
+                    patterns.setdefault(keyword, set()).add(i)
+        # สลับทีเดียว — request ที่กำลังทำงานอยู่ยังเห็นชุดเดิมครบ
+        self._automaton, self.rules, self.version = KeywordAutomaton(patterns), rules, version
+        logger.info("intent rules loaded: %d rules, %d keywords", len(rules), len(patterns))
+        return True
+
+    # ---------- routing ----------
+    def match(self, question: str) -> dict | None:
+        automaton, rules = self._automaton, self.rules
+        hits = automaton.search(normalize(question))
+        return rules[min(hits)] if hits else None
+
+    def _courses(self, rule: dict) -> list[tuple[dict, dict]]:
+        """จับคู่ course ใน rule กับ record ปัจจุบัน (ด้วย course_id ก่อน แล้วค่อยชื่อคอร์ส)"""
+        resolved = []
+        for ref in rule.get("courses", []):
+            course = self.catalog.courses.get(str(ref.get("course_id", "")))
+            if course is None and ref.get("title"):
+                matches = self.catalog.match(ref["title"])
+                course = matches[0] if matches else None
+            if course is None:
+                logger.warning("intent rule %s: course %s not in catalog", rule.get("name"), ref)
+                continue
+            resolved.append((ref, course))
+        return resolved
+
+    def answer(self, question: str) -> str | None:
+        rule = self.match(question)
+        if rule is None:
+            return None
+        courses = self._courses(rule)
+        if not courses:
+            return None
+        if rule.get("mode") == "course_detail":
+            return "\n\n".join(self.catalog.render(course) for _, course in courses)
+        lines = ["จากประสบการณ์ของ MindDoJo แนะนำหลักสูตร:"]
+        lines.extend(f"- **{course.get('title', '')}** → {ref.get('reason', '')}" for ref, course in courses)
+        return "\n".join(lines)
+
+    # ---------- watcher ----------
+    def start_watcher(self) -> None:
+        self._thread = threading.Thread(target=self._watch_loop, name="intent-rules-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except (OSError, ValueError, PyMongoError) as e:
+                logger.warning("intent rules reload failed: %s", e)
@@ -1,116 +1,184 @@
 # ...existing code...
-import os, asyncio, uuid, re
-from datetime import datetime
+import os, asyncio, uuid, logging, functools, weakref
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from pymongo import MongoClient
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain.agents import initialize_agent, AgentType, tool
-from langchain.callbacks.streaming_aiter import AsyncIteratorCallbackHandler
-from langchain.schema import Document, HumanMessage, SystemMessage
-from langchain.memory import ConversationBufferMemory
+from langchain.schema import HumanMessage, SystemMessage
+
+from admission import AdmissionController, AdmissionRejected
+from answer_cache import AnswerCache
+from catalog import CourseCatalog
+from catalog_import import META_COLLECTION
+from chat_store import BatchedChatWriter, ChatStore, parse_cursor
+from course_index import CourseIndexManager, content_hash
+from embedding_cache import CachedEmbeddings
+from history import HistoryManager
+from intent_router import IntentRouter
+from metrics import NullTrace, RequestTrace, registry
+from prompt_builder import PromptBuilder
+from retrieval import HybridRetriever
+from single_flight import Flight, GenerationCancelled, SingleFlight, SlowConsumer
+from tokens import count_tokens
 
 # -------------------- Load ENV --------------------
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "minddojo")
 MINDDOJO_INDEX = "minddojo_courses.index"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+CHAT_SAVE_RETRIES = int(os.getenv("CHAT_SAVE_RETRIES", "3"))
+STREAM_CHUNK_BYTES = int(os.getenv("STREAM_CHUNK_BYTES", "64"))
+STREAM_FLUSH_MS = float(os.getenv("STREAM_FLUSH_MS", "40"))
+STREAM_TYPING_DELAY = float(os.getenv("STREAM_TYPING_DELAY", "0"))  # วินาทีต่อ chunk, 0 = ไม่หน่วง
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", str(LLM_MAX_CONNECTIONS)))  # ต่อ worker
+SESSION_MAX_CONCURRENT = int(os.getenv("SESSION_MAX_CONCURRENT", "2"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))  # วินาทีที่รอคิวได้ก่อนตอบ 429
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+STREAM_MAX_BUFFERED_TOKENS = int(os.getenv("STREAM_MAX_BUFFERED_TOKENS", "256"))  # token ที่ค้างรอ client ได้สูงสุด
+STREAM_STALL_TIMEOUT = float(os.getenv("STREAM_STALL_TIMEOUT", "30"))  # client ไม่อ่านนานเกินนี้ → ตัดทิ้ง
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1800"))  # token สูงสุดของข้อมูลคอร์สใน prompt
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_SUMMARY_BATCH = int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))
+HISTORY_TTL_DAYS = float(os.getenv("HISTORY_TTL_DAYS", "0"))  # 0 = เก็บตลอด; >0 = ลบ session ที่เงียบเกินกำหนด
+HISTORY_WRITE_BATCH = int(os.getenv("HISTORY_WRITE_BATCH", "100"))
+HISTORY_WRITE_FLUSH_MS = float(os.getenv("HISTORY_WRITE_FLUSH_MS", "50"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "200"))
+REQUEST_LOG = os.getenv("REQUEST_LOG", "0") == "1"  # log JSON ต่อ request (เวลาแต่ละ stage + จำนวน token)
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"  # คำถามเดียวกันที่ถามพร้อมกันใช้ generation ร่วมกัน
+COURSE_LOOKUP = os.getenv("COURSE_LOOKUP", "1") == "1"  # ตอบคำถามที่ระบุชื่อคอร์สจาก record ตรง ๆ
+COURSE_LOOKUP_SUMMARIZE = os.getenv("COURSE_LOOKUP_SUMMARIZE", "0") == "1"  # ให้ LLM ย่อ description สั้น ๆ
+INDEX_WATCH = os.getenv("INDEX_WATCH", "1") == "1"
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "30"))
+INDEX_ALLOW_PICKLE = os.getenv("INDEX_ALLOW_PICKLE", "0") == "1"  # ย้าย index.pkl รุ่นเก่าที่เชื่อถือได้มาเป็น bundle ใหม่
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "0") == "1"  # ต้องติดตั้ง h2 — stream ที่ปิดกลางทางจะไม่ทิ้ง connection
+INTENT_RULES_PATH = os.getenv("INTENT_RULES_PATH", "intent_rules.json")
+INTENT_RULES_POLL_INTERVAL = float(os.getenv("INTENT_RULES_POLL_INTERVAL", "30"))
+SERVER_MODE = os.getenv("SERVER_MODE", "development")  # "production" = หลาย worker, ไม่ reload
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", str(os.cpu_count() or 1)))
+
+logger = logging.getLogger("minddojo")
 
 # -------------------- Connect MongoDB --------------------
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client["minddojo"]
+mongo_client = MongoClient(MONGO_URI, maxPoolSize=DB_POOL_SIZE)
+db = mongo_client[MONGO_DB]
 courses_collection = db["courses"]
+facilitators_collection = db["facilitators"]
 chat_collection = db["chat_sessions"]
+chat_messages_collection = db["chat_messages"]
+
+# -------------------- Async data layer --------------------
+# งานที่ block (Mongo round-trip, FAISS search) ถูกส่งไปรันใน thread pool ขนาดจำกัด
+# เพื่อไม่ให้ event loop ค้างและสตรีมของ session อื่นไม่สะดุด
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="minddojo-db")
+_background_tasks: set[asyncio.Task] = set()
+
+async def run_blocking(fn, *args, **kwargs):
+    """รันฟังก์ชันแบบ sync ใน db_executor แล้วรอผลแบบ async"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(fn, *args, **kwargs))
+
+def spawn_background(coro) -> asyncio.Task:
+    """สร้าง task แบบ fire-and-forget และเก็บ reference ไว้ไม่ให้ถูก GC ก่อนทำงานเสร็จ"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
 # -------------------- Build / Load Retriever --------------------
 
-EMB = OpenAIEmbeddings()
-
-if os.path.exists(MINDDOJO_INDEX):
-    retriever_minddojo = FAISS.load_local(
-        MINDDOJO_INDEX, EMB, allow_dangerous_deserialization=True
-    ).as_retriever()
-else:
-    courses = list(courses_collection.find({}))
-    documents = []
-
-    # รวมข้อมูลคอร์ส + วิทยากร
-    for course in courses:
-        fac_names = course.get("facilitators", [])
-        fac_display = ", ".join(fac_names) if fac_names else "None"
-        text = (
-            f"[COURSE DATA]\n"
-            f"Course Title (EN): {course.get('title','')}\n"
-            f"Description (TH): {course.get('description','')}\n"
-            f"Objectives (TH): {'; '.join(course.get('objectives', []))}\n"
-            f"Duration: {course.get('duration','')}\n"
-            f"Price: {course.get('price','')}\n"
-            f"Facilitators: {', '.join(fac_names)}\n"
-        )
-        documents.append(Document(page_content=text, metadata={"type": "course", "id": str(course["_id"])}))
-
-    # สร้าง FAISS
-    faiss_store = FAISS.from_documents(documents, EMB)
-    faiss_store.save_local(MINDDOJO_INDEX)
-    retriever_minddojo = faiss_store.as_retriever(search_type="similarity", search_kwargs={"k":4})
-
-@tool
-def recommend_courses(q: str) -> str:
-    """แนะนำหลักสูตรตามสถานการณ์ เช่น ปัญหาในองค์กร"""
-    if re.search(r"(ทะเลาะ|ขัดแย้ง|ทำงานไม่เป็นทีม|บรรยากาศไม่ดี|ปัญหาในองค์กร)", q):
-        return (
-            "จากประสบการณ์ของ MindDoJo แนะนำหลักสูตร:\n"
-            "- **Psychological Safety in Action** → เพื่อสร้างบรรยากาศทีมที่ปลอดภัยในการแสดงความคิดเห็น ลดความขัดแย้งภายในองค์กร\n"
-            "- **Effective Communication** → เพื่อพัฒนาทักษะการฟังและสื่อสารเชิงบวก สร้างความเข้าใจและความร่วมมือในทีม"
-        )
-    
-    elif re.search(r"(ผู้นำ|ภาวะผู้นำ)", q):
-        return (
-            "จากประสบการณ์ของ MindDoJo แนะนำหลักสูตร:\n"
-            "- **Leadership Mindset** → เพื่อเสริมภาวะผู้นำและการบริหารทีมอย่างมีประสิทธิภาพ\n"
-            "- **Psychological Safety in Action** → เพื่อสร้างความไว้วางใจและบรรยากาศที่เอื้อต่อการนำทีม"
-        )
-    
-    elif re.search(r"(นวัตกรรม|ไอเดีย)", q):
-        return ( "หลักสูตร **Design Thinking**\n"
-        "- คำอธิบาย: หลักสูตรนี้เน้นการพัฒนาทักษะการคิดเชิงออกแบบ (Design Thinking)"
-        "ซึ่งเป็นกระบวนการที่ช่วยให้ผู้เรียนสามารถแก้ไขปัญหาอย่างสร้างสรรค์และมีประสิทธิภาพ\n"
-        "- วัตถุประสงค์: เข้าใจกระบวนการ Design Thinking, สร้างต้นแบบ, ทำงานร่วมกันเชิงสร้างสรรค์\n"
-        "- ระยะเวลา: 1 day\n"
-        "- ราคา: ฝ่ายขาย\n"
-        "- วิทยากร: Songpathara Snidvongs (อ.จี้), นายจีรวัฒน์ เยาวนิช (อ.ต้น), นางสาวนฤมล ล้อมคง (อ.เฟิร์น)"
-        )
-    return None
+# embedding ทุกครั้ง (ทั้ง build index และคำถาม) ผ่าน cache บนดิสก์ก่อน
+EMB = CachedEmbeddings(OpenAIEmbeddings(), EMBED_CACHE_PATH, max_entries=EMBED_CACHE_MAX_ENTRIES)
 
-tools = [recommend_courses]
-
-# -------------------- Memory+Agent Setup --------------------
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, streaming=True)
-memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
+# index/catalog ถูกโหลดตอน startup (ดู warm_up) แล้วให้ watcher อัปเดตเฉพาะคอร์สที่เปลี่ยน
+index_manager = CourseIndexManager(
+    courses_collection, EMB, MINDDOJO_INDEX, k=4, poll_interval=INDEX_POLL_INTERVAL,
+    facilitators_collection=facilitators_collection, allow_pickle=INDEX_ALLOW_PICKLE,
+    meta_collection=db[META_COLLECTION],
+)
+hybrid_retriever = HybridRetriever(index_manager, EMB)
+course_catalog = CourseCatalog(courses_collection, facilitators_collection)
+index_manager.add_listener(lambda store: course_catalog.refresh())
+
+# -------------------- Intent router --------------------
+# rule ของคำถามเชิงสถานการณ์ (keyword → คอร์สที่แนะนำ) อ่านจาก collection intent_rules หรือไฟล์ JSON
+intent_router = IntentRouter(
+    course_catalog, INTENT_RULES_PATH, collection=db["intent_rules"], poll_interval=INTENT_RULES_POLL_INTERVAL
+)
 
-agent = initialize_agent(tools, llm, agent=AgentType.OPENAI_FUNCTIONS, memory=memory, verbose=False)
 
-# -------------------- LLM Context --------------------
-def build_context(question: str, k: int = 4) -> str:
-    docs = retriever_minddojo.invoke(question)
-    ctx = []
+# -------------------- Shared LLM client --------------------
+# ใช้ client ตัวเดียวทั้ง process เพื่อ reuse connection pool / TLS session ข้าม request
+# การสตรีมแยกต่อ request ผ่าน astream (ดู generate)
+llm_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    ),
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    http2=LLM_HTTP2,
+)
+chat_llm = ChatOpenAI(
+    model=LLM_MODEL,
+    temperature=0.3,
+    streaming=True,
+    http_async_client=llm_http_client,
+    timeout=LLM_TIMEOUT,
+    stream_usage=True,  # usage ท้าย stream บอกจำนวน token ที่ได้จาก prompt cache
+)
 
-    for d in docs:
-        if d.metadata.get("type") == "course":
-            ctx.append(f"[COURSE DATA]\n{d.page_content}")
+# -------------------- Conversation history --------------------
+# 1 document ต่อข้อความ (chat_messages) + 1 document ต่อ session (chat_sessions) — เขียนเป็น batch
+history_store = ChatStore(chat_collection, chat_messages_collection, ttl_seconds=HISTORY_TTL_DAYS * 86400)
+chat_writer = BatchedChatWriter(
+    history_store, run_blocking, max_batch=HISTORY_WRITE_BATCH, flush_ms=HISTORY_WRITE_FLUSH_MS,
+    retries=CHAT_SAVE_RETRIES,
+)
+history_manager = HistoryManager(
+    history_store,
+    chat_llm,
+    token_budget=HISTORY_TOKEN_BUDGET,
+    keep_turns=HISTORY_KEEP_TURNS,
+    summary_batch=HISTORY_SUMMARY_BATCH,
+    writer=chat_writer,
+)
 
-    return "\n\n".join(ctx[:k])
+# -------------------- LLM Context --------------------
+def retrieve_documents(question: str, k: int = 4, trace: RequestTrace | None = None,
+                       filters: dict | None = None, vector: list[float] | None = None) -> list:
+    """document ของคอร์ส/วิทยากรที่เกี่ยวข้อง — PromptBuilder เป็นคนเลือก field และตัดให้อยู่ใน budget"""
+    return hybrid_retriever.search(question, k=k, trace=trace or NullTrace(), filters=filters, vector=vector)
 
 SYSTEM_INSTRUCT = """คุณคือ AI ผู้ช่วยฝ่ายขายของบริษัท MindDoJo คุณต้องให้คำตอบกับฝ่ายขายเพื่อตอบสนองความต้องการของลูกค้าเกี่ยวกับคอร์สฝึกอบรมต่าง ๆ ของบริษัท โดยใช้ข้อมูลจากฐานข้อมูลที่มีอยู่เท่านั้น เพื่อให้ฝ่ายขายไปเสนอขายลูกค้าต่อ 
 
 ### กฎสำคัญ: 
-# 1. คุณต้องใช้ข้อมูลจากฐานข้อมูล MindDoJo ที่ให้มาเท่านั้น - ฐานข้อมูลมี [COURSE DATA] - ห้ามใช้ความรู้ภายนอกหรือเดาข้อมูลเอง 
+# 1. คุณต้องใช้ข้อมูลจากฐานข้อมูล MindDoJo ที่ให้มาเท่านั้น - ฐานข้อมูลมี [COURSE DATA] และ [FACILITATOR DATA] - ห้ามใช้ความรู้ภายนอกหรือเดาข้อมูลเอง 
 # 2. หากข้อมูลที่ลูกค้าต้องการ **ไม่มีในฐานข้อมูล** ให้ตอบว่า: "ไม่พบข้อมูล กรุณาติดต่อฝ่ายพัฒนาเพิ่มเติม" 
 # 3. **ห้ามสร้างชื่อคอร์สใหม่** โดยอิงจาก description/objectives - ต้องใช้ "Course Title (EN)" ตรงจากฐานข้อมูลเท่านั้น 
 # 4. **ห้ามรวมคอร์สเข้าด้วยกัน** เช่น การสร้างคอร์สใหม่จากหลายคอร์ส 
@@ -158,8 +226,203 @@ SYSTEM_INSTRUCT = """คุณคือ AI ผู้ช่วยฝ่ายข
 
 """
 
+# -------------------- Answer cache --------------------
+answer_cache = AnswerCache(
+    EMB, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD
+)
+_SYSTEM_INSTRUCT_HASH = content_hash(SYSTEM_INSTRUCT)
+prompt_builder = PromptBuilder(SYSTEM_INSTRUCT, context_budget=CONTEXT_TOKEN_BUDGET)
+
+def answer_cache_version() -> str:
+    """เปลี่ยนเมื่อ catalog หรือ SYSTEM_INSTRUCT เปลี่ยน — ใช้ล้าง answer cache"""
+    return f"{index_manager.version}:{_SYSTEM_INSTRUCT_HASH}"
+
+async def cached_answer(q: str, history_task: asyncio.Task, trace: RequestTrace,
+                        filters: dict | None = None) -> tuple[str | None, list[float] | None]:
+    """หาคำตอบเดิมจาก cache — เฉพาะคำถามที่ไม่ขึ้นกับประวัติ (session ยังไม่มีข้อความ) และไม่มี filter
+
+    คืน (คำตอบ, เวกเตอร์ของคำถาม): exact match ไม่ต้อง embed เลย; ถ้าไม่เจอ embed คำถามครั้งเดียว
+    แล้วใช้เวกเตอร์เดียวกันทั้ง semantic lookup และ retrieve_documents
+    """
+    if not ANSWER_CACHE_ENABLED or filters:
+        return None, None
+    version = answer_cache_version()
+    if answer_cache.contains(q, version):
+        if (await history_task)["messages"]:
+            return None, None
+        return await run_blocking(answer_cache.lookup, q, version), None
+    history, vector = await asyncio.gather(history_task, run_blocking(hybrid_retriever.embed, q, trace))
+    if history["messages"]:
+        return None, vector
+    return await run_blocking(answer_cache.lookup, q, version, vector), vector
+
+# -------------------- Stream writer --------------------
+async def coalesce_stream(tokens, max_bytes: int = STREAM_CHUNK_BYTES, flush_ms: float = STREAM_FLUSH_MS):
+    """รวม token ย่อย ๆ จาก LLM เป็น chunk ก่อนส่ง
+
+    ส่งเมื่อ buffer ใหญ่ถึง max_bytes หรือค้างอยู่นานเกิน flush_ms (นับจาก token แรกใน buffer)
+    """
+    it = tokens.__aiter__()
+    buf: list[str] = []
+    buf_bytes = 0
+    deadline = None
+    pending = None
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(it.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # หมดเวลา window → ส่งของที่ค้างอยู่ แล้วรอ token ถัดไปต่อ
+                yield "".join(buf)
+                buf, buf_bytes, deadline = [], 0, None
+                continue
+            try:
+                token = pending.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            if not token:
+                continue
+            if not buf:
+                deadline = loop.time() + flush_ms / 1000
+            buf.append(token)
+            buf_bytes += len(token.encode("utf-8"))
+            if buf_bytes >= max_bytes:
+                yield "".join(buf)
+                buf, buf_bytes, deadline = [], 0, None
+        if buf:
+            yield "".join(buf)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+async def typing_pause():
+    """หน่วงระหว่าง chunk เพื่อจำลองการพิมพ์ (เปิดด้วย STREAM_TYPING_DELAY)"""
+    if STREAM_TYPING_DELAY > 0:
+        await asyncio.sleep(STREAM_TYPING_DELAY)
+
+# -------------------- Generation --------------------
+single_flight = SingleFlight()
+admission = AdmissionController(
+    MAX_CONCURRENT_GENERATIONS, SESSION_MAX_CONCURRENT,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT, max_queue=ADMISSION_MAX_QUEUE,
+)
+
+async def generate(prompt: list, flight: Flight) -> None:
+    """เรียก LLM แล้วส่ง token เข้า flight — รันเป็น task แยก จึงไม่หยุดถ้า request ที่เริ่มงานปิดไปก่อนคนอื่น
+
+    ดึง stream ทีละ chunk (astream): ผู้อ่านค้างเกิน STREAM_MAX_BUFFERED_TOKENS → หยุดดึงจาก provider จนกว่าจะตามทัน
+    task ถูก cancel (ไม่เหลือ request ที่อ่านอยู่) → stream ไปยัง provider ถูกปิดทันที ไม่เสีย token ต่อ
+    """
+    error = None
+    try:
+        async for chunk in chat_llm.astream(prompt):
+            if chunk.content:
+                flight.publish(chunk.content)
+            if chunk.usage_metadata:
+                flight.usage = chunk.usage_metadata
+            await flight.wait_for_readers(STREAM_MAX_BUFFERED_TOKENS, STREAM_STALL_TIMEOUT)
+    except asyncio.CancelledError:
+        registry.inc("minddojo_generations_cancelled_total", reason="disconnect")
+        error = GenerationCancelled("no request is reading this generation")
+        raise
+    except SlowConsumer as e:
+        registry.inc("minddojo_generations_cancelled_total", reason="slow_client")
+        error = e
+    except Exception as e:
+        error = e
+    finally:
+        flight.finish(error)
+
+async def flight_tokens(flight: Flight, trace: RequestTrace):
+    """token ของ flight สำหรับ request หนึ่ง (บันทึก ttft ของ request นั้นเอง)"""
+    first = True
+    async for token in flight.subscribe():
+        if first:
+            trace.record("ttft", trace.since_start())
+            first = False
+        yield token
+
+# -------------------- Course lookup fast path --------------------
+async def summarize_description(course: dict) -> str | None:
+    """ย่อ description ของคอร์สด้วย LLM สั้น ๆ (cache ไว้ตาม description)"""
+    cached = course_catalog.cached_summary(course)
+    if cached is not None:
+        return cached
+    prompt = [
+        SystemMessage(content="สรุปคำอธิบายหลักสูตรต่อไปนี้เป็นภาษาไทย 1-2 ประโยค ห้ามเพิ่มข้อมูลที่ไม่มีในต้นฉบับ"),
+        HumanMessage(content=course.get("description", "")),
+    ]
+    try:
+        result = await chat_llm.ainvoke(prompt)
+    except Exception as e:
+        logger.warning("description summary failed course=%s: %s", course.get("_id"), e)
+        return None
+    summary = result.content.strip()
+    course_catalog.remember_summary(course, summary)
+    return summary
+
+async def course_lookup_answer(course: dict) -> str:
+    """ตอบคำถามรายละเอียดของคอร์สเดียว (ดู CourseCatalog.detail_match) จาก record ใน catalog โดยไม่ต้องค้น/เรียก LLM"""
+    description = await summarize_description(course) if COURSE_LOOKUP_SUMMARIZE and course.get("description") else None
+    return course_catalog.render(course, description)
+
+# -------------------- Metrics --------------------
+def _cache_metrics():
+    yield ("minddojo_embedding_cache_hits_total", "counter", "Embedding cache hits", {}, EMB.hits)
+    yield ("minddojo_embedding_cache_misses_total", "counter", "Embedding cache misses", {}, EMB.misses)
+    for kind in ("exact_hits", "semantic_hits", "misses", "invalidations"):
+        yield ("minddojo_answer_cache_events_total", "counter", "Answer cache lookups and invalidations",
+               {"event": kind}, answer_cache.stats[kind])
+    yield ("minddojo_answer_cache_hit_ratio", "gauge", "Answer cache hit ratio", {}, answer_cache.hit_rate)
+    yield ("minddojo_coalesced_requests_total", "counter", "Requests served from another request's in-flight generation",
+           {}, single_flight.stats["coalesced"])
+    yield ("minddojo_inflight_generations", "gauge", "Shared generations currently in flight", {}, single_flight.in_flight)
+    yield ("minddojo_admitted_requests", "gauge", "Chat requests admitted and still streaming", {}, admission.active)
+    yield ("minddojo_admission_queue_length", "gauge", "Chat requests waiting for a generation slot", {}, admission.queued)
+
+registry.collector(_cache_metrics)
+
+def _timed(trace: RequestTrace, stage: str, fn, *args):
+    with trace.stage(stage):
+        return fn(*args)
+
+# -------------------- Startup --------------------
+startup_state = {"ready": False, "error": None}
+
+def warm_up() -> None:
+    """งานหนักตอนเริ่ม process: โหลด/สร้าง index (file lock ให้ build แค่ process เดียว), catalog, intent rules"""
+    index_manager.load_or_build()  # สลับ store → retriever/catalog ถูกสร้างผ่าน listener
+    history_store.ensure_indexes()
+    intent_router.reload()
+    if INDEX_WATCH:
+        index_manager.start_watcher()
+        intent_router.start_watcher()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await run_blocking(warm_up)
+    except Exception as e:
+        startup_state["error"] = repr(e)
+        raise
+    startup_state["ready"] = True
+    try:
+        yield
+    finally:
+        # ถอนตัวจาก load balancer ก่อน แล้วค่อยปิด watcher / connection
+        startup_state["ready"] = False
+        index_manager.stop()
+        intent_router.stop()
+        await chat_writer.close()
+        await llm_http_client.aclose()
+
 # -------------------- FastAPI --------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -168,88 +431,256 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class CourseFilters(BaseModel):
+    """จำกัดขอบเขตการค้น — แต่ละ field รับได้หลายค่า (OR) และทุก field ต้องผ่าน (AND)"""
+    family: list[str] | None = None
+    type: list[str] | None = None
+    duration: list[str] | None = None
+    facilitator: list[str] | None = None  # id, ชื่อ หรือชื่อเล่นของวิทยากร
+
 class ChatRequest(BaseModel):
     session_id: str | None = None
     question: str
+    filters: CourseFilters | None = None
 
 @app.post("/chat-stream")
 async def chat_stream(req: ChatRequest):
     if not req.session_id:
         req.session_id = str(uuid.uuid4())
 
-    past_chat = chat_collection.find_one({"session_id": req.session_id})
-    history_msgs = past_chat.get("messages", []) if past_chat else []
-
-    async def gen():
-        q = req.question.strip()
-        # ---TOOLS---
-        tool_answer = recommend_courses(q)
-        if tool_answer:
-            for ch in tool_answer:
-                yield ch
-                await asyncio.sleep(0.01)
-            _save_chat(req.session_id, q, tool_answer)
-            return
-        
-        # --- RAG context ---
-        ctx = build_context(q)
-        history_text = "\n".join(
-            f"ผู้ใช้: {m['text']}" if m['sender'] == "user" else f"AI: {m['text']}"
-            for m in history_msgs
+    trace = RequestTrace(req.session_id, log_enabled=REQUEST_LOG)
+    filters = req.filters.model_dump(exclude_none=True) if req.filters else None
+    q = req.question.strip()
+
+    # ---TOOLS--- (rule ไม่รู้จัก filter จึงข้ามเมื่อมีการกรอง) / ---COURSE LOOKUP---
+    # คำตอบสำเร็จรูปส่งทีเดียว ไม่ต้องรอ และไม่นับเป็น generation (ไม่ต้องเข้าคิว)
+    history_task = None
+    tool_answer = None if filters else intent_router.answer(q)
+    # lookup เฉพาะคำถามรายละเอียดของคอร์สเดียว ที่ไม่มี filter และไม่ได้ต่อจากบทสนทนาเดิม — นอกนั้นให้ RAG ตอบ
+    course = None if tool_answer or filters or not COURSE_LOOKUP else course_catalog.detail_match(q)
+    if course is not None:
+        history_task = asyncio.create_task(
+            run_blocking(_timed, trace, "history_load", history_manager.load, req.session_id)
+        )
+        if (await history_task)["messages"]:
+            course = None
+    lookup_answer = await course_lookup_answer(course) if course is not None else None
+    if tool_answer or lookup_answer:
+        trace.path = "tool" if tool_answer else "lookup"
+        fast_answer = tool_answer or lookup_answer
+
+        async def answer_once():
+            yield fast_answer
+            spawn_background(_record_turn(req.session_id, q, fast_answer, trace))
+
+        return StreamingResponse(answer_once(), media_type="text/plain; charset=utf-8")
+
+    # --- ADMISSION --- เกินจำนวนที่รับไหว → 429 + Retry-After ก่อนเริ่มสตรีม
+    # request ที่จะอ่าน generation ของคนอื่น (single flight) ไม่กิน slot
+    key = single_flight.key(q, answer_cache_version()) if SINGLE_FLIGHT and not filters else None
+    try:
+        ticket = await admission.admit(req.session_id, slot=not (key and single_flight.active(key)))
+    except AdmissionRejected as e:
+        registry.inc("minddojo_admission_rejected_total", reason=e.reason)
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+
+    # โหลดประวัติไปพร้อม ๆ กับการค้น context (ถ้ายังไม่ได้โหลดตอนตรวจ lookup)
+    if history_task is None:
+        history_task = asyncio.create_task(
+            run_blocking(_timed, trace, "history_load", history_manager.load, req.session_id)
         )
 
-        prompt = [
-            SystemMessage(content=SYSTEM_INSTRUCT),
-            HumanMessage(
-                content=(
-                    f"ประวัติการสนทนา:\n{history_text}\n\n"
-                    f"ข้อมูลจากฐานข้อมูล:\n{ctx}\n\n"
-                    f"คำถาม:\n{q}\n\nคำตอบ:"
-                )
-            ),
-        ]
-
-        handler = AsyncIteratorCallbackHandler()
-        llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, streaming=True)
-        task = asyncio.create_task(llm.ainvoke(prompt, config={"callbacks": [handler]}))
-
-        final_answer = ""
-        async for token in handler.aiter():
-            final_answer += token
-            yield token
-            await asyncio.sleep(0.01)
-        await task
-
-        _save_chat(req.session_id, q, final_answer)
+    # --- SINGLE FLIGHT --- คำถามเดียวกัน (ไม่มีประวัติ/filter) ที่มีคนกำลังถามอยู่ → อ่าน stream ของงานนั้น
+    # ตัดสินก่อนเริ่มสตรีม: ถ้าใช้ร่วมไม่ได้ต้องได้ slot ของตัวเอง (คิวเดียวกับ admit) ไม่งั้นยังตอบ 429 ได้
+    flight = None  # Flight ที่ request นี้เป็น leader
+    held = None  # Flight ที่ request นี้ attach อยู่ — detach ตอนจบ (client ปิดกลางทาง → ยกเลิก LLM ถ้าไม่มีใครอ่านแล้ว)
+    following = False
+
+    def leave() -> None:
+        nonlocal held
+        ticket.release()
+        if flight is not None and flight.producer is None and not flight.done:
+            flight.finish()  # leader ที่ยังไม่ได้เริ่ม generate → request ที่รออยู่กลับไปทำเอง
+            single_flight.release(key, flight)
+        if held is not None:
+            held.detach()
+            held = None
+
+    try:
+        if key:
+            held, leader = single_flight.join(key)
+            if leader:
+                flight = held
+            else:
+                history = await history_task
+                following = not history["messages"] and await single_flight.follow(held)
+                if not following:  # ใช้ร่วมกันไม่ได้ → ทำเองตามปกติ
+                    held.detach()
+                    held = None
+        if not following:
+            await ticket.acquire_slot()
+    except AdmissionRejected as e:
+        leave()
+        registry.inc("minddojo_admission_rejected_total", reason=e.reason)
+        raise HTTPException(status_code=429, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    except BaseException:
+        leave()
+        raise
 
-    return StreamingResponse(gen(), media_type="text/plain; charset=utf-8")
+    async def gen():
+        nonlocal flight, held
+        try:
+            if following:
+                trace.path = "coalesced"
+                async for chunk in coalesce_stream(flight_tokens(held, trace)):
+                    yield chunk
+                    await typing_pause()
+                spawn_background(_record_turn(req.session_id, q, held.text, trace))
+                return
+
+            # --- RAG context --- (ถ้าล้มเหลว leave() ปล่อย request ที่รออยู่ให้กลับไปทำเอง)
+            cached, vector = await cached_answer(q, history_task, trace, filters)
+            if cached:
+                docs, history = [], await history_task  # cache hit → ไม่ต้องค้น index
+            else:
+                docs, history = await asyncio.gather(
+                    run_blocking(retrieve_documents, q, trace=trace, filters=filters, vector=vector),
+                    history_task,
+                )
+            if flight is not None:
+                if history["messages"]:
+                    flight.finish()
+                    single_flight.release(key, flight)
+                    flight.detach()
+                    flight, held = None, None
+                else:
+                    flight.accept(True)
+            if cached:
+                trace.path = "cache"
+                if flight is not None:
+                    flight.publish(cached)
+                    flight.finish()
+                    single_flight.release(key, flight)
+                yield cached
+                spawn_background(_record_turn(req.session_id, q, cached, trace))
+                return
+
+            with trace.stage("prompt_build"):
+                prompt, sizes = prompt_builder.build(q, docs, history_manager.render(history))
+            for name, tokens in sizes.items():
+                trace.size(name, tokens)
+
+            gen_started = trace.since_start()
+            stream = flight or Flight()
+            if stream is not flight:
+                stream.attach()
+                held = stream
+            stream.producer = spawn_background(generate(prompt, stream))
+            if flight is not None:
+                stream.producer.add_done_callback(lambda _: single_flight.release(key, flight))
+
+            async for chunk in coalesce_stream(flight_tokens(stream, trace)):
+                yield chunk
+                await typing_pause()
+            trace.record("generation", trace.since_start() - gen_started)
+
+            final_answer = stream.text
+            trace.size("completion_tokens", count_tokens(final_answer))
+            if stream.usage:
+                trace.size("cached_prompt_tokens", stream.usage.get("input_token_details", {}).get("cache_read", 0))
+            if ANSWER_CACHE_ENABLED and not filters and not history["messages"] and final_answer:
+                spawn_background(run_blocking(answer_cache.store, q, final_answer, answer_cache_version(), vector))
+            spawn_background(_record_turn(req.session_id, q, final_answer, trace))
+        except SlowConsumer as e:
+            # client อ่านไม่ทันจนถูกตัดออก — จบ stream ตรงนี้ (ไม่บันทึกคำตอบที่ไม่ครบ)
+            logger.warning("slow client session=%s: %s", req.session_id, e)
+            trace.path = "slow_client"
+            trace.finish()
+        except (asyncio.CancelledError, GeneratorExit):  # client ปิด connection กลางทาง
+            trace.path = "disconnected"
+            trace.finish()
+            raise
+        except Exception:  # LLM/retrieval ล้มเหลว — ยังต้องนับ request นี้ใน metrics ก่อนส่ง error ต่อ
+            trace.path = "error"
+            trace.finish()
+            raise
+        finally:
+            leave()
+
+    body = gen()
+    weakref.finalize(body, leave)  # client ปิดก่อน stream เริ่ม → generator ไม่เคยรัน finally
+    return StreamingResponse(body, media_type="text/plain; charset=utf-8")
 
 # -------------------- ฟังก์ชันช่วยเก็บประวัติ --------------------
-def _save_chat(session_id: str, user_text: str, ai_text: str):
-    """เก็บประวัติการสนทนาใน MongoDB"""
-    chat_collection.update_one(
-        {"session_id": session_id},
-        {"$push": 
-            {"messages": 
-                {"$each":[
-                    {"sender": "user", "text": user_text, "timestamp": datetime.utcnow()},
-
-                    {"sender": "ai", "text": ai_text, "timestamp": datetime.utcnow()},
-                    ]
-                }
-            }
-        },
-        upsert=True,
-    )
-    
+async def _record_turn(session_id: str, user_text: str, ai_text: str, trace: RequestTrace | None = None):
+    """บันทึก turn ใหม่ (รวม batch กับ request อื่น) แล้วย่อข้อความที่หลุด window เข้า summary ถ้าสะสมครบ"""
+    trace = trace or NullTrace()
+    with trace.stage("chat_save"):
+        saved = await chat_writer.append(session_id, user_text, ai_text)
+    trace.finish()
+    if saved:
+        await history_manager.maybe_summarize(session_id, run_blocking)
+
+# -------------------- Health probes --------------------
+@app.get("/healthz")
+def healthz():
+    """liveness — process ยังตอบได้"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """readiness — พร้อมรับ traffic เมื่อโหลด index/retriever/catalog เสร็จแล้ว"""
+    checks = {
+        "startup": startup_state["ready"],
+        "index": index_manager.store is not None,
+        "retriever": hybrid_retriever.lexical is not None,
+        "intent_rules": bool(intent_router.version),
+    }
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "starting", "checks": checks, "index_version": index_manager.version}
+    if startup_state["error"]:
+        body["error"] = startup_state["error"]
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+# -------------------- Endpoint metrics --------------------
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # -------------------- Endpoint ดึงประวัติ --------------------
 @app.get("/history/{session_id}")
-def get_history(session_id: str):
-    doc = chat_collection.find_one({"session_id": session_id})
-    return doc or {"session_id": session_id, "messages": []}
+def get_history(
+    session_id: str,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_PAGE_MAX),
+    before: str | None = None,
+    after: str | None = None,
+):
+    """ประวัติทีละหน้า (เรียงจากเก่าไปใหม่) — ส่ง next_cursor กลับมาเป็น before (หรือ after) เพื่อดึงหน้าถัดไป"""
+    if before and after:
+        raise HTTPException(400, "use either before or after, not both")
+    try:
+        before_id, after_id = parse_cursor(before), parse_cursor(after)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    session = history_store.session(session_id) or {}
+    messages, next_cursor = history_store.page(session_id, limit, before=before_id, after=after_id)
+    return {
+        "session_id": session_id,
+        "summary": session.get("summary", ""),
+        "messages": [
+            {"id": str(m["_id"]), "sender": m["sender"], "text": m["text"], "timestamp": m["timestamp"]}
+            for m in messages
+        ],
+        "next_cursor": next_cursor,
+    }
 
 # -------------------- Run --------------------
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if SERVER_MODE == "production":
+        # หลาย worker process: แต่ละตัวโหลด index แบบ mmap (ใช้ page cache ร่วมกัน) ใน lifespan ของตัวเอง
+        uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, workers=WEB_WORKERS,
+                    proxy_headers=True, timeout_graceful_shutdown=30)
+    else:
+        uvicorn.run("main:app", host=SERVER_HOST, port=SERVER_PORT, reload=True)
 # ...existing code...
\ No newline at end of file
@@ -0,0 +1,175 @@
+# metrics.py — metrics แบบ Prometheus text format + trace ต่อ request (ไม่ต้องพึ่ง prometheus_client)
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+request_logger = logging.getLogger("minddojo.request")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Registry:
+    """เก็บ counter / histogram ในหน่วยความจำ และ render เป็น Prometheus exposition format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: dict[str, tuple[str, str]] = {}
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, dict] = {}
+        self._buckets: dict[str, tuple] = {}
+        self._collectors = []
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._help[name] = ("counter", help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self._help[name] = ("histogram", help_text)
+        self._buckets[name] = buckets
+
+    def collector(self, fn) -> None:
+        """fn() คืน list ของ (name, type, help, labels, value) — อ่านค่าตอน scrape"""
+        self._collectors.append(fn)
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        buckets = self._buckets[name]
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = {"counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h["counts"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def render(self) -> str:
+        lines: list[str] = []
+        seen: set[str] = set()
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+            histograms = [(k, {"counts": list(v["counts"]), "sum": v["sum"], "count": v["count"]}) for k, v in histograms]
+        for (name, labels), value in counters:
+            header(name, *self._help[name])
+            lines.append(f"{name}{_labels(dict(labels))} {value:g}")
+        for (name, labels), h in histograms:
+            header(name, *self._help[name])
+            labels = dict(labels)
+            for bound, count in zip(self._buckets[name], h["counts"]):
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': f'{bound:g}'})} {count}")
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {h['sum']:g}")
+            lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+        for fn in self._collectors:
+            for name, kind, help_text, labels, value in fn():
+                header(name, kind, help_text)
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.counter("minddojo_requests_total", "Chat requests by answer path")
+registry.histogram("minddojo_stage_seconds", "Per-stage latency of /chat-stream")
+registry.histogram("minddojo_prompt_section_tokens", "Tokens per prompt section", TOKEN_BUCKETS)
+registry.counter("minddojo_prompt_tokens_total", "Prompt tokens sent to the LLM")
+registry.counter("minddojo_completion_tokens_total", "Completion tokens streamed from the LLM")
+registry.counter("minddojo_prompt_tokens_saved_total", "Context tokens saved by the compact prompt builder")
+registry.counter("minddojo_prompt_cached_tokens_total", "Prompt tokens served from the provider's prompt cache")
+registry.counter("minddojo_admission_rejected_total", "Chat requests rejected with 429 by admission control")
+registry.counter("minddojo_generations_cancelled_total", "LLM generations stopped before completion")
+
+# ขนาดที่เป็นยอดรวมต่อ request (ไม่ใช่ส่วนหนึ่งของ prompt) → counter
+TOKEN_TOTALS = {
+    "prompt_tokens": "minddojo_prompt_tokens_total",
+    "completion_tokens": "minddojo_completion_tokens_total",
+    "saved_tokens": "minddojo_prompt_tokens_saved_total",
+    "cached_prompt_tokens": "minddojo_prompt_cached_tokens_total",
+}
+
+
+class RequestTrace:
+    """จับเวลาแต่ละ stage และเก็บขนาด prompt ของ request เดียว แล้วส่งเข้า registry ตอน finish()"""
+
+    def __init__(self, session_id: str, log_enabled: bool = False):
+        self.session_id = session_id
+        self.log_enabled = log_enabled
+        self.started = time.perf_counter()
+        self.path = "llm"
+        self.stages: dict[str, float] = {}
+        self.sizes: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float) -> None:
+        self.stages[name] = seconds
+        registry.observe("minddojo_stage_seconds", seconds, stage=name)
+
+    def since_start(self) -> float:
+        return time.perf_counter() - self.started
+
+    def size(self, name: str, tokens: int) -> None:
+        self.sizes[name] = tokens
+        if name.endswith("_tokens") and name not in TOKEN_TOTALS:
+            registry.observe("minddojo_prompt_section_tokens", tokens, section=name[: -len("_tokens")])
+
+    def finish(self) -> None:
+        registry.inc("minddojo_requests_total", path=self.path)
+        for size, counter in TOKEN_TOTALS.items():
+            if size in self.sizes:
+                registry.inc(counter, self.sizes[size])
+        if self.log_enabled:
+            request_logger.info(json.dumps({
+                "session_id": self.session_id,
+                "path": self.path,
+                "total_s": round(self.since_start(), 4),
+                "stages_s": {k: round(v, 4) for k, v in self.stages.items()},
+                **self.sizes,
+            }, ensure_ascii=False))
+
+
+class NullTrace(RequestTrace):
+    """ใช้แทนเมื่อเรียกฟังก์ชันนอก request (ไม่บันทึกอะไร)"""
+
+    def __init__(self):
+        super().__init__("", False)
+
+    def record(self, name: str, seconds: float) -> None:
+        pass
+
+    def size(self, name: str, tokens: int) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
@@ -0,0 +1,121 @@
+# prompt_builder.py — ประกอบ prompt: system prompt คงที่ทุก byte (ให้ prompt caching ของ provider ใช้ได้) + context ที่ตัดให้พอดี
+import re
+
+from langchain.schema import Document, HumanMessage, SystemMessage
+
+from retrieval import document_title, normalize
+from tokens import count_tokens, truncate_tokens
+
+_HEADER = re.compile(r"^\[[A-Z ]+\]$")
+_PARENS = re.compile(r"\s*\([^)]*\)")
+
+TITLE = "Course Title (EN)"
+COURSE_FIELDS = (TITLE, "Description (TH)", "Objectives (TH)", "Duration", "Price", "Facilitators")
+# คำถามถามถึง field ไหน → ส่งเฉพาะ field นั้น (+ ชื่อคอร์ส)
+FIELD_HINTS = {
+    "Price": ("ราคา", "price", "เท่าไหร่", "เท่าไร", "ค่าใช้จ่าย", "งบ"),
+    "Duration": ("กี่วัน", "กี่ชั่วโมง", "ระยะเวลา", "duration", "ใช้เวลา", "นานแค่ไหน"),
+    "Facilitators": ("วิทยากร", "facilitator", "ใครสอน", "สอนโดย", "ผู้สอน", "trainer"),
+    "Objectives (TH)": ("วัตถุประสงค์", "objective", "เป้าหมาย"),
+    "Description (TH)": ("รายละเอียด", "คืออะไร", "description"),
+}
+# คำถามเชิงปัญหา (วิธีการตอบ #2) ใช้แค่ชื่อ + description/objectives (+ วิทยากร เผื่อถามว่าใครสอนอะไร)
+SCENARIO_FIELDS = (TITLE, "Description (TH)", "Objectives (TH)", "Facilitators")
+MIN_PARTIAL_TOKENS = 48
+
+
+def split_fields(text: str) -> tuple[str, list[tuple[str, str]]]:
+    """page_content → (header, [(label, value)]) — บรรทัดที่ไม่มี "label: " ต่อท้าย field ก่อนหน้า"""
+    header = ""
+    fields: list[tuple[str, str]] = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line:
+            continue
+        if _HEADER.match(line):
+            header = header or line
+            continue
+        label, sep, value = line.partition(": ")
+        if sep and label and len(label) <= 32:
+            fields.append((label, value.strip()))
+        elif fields:
+            fields[-1] = (fields[-1][0], f"{fields[-1][1]} {line.strip()}")
+    return header, fields
+
+
+def legacy_context(docs: list[Document]) -> str:
+    """context แบบเดิม (ทุก field, header ซ้ำ) — ใช้คำนวณจำนวน token ที่ประหยัดได้"""
+    return "\n\n".join(
+        f"[COURSE DATA]\n{d.page_content}" if d.metadata.get("type") == "course" else d.page_content
+        for d in docs if d.metadata.get("type") in ("course", "facilitator")
+    )
+
+
+class PromptBuilder:
+    """system prompt เป็น SystemMessage object เดียวใช้ทุก request (prefix เหมือนกันทุก byte)
+
+    ส่วนที่เปลี่ยนตาม request (ประวัติ, context, คำถาม) อยู่ใน HumanMessage ท้ายสุดเท่านั้น
+    context: 1 header ต่อ document, ตัด field ว่าง, เลือก field ตามคำถาม และจำกัดไม่เกิน context_budget token
+    """
+
+    def __init__(self, system_instruct: str, context_budget: int = 1800):
+        self.system = SystemMessage(content=system_instruct)
+        self.system_tokens = count_tokens(system_instruct)
+        self.context_budget = context_budget
+
+    def course_fields(self, question: str, doc: Document) -> tuple[str, ...]:
+        q = normalize(question)
+        asked = [field for field, hints in FIELD_HINTS.items() if any(h in q for h in hints)]
+        if asked:
+            return (TITLE, *asked)
+        title = normalize(document_title(doc))
+        if title and (title in q or _PARENS.sub("", title).strip() in q):
+            return COURSE_FIELDS  # ถามถึงคอร์สนี้ตรง ๆ → ตอบตามรูปแบบ #1 ครบทุก field
+        return SCENARIO_FIELDS
+
+    def render_document(self, question: str, doc: Document) -> str:
+        header, fields = split_fields(doc.page_content)
+        if doc.metadata.get("type") == "course":
+            header = header or "[COURSE DATA]"
+            wanted = set(self.course_fields(question, doc))
+            fields = [(label, value) for label, value in fields if label in wanted]
+        lines = [header] if header else []
+        lines.extend(f"{label}: {value}" for label, value in fields if value)
+        return "\n".join(lines)
+
+    def render_context(self, question: str, docs: list[Document]) -> str:
+        blocks: list[str] = []
+        budget = self.context_budget
+        for doc in docs:
+            if doc.metadata.get("type") not in ("course", "facilitator"):
+                continue
+            block = self.render_document(question, doc)
+            cost = count_tokens(block) + 1
+            if cost > budget:
+                # document ที่ไม่พอดีถูกตัดท้าย (ชื่อคอร์สอยู่ต้น block เสมอ) ถ้ายังเหลือที่พอมีประโยชน์
+                if budget >= MIN_PARTIAL_TOKENS:
+                    blocks.append(truncate_tokens(block, budget - 1))
+                break
+            blocks.append(block)
+            budget -= cost
+        return "\n\n".join(blocks)
+
+    def build(self, question: str, docs: list[Document], history_text: str) -> tuple[list, dict[str, int]]:
+        """คืน (messages, ขนาดแต่ละส่วนเป็น token) — saved_tokens เทียบกับ context แบบเดิม"""
+        ctx = self.render_context(question, docs)
+        human = HumanMessage(
+            content=(
+                f"ประวัติการสนทนา:\n{history_text}\n\n"
+                f"ข้อมูลจากฐานข้อมูล:\n{ctx}\n\n"
+                f"คำถาม:\n{question}\n\nคำตอบ:"
+            )
+        )
+        context_tokens = count_tokens(ctx)
+        sizes = {
+            "system_instruct_tokens": self.system_tokens,
+            "context_tokens": context_tokens,
+            "history_tokens": count_tokens(history_text),
+            "prompt_tokens": self.system_tokens + count_tokens(human.content),
+            "saved_tokens": max(0, count_tokens(legacy_context(docs)) - context_tokens),
+        }
+        return [self.system, human], sizes
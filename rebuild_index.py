@@ -0,0 +1,52 @@
+# rebuild_index.py — สร้าง FAISS index ของคอร์สใหม่ทั้งชุดแบบ stream สำหรับ catalog ขนาดใหญ่
+#
+#   python rebuild_index.py                         # ถูกขัดจังหวะ → รันคำสั่งเดิมซ้ำเพื่อทำต่อจาก checkpoint
+#   python rebuild_index.py --concurrency 8 --batch-size 512
+#   python rebuild_index.py --restart               # ทิ้ง checkpoint แล้วเริ่มใหม่
+#
+# server ที่รันอยู่จะโหลด index ชุดใหม่ตอนเริ่ม process ครั้งถัดไป (ระหว่างนี้ watcher ยัง sync จาก Mongo ตามปกติ)
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+from langchain_openai import OpenAIEmbeddings
+from pymongo import MongoClient
+
+from course_index import CourseIndexManager, StreamingIndexBuilder
+from embedding_cache import CachedEmbeddings
+
+
+def main() -> None:
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Rebuild the course index in resumable, batched steps")
+    ap.add_argument("--index-path", default="minddojo_courses.index")
+    ap.add_argument("--batch-size", type=int, default=256, help="documents read from Mongo per checkpoint")
+    ap.add_argument("--embed-batch-size", type=int, default=64, help="texts per embedding request")
+    ap.add_argument("--concurrency", type=int, default=4, help="embedding requests in flight")
+    ap.add_argument("--restart", action="store_true", help="discard any checkpoint and start over")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    db = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))[os.getenv("MONGO_DB", "minddojo")]
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(),
+        os.getenv("EMBED_CACHE_PATH", "embedding_cache.sqlite3"),
+        max_entries=int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000")),
+    )
+    manager = CourseIndexManager(db["courses"], embeddings, args.index_path, facilitators_collection=db["facilitators"])
+    builder = StreamingIndexBuilder(
+        manager,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        concurrency=args.concurrency,
+    )
+    if args.restart:
+        builder.reset()
+    stats = builder.run()
+    print(f"✅ Rebuilt {args.index_path}: {stats['documents']} documents in {stats['seconds']}s "
+          f"(embedding cache hits={embeddings.hits}, misses={embeddings.misses})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+# retrieval.py — hybrid retrieval: BM25 (ตัดคำแบบรองรับภาษาไทย) + FAISS รวมด้วย reciprocal-rank fusion
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+import faiss
+import numpy as np
+from langchain.schema import Document
+
+from metrics import NullTrace, RequestTrace
+
+_LATIN = re.compile(r"[a-z0-9]+")
+_THAI = re.compile(r"[฀-๿]+")
+_TITLE_LINE = re.compile(r"^Course Title \(EN\):\s*(.+)$", re.MULTILINE)
+_SPACES = re.compile(r"\s+")
+_PARENS = re.compile(r"\s*\([^)]*\)")
+# คำนำหน้าชื่อวิทยากร (ซ้อนกันได้ เช่น "ผศ.ดร.") — alias แบบไม่มีคำนำหน้าให้ filter ด้วยชื่อเล่นเปล่า ๆ ได้
+_HONORIFIC = re.compile(r"^(?:(?:อาจารย์|อ\.|ผศ\.|รศ\.|ศ\.|ดร\.|นางสาว|นาย|นาง|คุณ)\s*)+")
+
+# ชื่อ filter ที่เปิดให้ใช้ → field ใน metadata ของ document
+FILTER_FIELDS = {"family": "family", "type": "course_type", "duration": "duration", "facilitator": "facilitator_ids"}
+
+
+def normalize(text: str) -> str:
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def strip_honorific(name: str) -> str:
+    """ตัดคำนำหน้าชื่อ (อ./ดร./คุณ ฯลฯ) ออกจากชื่อที่ normalize แล้ว — ถ้าตัดแล้วไม่เหลืออะไรคืนชื่อเดิม"""
+    return _HONORIFIC.sub("", name) or name
+
+
+def tokenize(text: str) -> list[str]:
+    """คำภาษาอังกฤษ/ตัวเลขตัดตามคำ ส่วนภาษาไทย (ไม่มีช่องว่างระหว่างคำ) ใช้ character bigram
+
+    ช่วงภาษาไทยที่สั้น (เช่นชื่อเล่น "จี้") เก็บทั้งก้อนไว้ด้วยเพื่อให้ match ตรงตัวได้คะแนนสูง
+    """
+    text = normalize(text)
+    tokens = _LATIN.findall(text)
+    for run in _THAI.findall(text):
+        if len(run) <= 4:
+            tokens.append(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def document_title(doc: Document) -> str:
+    title = doc.metadata.get("title")
+    if not title:
+        m = _TITLE_LINE.search(doc.page_content)
+        title = m.group(1).strip() if m else ""
+    return title
+
+
+class BM25Index:
+    """BM25 แบบ in-process บน inverted index (posting list ต่อ token)"""
+
+    def __init__(self, documents: list[Document], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self.lengths: list[int] = []
+        for i, doc in enumerate(documents):
+            tf = Counter(tokenize(doc.page_content))
+            self.lengths.append(sum(tf.values()))
+            for token, count in tf.items():
+                self.postings[token].append((i, count))
+        n = len(documents)
+        self.avg_len = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {t: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for t, p in self.postings.items()}
+
+        # ชื่อคอร์ส (normalize แล้ว และแบบตัดวงเล็บท้ายชื่อ) → index ของ document ใช้หา exact title hit
+        self.titles: dict[str, list[int]] = defaultdict(list)
+        for i, doc in enumerate(documents):
+            title = normalize(document_title(doc))
+            if not title:
+                continue
+            for alias in {title, _PARENS.sub("", title).strip()}:
+                if len(alias) >= 4:
+                    self.titles[alias].append(i)
+
+    def search(self, query: str, k: int, allowed: set[int] | None = None) -> list[tuple[int, float]]:
+        scores: dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self.postings[token]:
+                if allowed is not None and i not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.avg_len or 1))
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+    def title_hits(self, query: str, allowed: set[int] | None = None) -> list[int]:
+        """document ที่ชื่อคอร์สทั้งชื่อปรากฏในคำถาม — ชื่อยาวกว่ามาก่อน"""
+        q = normalize(query)
+        matched: list[str] = []
+        hits: list[int] = []
+        for title in sorted(self.titles, key=len, reverse=True):
+            if title in q and not any(title in longer for longer in matched):
+                matched.append(title)
+                hits.extend(i for i in self.titles[title] if i not in hits and (allowed is None or i in allowed))
+        return hits
+
+
+def rrf_fuse(rankings: list[list[str]], k: int, c: int = 60) -> list[str]:
+    """Reciprocal-rank fusion: score = Σ 1 / (c + rank)"""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] += 1.0 / (c + rank + 1)
+    return [key for key, _ in sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]]
+
+
+class IndexSnapshot(NamedTuple):
+    """ทุกอย่างที่ search ใช้ ซึ่งสร้างจาก FAISS store ชุดเดียวกัน — สลับทั้งก้อนด้วย assignment เดียว
+    request ที่ค้นระหว่างสลับ store จึงไม่เอาตำแหน่งของ index ชุดใหม่ไปค้นใน index ชุดเก่า
+    """
+
+    store: object
+    lexical: BM25Index
+    keys: list[str]  # ตำแหน่งใน lexical index → docstore id
+    lexical_pos: dict[str, int]
+    faiss_pos: dict[str, int]
+    facets: dict[tuple[str, str], set[str]]
+    facilitator_aliases: dict[str, str]  # ชื่อ/ชื่อเล่น/id (normalize แล้ว ทั้งแบบมีและไม่มีคำนำหน้า) → facilitator id
+
+
+class HybridRetriever:
+    """ค้นด้วย BM25 และ FAISS แล้วรวมผลด้วย RRF
+
+    ถ้าคำถามมีชื่อคอร์สตรงตัว จะตอบจาก BM25 อย่างเดียวโดยไม่ต้อง embed คำถาม
+    lexical index และ facet index (ค่า metadata → docstore id) ถูกสร้างใหม่ทุกครั้งที่ index manager สลับ FAISS store
+    filter ถูกใช้ก่อนค้น: FAISS ค้นผ่าน IDSelectorBatch และ BM25 ข้าม document ที่ไม่อยู่ในชุด จึงได้ครบ k เสมอถ้ามีพอ
+    """
+
+    def __init__(self, index_manager, embeddings, fetch_k: int = 8):
+        self.index_manager = index_manager
+        self.embeddings = embeddings
+        self.fetch_k = fetch_k
+        self.snapshot: IndexSnapshot | None = None
+        index_manager.add_listener(self.rebuild)
+        if index_manager.store is not None:
+            self.rebuild(index_manager.store)
+
+    @property
+    def lexical(self) -> BM25Index | None:
+        snapshot = self.snapshot
+        return snapshot.lexical if snapshot is not None else None
+
+    def rebuild(self, store) -> None:
+        docstore = store.docstore._dict
+        keys = list(docstore)
+        facets: dict[tuple[str, str], set[str]] = defaultdict(set)
+        aliases: dict[str, str] = {}
+        bare: dict[str, str] = {}  # ชื่อที่ตัดคำนำหน้าออก — ใช้เมื่อไม่ชนกับชื่อเต็มของใคร
+        for key, doc in docstore.items():
+            meta = doc.metadata
+            if meta.get("type") == "facilitator":
+                # document ของวิทยากรผ่าน filter facilitator ของตัวเอง (index รุ่นเก่าไม่มี id จะถูกข้าม)
+                if meta.get("id"):
+                    facets[("facilitator", normalize(meta["id"]))].add(key)
+                    for name in (meta["id"], meta.get("name", ""), meta.get("nickname", "")):
+                        if name:
+                            aliases[normalize(name)] = normalize(meta["id"])
+                            bare.setdefault(strip_honorific(normalize(name)), normalize(meta["id"]))
+                continue
+            for name, field in FILTER_FIELDS.items():
+                values = meta.get(field)
+                for value in values if isinstance(values, list) else [values]:
+                    if value:
+                        facets[(name, normalize(str(value)))].add(key)
+        self.snapshot = IndexSnapshot(
+            store=store,
+            lexical=BM25Index([docstore[key] for key in keys]),
+            keys=keys,
+            lexical_pos={key: i for i, key in enumerate(keys)},
+            faiss_pos={key: i for i, key in store.index_to_docstore_id.items()},
+            facets=dict(facets),
+            facilitator_aliases={**bare, **aliases},
+        )
+
+    def candidates(self, snapshot: IndexSnapshot, filters: dict | None) -> set[str] | None:
+        """docstore id ที่ผ่าน filter ทุกข้อ (ค่าหลายค่าใน field เดียวกัน = OR) — None ถ้าไม่มี filter"""
+        if not filters:
+            return None
+        facets, aliases = snapshot.facets, snapshot.facilitator_aliases
+        allowed: set[str] | None = None
+        for name, values in filters.items():
+            if name not in FILTER_FIELDS:
+                raise ValueError(f"unknown filter: {name}")
+            if isinstance(values, str):
+                values = [values]
+            if not values:
+                continue
+            keys: set[str] = set()
+            for value in values:
+                value = normalize(value)
+                if name == "facilitator":
+                    value = aliases.get(value) or aliases.get(strip_honorific(value), value)
+                keys |= facets.get((name, value), set())
+            allowed = keys if allowed is None else allowed & keys
+        return allowed
+
+    def dense_search(self, snapshot: IndexSnapshot, vector: list[float], k: int,
+                     allowed: set[str] | None = None) -> list[str]:
+        """ค้น FAISS โดยตรงแล้วคืน docstore id เรียงตามความใกล้ (ถ้ามี allowed ค้นเฉพาะ id ในชุดนั้น)"""
+        store, faiss_pos = snapshot.store, snapshot.faiss_pos
+        params = None
+        if allowed is not None:
+            positions = np.fromiter((faiss_pos[key] for key in allowed if key in faiss_pos), dtype=np.int64)
+            if not len(positions):
+                return []
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(positions))
+            k = min(k, len(positions))
+        _, idx = store.index.search(np.asarray([vector], dtype=np.float32), k, params=params)
+        return [store.index_to_docstore_id[i] for i in idx[0] if i != -1]
+
+    def embed(self, question: str, trace: RequestTrace | None = None) -> list[float]:
+        with (trace or NullTrace()).stage("embed_question"):
+            return self.embeddings.embed_query(question)
+
+    def search(self, question: str, k: int = 4, trace: RequestTrace | None = None,
+               filters: dict | None = None, vector: list[float] | None = None) -> list[Document]:
+        """vector: embedding ของ question ที่ caller มีอยู่แล้ว (เช่นจาก semantic lookup ของ answer cache)"""
+        trace = trace or NullTrace()
+        snapshot = self.snapshot  # อ่านครั้งเดียว — ทุกขั้นด้านล่างใช้ index ชุดเดียวกัน
+        store, lexical, keys, lexical_pos = snapshot.store, snapshot.lexical, snapshot.keys, snapshot.lexical_pos
+        allowed = self.candidates(snapshot, filters)
+        if allowed is not None and not allowed:
+            return []
+        lexical_allowed = None if allowed is None else {lexical_pos[key] for key in allowed if key in lexical_pos}
+        with trace.stage("lexical_search"):
+            titles = [keys[i] for i in lexical.title_hits(question, lexical_allowed)]
+            lexical_ranked = [keys[i] for i, _ in lexical.search(question, self.fetch_k, lexical_allowed)]
+        if titles:
+            ranked = list(dict.fromkeys(titles + lexical_ranked))[:k]
+        else:
+            if vector is None:
+                vector = self.embed(question, trace)
+            with trace.stage("faiss_search"):
+                dense_ranked = self.dense_search(snapshot, vector, self.fetch_k, allowed)
+            ranked = rrf_fuse([dense_ranked, lexical_ranked], k)
+        docstore = store.docstore._dict
+        return [docstore[key] for key in ranked if key in docstore]
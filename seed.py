@@ -1,16 +1,12 @@
 # seed.py — Many-to-Many Courses ↔ Facilitators
+import os
+
 from bson import ObjectId
 from pymongo import MongoClient
 
-MONGO_URI = "mongodb://localhost:27017"
-client = MongoClient(MONGO_URI)
-db = client["minddojo"]
-
-courses_collection = db["courses"]
-facilitators_collection = db["facilitators"]
+from catalog_import import CatalogImporter
 
-courses_collection.delete_many({})
-facilitators_collection.delete_many({})
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 
 # ====== Courses ======
 courses = [
@@ -154,7 +150,7 @@ courses = [
           ],
           "duration": "1 day",
           "price": "ติดต่อฝ่ายขาย",
-          "facilitators_ids": [""]
+          "facilitators_ids": []
      },
 
      {
@@ -238,8 +234,6 @@ courses = [
      }
 ]
 
-course_result = courses_collection.insert_many(courses)
-
 # ====== Facilitators ======
 facilitators = [
      {
@@ -305,6 +299,11 @@ facilitators = [
      }
 ]
 
-fac_result = facilitators_collection.insert_many(facilitators)
+if __name__ == "__main__":
+     # สลับ catalog ทั้งชุดผ่าน staging collection (ดู catalog_import.py) — service ที่รันอยู่ไม่เห็น catalog ว่าง
+     client = MongoClient(MONGO_URI)
+     db = client[os.getenv("MONGO_DB", "minddojo")]
+
+     stats = CatalogImporter(db).run(courses, facilitators)
 
-print("✅ Seed สำเร็จ: Courses และ Facilitators ผูกกันแบบ Many-to-Many แล้ว")
+     print(f"✅ Seed สำเร็จ: Courses {stats['courses']} และ Facilitators {stats['facilitators']} ผูกกันแบบ Many-to-Many แล้ว")
@@ -0,0 +1,164 @@
+# single_flight.py — คำถามเดียวกันที่เข้ามาพร้อมกันใช้ generation ร่วมกันครั้งเดียว แล้วกระจาย token ให้ทุก request
+import asyncio
+import itertools
+
+from answer_cache import normalize_question
+
+
+class GenerationCancelled(Exception):
+    """งานถูกยกเลิกเพราะไม่มี request ไหนรออ่านแล้ว"""
+
+
+class SlowConsumer(Exception):
+    """ผู้อ่านค้าง token ไว้เกินกำหนดนานเกินไป จึงถูกตัดออกจาก stream"""
+
+
+class Flight:
+    """token stream ของงานเดียวที่หลาย request อ่านร่วมกัน
+
+    ผู้อ่านที่มาทีหลังได้ token ที่ผ่านไปแล้วทั้งหมดก่อน แล้วค่อยตาม token ใหม่ (อ่านจาก parts ด้วย index ของตัวเอง)
+    accepted: leader ตัดสินว่าจะแชร์งานนี้หรือไม่ (False = leader มีประวัติแชท คำตอบใช้ร่วมกันไม่ได้)
+    attached: จำนวน request ที่ยังสนใจงานนี้ — เหลือ 0 ระหว่างที่ producer ยังทำงาน → ยกเลิก producer
+    """
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.attached = 0
+        self.cancelled = False
+        self.producer: asyncio.Task | None = None
+        self.usage: dict | None = None  # usage_metadata ของ LLM (ถ้า provider ส่งมา)
+        self.accepted: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._changed = asyncio.Event()
+        self._progress = asyncio.Event()
+        self._readers: dict[int, int] = {}  # ผู้อ่าน → จำนวน token ที่ส่งต่อไปแล้ว
+        self._evicted: set[int] = set()
+        self._reader_ids = itertools.count()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def lag(self) -> int:
+        """token ที่ผลิตแล้วแต่ผู้อ่านที่ช้าที่สุดยังไม่ได้รับ"""
+        positions = [i for r, i in self._readers.items() if r not in self._evicted]
+        return len(self.parts) - min(positions, default=len(self.parts))
+
+    def attach(self) -> None:
+        self.attached += 1
+
+    def detach(self) -> None:
+        self.attached -= 1
+        if self.attached <= 0 and not self.done and self.producer is not None and not self.producer.done():
+            self.cancelled = True
+            self.producer.cancel()
+
+    def accept(self, shared: bool) -> None:
+        if not self.accepted.done():
+            self.accepted.set_result(shared)
+
+    def publish(self, token: str) -> None:
+        self.parts.append(token)
+        self._wake()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.error = error
+        self.done = True
+        self.accept(False)
+        self._wake()
+
+    def _wake(self) -> None:
+        # ปลุกทุกคนที่รออยู่ แล้วเริ่ม event ใหม่สำหรับ token ถัดไป
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_readers(self, max_buffered: int, stall_timeout: float) -> None:
+        """producer เรียกก่อนอ่าน token ถัดไปจาก LLM — ค้างครบ max_buffered token → หยุดรอให้ผู้อ่านตามทัน
+
+        ผู้อ่านที่ไม่ขยับเลยนาน stall_timeout วินาทีถูกตัดออก; ถ้าไม่เหลือผู้อ่านเลย → SlowConsumer
+        """
+        max_buffered = max(1, max_buffered)
+        while self.lag >= max_buffered:
+            self._progress.clear()
+            try:
+                await asyncio.wait_for(self._progress.wait(), stall_timeout)
+            except asyncio.TimeoutError:
+                limit = len(self.parts) - max_buffered
+                self._evicted.update(r for r, i in self._readers.items() if i <= limit)
+                self._wake()
+                if all(r in self._evicted for r in self._readers):
+                    raise SlowConsumer(f"readers stalled for {stall_timeout:g}s")
+
+    async def subscribe(self):
+        self.subscribers += 1
+        reader = next(self._reader_ids)
+        i = self._readers[reader] = 0
+        try:
+            while True:
+                if reader in self._evicted:
+                    raise SlowConsumer(f"client fell {len(self.parts) - i} tokens behind")
+                if i < len(self.parts):
+                    i += 1
+                    self._readers[reader] = i
+                    self._progress.set()
+                    yield self.parts[i - 1]
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            self._readers.pop(reader, None)
+            self._evicted.discard(reader)
+            self._progress.set()
+
+
+class SingleFlight:
+    """ทะเบียน Flight ที่กำลังทำงานตาม key (คำถาม normalize แล้ว + version ของ catalog/prompt)
+
+    join() คืน (flight, True) ให้ request แรก (leader) และ (flight เดิม, False) ให้ request ที่ตามมา
+    ทุก request ที่ join แล้วต้อง detach() ตอนจบ (รวมถึงตอน client ปิดกลางทาง)
+    leader ต้อง release() เมื่องานจบหรือเลิกแชร์ เพื่อให้คำถามถัดไปเริ่มงานใหม่
+    """
+
+    def __init__(self):
+        self._flights: dict[str, Flight] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    @staticmethod
+    def key(question: str, version: str) -> str:
+        return f"{version}:{normalize_question(question)}"
+
+    def active(self, key: str) -> bool:
+        flight = self._flights.get(key)
+        return flight is not None and not flight.done and not flight.cancelled
+
+    def join(self, key: str) -> tuple[Flight, bool]:
+        if self.active(key):
+            flight = self._flights[key]
+            flight.attach()
+            return flight, False
+        flight = self._flights[key] = Flight()
+        flight.attach()
+        self.stats["leaders"] += 1
+        return flight, True
+
+    async def follow(self, flight: Flight) -> bool:
+        """รอ leader ตัดสิน — True = อ่าน stream ของ flight นี้ได้"""
+        shared = await asyncio.shield(flight.accepted)
+        if shared:
+            self.stats["coalesced"] += 1
+        return shared
+
+    def release(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
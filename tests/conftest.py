@@ -0,0 +1,47 @@
+import os
+import socket
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """module main ที่ไม่ต้องมี MongoDB / OpenAI: catalog จำลอง (patch_offline) + StubChatModel / HashEmbeddings (patch_app)"""
+    work = tmp_path_factory.mktemp("app")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-test-stub")
+    os.environ["EMBED_CACHE_PATH"] = str(work / "embedding_cache.sqlite3")
+    os.environ["INTENT_RULES_PATH"] = os.path.join(ROOT, "intent_rules.json")
+    from benchmarks.bench_chat_stream import patch_app, patch_offline
+
+    import main
+
+    patch_offline()
+    patch_app(first_token_latency=0.3, tokens_per_second=60.0)
+    return main
+
+
+@pytest.fixture(scope="session")
+def chat_server(app):
+    """main.app บน uvicorn (ผ่าน lifespan จริง) — คืน URL ของ /chat-stream"""
+    from benchmarks.bench_chat_stream import start_server
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = start_server(port)
+    yield f"http://127.0.0.1:{port}/chat-stream"
+    server.should_exit = True
+
+
+@pytest.fixture
+def llm(app, monkeypatch):
+    """StubChatModel ที่สตรีมเร็ว ใส่แทน main.chat_llm เฉพาะ test นี้ (ให้ test อ่านค่า calls / cancelled ได้ตรง ๆ)"""
+    from benchmarks.stubs import StubChatModel
+
+    stub = StubChatModel(first_token_latency=0.01, tokens_per_second=200.0)
+    monkeypatch.setattr(app, "chat_llm", stub)
+    return stub
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_busy_server_queues_then_rejects_with_retry_after():
+    async def scenario():
+        admission = AdmissionController(1, 2, queue_timeout=0.05, max_queue=1)
+        first = await admission.admit("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit("b")
+        first.release()
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.reason == "server_busy" and rejected.retry_after >= 1
+    assert admission.active == 0 and admission.queued == 0
+
+
+def test_session_limit_rejects_immediately():
+    async def scenario():
+        admission = AdmissionController(4, 1, queue_timeout=1.0, max_queue=4)
+        ticket = await admission.admit("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.admit("a")
+        ticket.release()
+        ticket.release()  # เรียกซ้ำได้
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(scenario())
+    assert rejected.reason == "session_busy"
+    assert admission.active == 0 and admission._sessions == {}
+
+
+def test_late_slot_request_waits_in_the_same_queue():
+    async def scenario():
+        admission = AdmissionController(1, 2, queue_timeout=0.5, max_queue=1)
+        generating = await admission.admit("a")
+        follower = await admission.admit("b", slot=False)  # อ่านงานของคนอื่น ไม่กิน slot
+        waiting = asyncio.create_task(follower.acquire_slot())
+        await asyncio.sleep(0.01)
+        queued = admission.queued
+        generating.release()
+        await waiting
+        follower.release()
+        return admission, queued, follower.slot
+
+    admission, queued, got_slot = asyncio.run(scenario())
+    assert queued == 1 and got_slot
+    assert admission.active == 0 and admission.queued == 0 and not admission._slots.locked()
+
+
+def test_late_slot_request_is_rejected_when_queue_times_out_or_is_full():
+    async def scenario():
+        admission = AdmissionController(1, 2, queue_timeout=0.05, max_queue=1)
+        generating = await admission.admit("a")
+        timed_out = await admission.admit("b", slot=False)
+        with pytest.raises(AdmissionRejected) as timeout:
+            await timed_out.acquire_slot()
+
+        queued = asyncio.create_task(admission.admit("c"))  # กินที่ในคิวที่มีที่เดียว
+        await asyncio.sleep(0.01)
+        full = await admission.admit("d", slot=False)
+        with pytest.raises(AdmissionRejected) as queue_full:
+            await full.acquire_slot()
+        with pytest.raises(AdmissionRejected):
+            await queued
+        for ticket in (generating, timed_out, full):
+            ticket.release()
+        return admission, timeout.value, queue_full.value, timed_out.slot
+
+    admission, timeout, queue_full, got_slot = asyncio.run(scenario())
+    assert timeout.reason == queue_full.reason == "server_busy" and not got_slot
+    assert admission.active == 0 and admission.queued == 0 and admission._sessions == {}
+    assert not admission._slots.locked()
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+from langchain_core.messages import HumanMessage
+
+from benchmarks.bench_backpressure import fresh_question, read, wait_until
+from single_flight import Flight, SlowConsumer
+
+
+def cancelled_total(app, reason: str) -> float:
+    return app.registry._counters.get(("minddojo_generations_cancelled_total", (("reason", reason),)), 0.0)
+
+
+def test_client_disconnect_cancels_the_upstream_stream(app, chat_server):
+    stub = app.chat_llm
+    cancelled, emitted = stub.cancelled, stub.emitted
+    metric = cancelled_total(app, "disconnect")
+
+    async def scenario():
+        async with httpx.AsyncClient(timeout=30) as client:
+            await read(client, chat_server, fresh_question(), close_after=1)
+        return await wait_until(lambda: cancelled_total(app, "disconnect") == metric + 1)
+
+    assert asyncio.run(scenario())
+    assert stub.cancelled == cancelled + 1
+    assert stub.emitted - emitted < len(stub._tokens())  # ไม่ได้ดึง token จาก provider จนจบ
+
+
+def test_leader_disconnect_keeps_followers_streaming(app, chat_server, monkeypatch):
+    monkeypatch.setattr(app, "SINGLE_FLIGHT", True)
+    stub = app.chat_llm
+    cancelled = stub.cancelled
+    metric = cancelled_total(app, "disconnect")
+
+    async def scenario():
+        q = fresh_question()
+        async with httpx.AsyncClient(timeout=30) as client:
+            _, follower = await asyncio.gather(
+                read(client, chat_server, q, close_after=1), read(client, chat_server, q, delay=0.05),
+            )
+            follower_done = (stub.cancelled, cancelled_total(app, "disconnect"))
+            # ทุกคนปิด → ยกเลิก
+            q = fresh_question()
+            await asyncio.gather(read(client, chat_server, q, close_after=1),
+                                 read(client, chat_server, q, close_after=1, delay=0.05))
+            cancelled_all = await wait_until(lambda: stub.cancelled == cancelled + 1)
+        return follower, follower_done, cancelled_all
+
+    (status, body, _), follower_done, cancelled_all = asyncio.run(scenario())
+    assert status == 200 and body == stub.answer
+    assert follower_done == (cancelled, metric)
+    assert cancelled_all and cancelled_total(app, "disconnect") == metric + 1
+
+
+def test_slow_reader_is_evicted_once_the_buffer_fills(app, llm, monkeypatch):
+    monkeypatch.setattr(app, "STREAM_MAX_BUFFERED_TOKENS", 8)
+    monkeypatch.setattr(app, "STREAM_STALL_TIMEOUT", 0.2)
+    metric = cancelled_total(app, "slow_client")
+
+    async def scenario():
+        flight = Flight()
+        flight.attach()
+        flight.producer = asyncio.create_task(app.generate([HumanMessage(content=fresh_question())], flight))
+        reader = flight.subscribe()
+        await reader.__anext__()  # อ่าน token แรกแล้วหยุด
+        await asyncio.sleep(0.1)
+        buffered = len(flight.parts) - 1
+        await flight.producer
+        try:
+            await reader.__anext__()
+        except SlowConsumer:
+            return flight, buffered, True
+        return flight, buffered, False
+
+    flight, buffered, evicted = asyncio.run(scenario())
+    assert buffered <= 8  # producer หยุดดึงจาก LLM เมื่อค้างครบ buffer
+    assert evicted and isinstance(flight.error, SlowConsumer)
+    assert llm.cancelled == 1  # stream ไปยัง provider ถูกปิดด้วย
+    assert cancelled_total(app, "slow_client") == metric + 1
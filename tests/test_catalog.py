@@ -0,0 +1,40 @@
+import pytest
+
+import seed
+from catalog import CourseCatalog
+
+
+class Collection:
+    def __init__(self, docs: list[dict]):
+        self.docs = docs
+
+    def find(self, query: dict | None = None) -> list[dict]:
+        return self.docs
+
+
+@pytest.fixture(scope="module")
+def catalog() -> CourseCatalog:
+    catalog = CourseCatalog(Collection(seed.courses), Collection(seed.facilitators))
+    catalog.refresh()
+    return catalog
+
+
+@pytest.mark.parametrize("question, title", [
+    ("Design Thinking มีอะไรบ้าง", "Design Thinking"),
+    ("ราคาคอร์ส Design Thinking เท่าไหร่ครับ", "Design Thinking"),
+    ("Hackathon ใครสอน", "Hackathon"),
+    ("Hackathon กี่วัน?", "Hackathon"),
+    ("ขอรายละเอียดหลักสูตร Hackathon หน่อยค่ะ", "Hackathon"),
+])
+def test_detail_questions_match_the_course(catalog, question, title):
+    assert catalog.detail_match(question)["title"] == title
+
+
+@pytest.mark.parametrize("question", [
+    "ลูกค้าเคยเรียน Design Thinking แล้ว ควรเรียนคอร์สไหนต่อ",
+    "มีคอร์สไหนคล้าย Hackathon แต่สั้นกว่านี้ไหม",
+    "Design Thinking กับ Hackathon ต่างกันยังไง",
+    "ทีมขายไม่กล้าเสนอราคา ควรเรียนคอร์สไหน",
+])
+def test_questions_that_only_mention_a_course_are_not_lookups(catalog, question):
+    assert catalog.detail_match(question) is None
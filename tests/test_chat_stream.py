@@ -0,0 +1,55 @@
+import asyncio
+import uuid
+
+import httpx
+
+from benchmarks.bench_backpressure import read, wait_until
+from benchmarks.bench_coalescing import QUESTION
+
+
+def test_answer_cache_hit_skips_retrieval_and_embeds_the_question_once(app, chat_server, monkeypatch):
+    monkeypatch.setattr(app, "ANSWER_CACHE_ENABLED", True)
+    retrievals = []
+    retrieve = app.retrieve_documents
+
+    def counting_retrieve(*args, **kwargs):
+        retrievals.append(kwargs.get("vector"))
+        return retrieve(*args, **kwargs)
+
+    monkeypatch.setattr(app, "retrieve_documents", counting_retrieve)
+    emb = app.hybrid_retriever.embeddings
+    question = f"{QUESTION} ({uuid.uuid4().hex[:8]})"
+
+    async def scenario():
+        async with httpx.AsyncClient(timeout=30) as client:
+            calls = emb.calls
+            first = await read(client, chat_server, question)
+            first_embeds = emb.calls - calls
+            stored = await wait_until(lambda: app.answer_cache.contains(question, app.answer_cache_version()))
+            calls = emb.calls
+            second = await read(client, chat_server, question + " ครับ")  # normalize แล้วเป็น key เดียวกัน
+            return first, first_embeds, stored, second, emb.calls - calls
+
+    first, first_embeds, stored, second, second_embeds = asyncio.run(scenario())
+    assert first[0] == 200 and stored
+    assert first_embeds == 1  # semantic lookup, retrieval และ answer_cache.store ใช้เวกเตอร์เดียวกัน
+    assert len(retrievals) == 1 and retrievals[0] is not None
+    assert second[:2] == (200, first[1])
+    assert second_embeds == 0  # exact hit ไม่ต้อง embed และไม่ค้น index
+
+
+def test_upstream_failure_is_counted_in_request_metrics(app, chat_server, llm):
+    llm.fail_after = 2
+    errors = lambda: app.registry._counters.get(("minddojo_requests_total", (("path", "error"),)), 0.0)
+    before = errors()
+
+    async def scenario():
+        async with httpx.AsyncClient(timeout=30) as client:
+            try:
+                await read(client, chat_server, f"{QUESTION} ({uuid.uuid4().hex[:8]})")
+            except httpx.HTTPError:
+                pass  # server ตัด stream กลางทางเมื่อ provider error
+        return await wait_until(lambda: errors() == before + 1)
+
+    assert asyncio.run(scenario())
+    assert llm.calls == 1
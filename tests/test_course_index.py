@@ -0,0 +1,84 @@
+import seed
+from benchmarks.stubs import HashEmbeddings, ListCollection, synthetic_courses
+from course_index import CourseIndexManager
+from retrieval import HybridRetriever
+
+QUESTION = "อยากให้ทีมคิดนวัตกรรมใหม่ ๆ"
+
+
+def family_ids(hybrid: HybridRetriever, family: str) -> set[str]:
+    return {d.metadata["id"] for d in hybrid.search(QUESTION, k=50, filters={"family": [family]})}
+
+
+def test_facet_edit_is_synced_into_filtered_retrieval(tmp_path):
+    courses = synthetic_courses(30)
+    embeddings = HashEmbeddings(dim=32)
+    manager = CourseIndexManager(ListCollection(courses), embeddings, str(tmp_path / "index"))
+    manager.load_or_build()
+    hybrid = HybridRetriever(manager, embeddings)
+
+    course = courses[20]
+    old_family = course["family"]
+    new_family = next(c["family"] for c in courses if c["family"] != old_family)
+    assert course["_id"] in family_ids(hybrid, old_family)
+    version = manager.version
+
+    course["family"] = new_family  # แก้เฉพาะ facet — ข้อความของ document เท่าเดิม
+    assert manager.sync() == {"added": 0, "updated": 1, "deleted": 0}
+    assert manager.version != version
+    assert course["_id"] in family_ids(hybrid, new_family)
+    assert course["_id"] not in family_ids(hybrid, old_family)
+    assert manager.sync() == {"added": 0, "updated": 0, "deleted": 0}
+
+
+def test_facet_edit_survives_reload(tmp_path):
+    courses = synthetic_courses(20)
+    path = str(tmp_path / "index")
+    manager = CourseIndexManager(ListCollection(courses), HashEmbeddings(dim=32), path)
+    manager.load_or_build()
+    courses[5]["type"] = "E-learning" if courses[5]["type"] != "E-learning" else "Workshop"
+    manager.sync()
+
+    embeddings = HashEmbeddings(dim=32)
+    reloaded = CourseIndexManager(ListCollection(courses), embeddings, path)
+    reloaded.load_or_build()
+    assert embeddings.calls == 0  # โหลด bundle ไม่ได้ build ใหม่
+    assert reloaded.store.docstore.search(courses[5]["_id"]).metadata["course_type"] == courses[5]["type"]
+    assert reloaded.sync() == {"added": 0, "updated": 0, "deleted": 0}
+
+
+def test_search_uses_one_index_snapshot_across_a_swap(tmp_path):
+    courses = synthetic_courses(30)
+    embeddings = HashEmbeddings(dim=32)
+    manager = CourseIndexManager(ListCollection(courses), embeddings, str(tmp_path / "index"))
+    manager.load_or_build()
+    hybrid = HybridRetriever(manager, embeddings)
+    seen = []
+    manager.add_listener(lambda store: seen.append(manager.store is store))
+
+    old = hybrid.snapshot
+    courses[3]["family"] = "Leadership" if courses[3]["family"] != "Leadership" else "Sale School"
+    del courses[10]
+    manager.sync()
+
+    assert seen == [True]  # listener ถูกเรียกหลังสลับ store แล้ว
+    assert hybrid.snapshot.store is manager.store and old.store is not manager.store
+    # snapshot เก่ายังค้นได้ถูกต้องทั้งก้อน (request ที่เริ่มก่อนสลับ)
+    allowed = hybrid.candidates(old, {"family": [courses[3]["family"]]})
+    ids = hybrid.dense_search(old, embeddings.embed_query(QUESTION), 50, allowed)
+    assert ids and all(key in old.store.docstore._dict for key in ids)
+
+
+def test_facilitator_filter_accepts_the_bare_nickname(tmp_path):
+    embeddings = HashEmbeddings(dim=32)
+    manager = CourseIndexManager(ListCollection(synthetic_courses(30)), embeddings, str(tmp_path / "index"),
+                                 facilitators_collection=ListCollection(seed.facilitators))
+    manager.load_or_build()
+    hybrid = HybridRetriever(manager, embeddings)
+
+    def taught_by(name: str) -> set[str]:
+        return {d.metadata["id"] for d in hybrid.search(QUESTION, k=50, filters={"facilitator": name})}
+
+    with_title = taught_by("อ.จี้")
+    assert with_title and taught_by("จี้") == with_title == taught_by("อ. จี้")
+    assert taught_by("Songpathara Snidvongs") == with_title
@@ -0,0 +1,37 @@
+import time
+
+from benchmarks.stubs import HashEmbeddings
+from embedding_cache import CachedEmbeddings
+
+
+def last_used(cache: CachedEmbeddings) -> dict[str, float]:
+    return dict(cache._conn.execute("SELECT text_hash, last_used FROM embeddings").fetchall())
+
+
+def test_hits_do_not_write_until_the_touch_interval_passes(tmp_path):
+    cache = CachedEmbeddings(HashEmbeddings(8), str(tmp_path / "emb.sqlite3"), touch_interval=3600)
+    cache.embed_query("design thinking")
+    before = last_used(cache)
+    time.sleep(0.01)
+    for _ in range(5):
+        cache.embed_query("design thinking")
+    assert cache.hits == 5 and cache.underlying.calls == 1
+    assert last_used(cache) == before  # hit ไม่เขียนลง SQLite
+
+    cache.touch_interval = 0
+    cache.embed_query("design thinking")
+    assert last_used(cache)[cache._hash("design thinking")] > before[cache._hash("design thinking")]
+
+
+def test_eviction_uses_pending_touches_and_a_running_count(tmp_path):
+    path = str(tmp_path / "emb.sqlite3")
+    cache = CachedEmbeddings(HashEmbeddings(8), path, max_entries=3, touch_interval=3600)
+    for text in ("a", "b", "c"):
+        cache.embed_query(text)
+        time.sleep(0.01)
+    cache.embed_query("a")  # hit ที่ยังไม่ flush — "a" ต้องไม่ถูกไล่ออก
+    cache.embed_documents(["d", "e"])
+
+    assert cache._count == 3
+    assert set(last_used(cache)) == {cache._hash(t) for t in ("a", "d", "e")}
+    assert CachedEmbeddings(HashEmbeddings(8), path)._count == 3  # นับจากไฟล์เดิมตอนเปิดใหม่
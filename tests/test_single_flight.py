@@ -0,0 +1,141 @@
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from single_flight import Flight, GenerationCancelled, SingleFlight
+
+PROMPT = [HumanMessage(content="Design Thinking มีอะไรบ้าง")]
+
+
+async def read_all(flight: Flight) -> str:
+    return "".join([token async for token in flight.subscribe()])
+
+
+def test_concurrent_joiners_share_one_flight(app, llm):
+    async def scenario():
+        sf = SingleFlight()
+        key = sf.key("Design Thinking มีอะไรบ้าง", "v1")
+        flight, leader = sf.join(key)
+        flight.producer = asyncio.create_task(app.generate(PROMPT, flight))
+        joined = [sf.join(sf.key("  design thinking มีอะไรบ้าง ", "v1")) for _ in range(4)]
+        assert leader and not any(is_leader for _, is_leader in joined)
+        assert all(f is flight for f, _ in joined)
+        flight.accept(True)
+        assert all(await asyncio.gather(*(sf.follow(f) for f, _ in joined)))
+        texts = await asyncio.gather(read_all(flight), *(read_all(f) for f, _ in joined))
+        sf.release(key, flight)
+        return sf, key, texts
+
+    sf, key, texts = asyncio.run(scenario())
+    assert texts == [llm.answer] * 5
+    assert llm.calls == 1
+    assert sf.stats == {"leaders": 1, "coalesced": 4}
+    assert sf.in_flight == 0 and not sf.active(key)
+
+
+def test_late_joiner_gets_tokens_already_published(app, llm):
+    async def scenario():
+        flight = Flight()
+        flight.attach()
+        flight.producer = asyncio.create_task(app.generate(PROMPT, flight))
+        await asyncio.sleep(0.05)
+        assert flight.parts  # มี token ออกไปแล้วก่อนผู้อ่านคนนี้มา
+        return await read_all(flight)
+
+    assert asyncio.run(scenario()) == llm.answer
+
+
+def test_leader_leaving_does_not_cancel_while_waiters_are_attached(app, llm):
+    async def scenario():
+        sf = SingleFlight()
+        key = sf.key("คำถาม", "v1")
+        flight, _ = sf.join(key)
+        flight.producer = asyncio.create_task(app.generate(PROMPT, flight))
+        follower, _ = sf.join(key)
+        leader_reader = asyncio.create_task(read_all(flight))
+        follower_reader = asyncio.create_task(read_all(follower))
+        await asyncio.sleep(0.03)
+        leader_reader.cancel()  # client ของ leader ปิด connection กลางทาง
+        flight.detach()
+        text = await follower_reader
+        follower.detach()
+        return flight, text
+
+    flight, text = asyncio.run(scenario())
+    assert text == llm.answer
+    assert not flight.cancelled and flight.error is None
+    assert llm.cancelled == 0
+
+
+def test_last_reader_leaving_cancels_the_producer(app, llm):
+    async def scenario():
+        sf = SingleFlight()
+        key = sf.key("คำถาม", "v1")
+        flight, _ = sf.join(key)
+        flight.producer = asyncio.create_task(app.generate(PROMPT, flight))
+        follower, _ = sf.join(key)
+        await asyncio.sleep(0.03)
+        flight.detach()
+        assert not flight.cancelled  # ยังมี follower รออยู่
+        follower.detach()
+        with pytest.raises(asyncio.CancelledError):
+            await flight.producer
+        with pytest.raises(GenerationCancelled):
+            await read_all(flight)
+        return flight, sf.active(key)
+
+    flight, active = asyncio.run(scenario())
+    assert flight.cancelled and flight.done and len(flight.parts) < len(llm._tokens())
+    assert llm.cancelled == 1  # stream ไปยัง provider ถูกปิด
+    assert not active  # คำถามเดิมที่มาใหม่ต้องเริ่มงานใหม่ ไม่เกาะงานที่ถูกยกเลิก
+
+
+def test_producer_error_reaches_every_reader(app, llm):
+    llm.fail_after = 2
+
+    async def scenario():
+        sf = SingleFlight()
+        key = sf.key("คำถาม", "v1")
+        flight, _ = sf.join(key)
+        flight.producer = asyncio.create_task(app.generate(PROMPT, flight))
+        follower, _ = sf.join(key)
+        return await asyncio.gather(read_all(flight), read_all(follower), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert len(results) == 2
+    assert all(isinstance(r, RuntimeError) and str(r) == "stub provider error" for r in results)
+
+
+def test_followers_fall_back_when_leader_declines_to_share():
+    async def scenario():
+        sf = SingleFlight()
+        key = sf.key("คำถาม", "v1")
+        flight, _ = sf.join(key)
+        follower, _ = sf.join(key)
+        waiting = asyncio.create_task(sf.follow(follower))
+        await asyncio.sleep(0)
+        flight.finish()  # leader มีประวัติแชท → ไม่แชร์
+        sf.release(key, flight)
+        return await waiting, sf
+
+    shared, sf = asyncio.run(scenario())
+    assert shared is False and sf.stats["coalesced"] == 0
+
+
+def test_fifty_identical_questions_make_one_upstream_call(app, chat_server, monkeypatch):
+    """end-to-end ผ่าน /chat-stream → main.generate: คำถามเดียวกัน 50 request พร้อมกัน ต้องเรียก LLM ครั้งเดียว"""
+    from benchmarks.bench_coalescing import QUESTION, fire
+
+    monkeypatch.setattr(app, "SINGLE_FLIGHT", True)
+    question = f"{QUESTION} ({uuid.uuid4().hex[:8]})"  # ไม่ให้ชน answer cache ของ test อื่น
+    calls = app.chat_llm.calls
+    coalesced = app.single_flight.stats["coalesced"]
+
+    results = asyncio.run(fire(chat_server, 50, question))
+
+    assert app.chat_llm.calls - calls == 1
+    assert [body for _, body in results] == [app.chat_llm.answer] * 50
+    assert app.single_flight.stats["coalesced"] - coalesced == 49
+    assert app.single_flight.in_flight == 0
@@ -0,0 +1,38 @@
+# tokens.py — นับ/ตัด token ด้วย tiktoken (ประมาณจากจำนวน byte ถ้าโหลด encoding ไม่ได้)
+import functools
+import logging
+import os
+
+import tiktoken
+
+logger = logging.getLogger("minddojo.tokens")
+
+TOKEN_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.encoding_for_model(TOKEN_MODEL)
+    except Exception as e:  # โมเดลไม่รู้จัก หรือดาวน์โหลดไฟล์ BPE ไม่ได้ (เครื่อง offline)
+        logger.warning("tiktoken encoding unavailable for %s (%s); estimating token counts", TOKEN_MODEL, e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoding()
+    if enc is None:
+        return (len(text.encode("utf-8")) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """ตัดข้อความให้ไม่เกิน max_tokens (เก็บส่วนต้นไว้)"""
+    if max_tokens <= 0:
+        return ""
+    enc = _encoding()
+    if enc is None:
+        data = text.encode("utf-8")[: max_tokens * 4]
+        return data.decode("utf-8", errors="ignore")
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])